@@ -1,7 +1,16 @@
 # Agent模块初始化文件
 from .base import BaseAgent
 from .manager import agent_manager, AgentManager
-from .simple_chat import SimpleChatAgent
-from .langchain_agent import LangChainAgent
+from .registry import AgentSpec
 
-__all__ = ['BaseAgent', 'agent_manager', 'AgentManager', 'SimpleChatAgent', 'LangChainAgent']
\ No newline at end of file
+__all__ = ['BaseAgent', 'agent_manager', 'AgentManager', 'AgentSpec', 'SimpleChatAgent', 'LangChainAgent']
+
+def __getattr__(name):
+    # 具体agent的实现依赖较重（LangChain等），按需导入
+    if name == 'SimpleChatAgent':
+        from .simple_chat import SimpleChatAgent
+        return SimpleChatAgent
+    if name == 'LangChainAgent':
+        from .langchain_agent import LangChainAgent
+        return LangChainAgent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
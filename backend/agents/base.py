@@ -5,16 +5,44 @@ Agent基础类
 定义所有Agent必须实现的接口和通用功能。
 """
 
+import asyncio
+import contextvars
+import weakref
+from collections import deque
+from contextlib import AsyncExitStack, asynccontextmanager
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
+from itertools import islice
+from typing import Deque, Dict, Any, Optional, List, AsyncIterator, Awaitable, Callable, Sequence, Tuple, TypeVar
 from datetime import datetime
+from core.cache import ResponseCache, get_response_cache
+from core.concurrency import admission
+from core.config import settings
 from core.logging import logger
+from core.metrics import QUEUE_WAIT
+from core.singleflight import upstream_flights
+from storage import ConversationStore, get_conversation_store
+from storage.base import find_compacted_end
+from .eviction import estimate_message_bytes, estimate_prompt_bytes
+from .message import Message
 from utils.helpers import format_timestamp
 
+T = TypeVar("T")
+
+# 压缩摘要消息的内容前缀
+SUMMARY_PREFIX = "以下是此前对话的摘要：\n"
+
 class BaseAgent(ABC):
     """Agent基础抽象类"""
     
-    def __init__(self, name: str, display_name: str, description: str, version: str = "1.0.0"):
+    # 单个对话保留的最大消息数
+    max_history: int = settings.MAX_CONVERSATION_HISTORY
+    # 发送给模型的历史token预算，为None时按模型或全局配置决定
+    token_budget: Optional[int] = None
+    # 是否在对话过长时于后台将较早的消息压缩为摘要（需实现summarize）
+    compaction_enabled: bool = False
+    
+    def __init__(self, name: str, display_name: str, description: str, version: str = "1.0.0",
+                 store: Optional[ConversationStore] = None):
         """
         初始化Agent
         
@@ -23,16 +51,40 @@ class BaseAgent(ABC):
             display_name: Agent的显示名称
             description: Agent的功能描述
             version: Agent版本
+            store: 对话存储后端，为None时使用全局配置的存储
         """
+        if self.compaction_enabled and type(self).summarize is BaseAgent.summarize:
+            raise TypeError(f"{self.__class__.__name__} 开启了compaction_enabled，必须实现summarize")
+        
         self.name = name
         self.display_name = display_name
         self.description = description
         self.version = version
-        self.conversations: Dict[str, List[Dict[str, Any]]] = {}
+        self.store = store or get_conversation_store()
+        # 内存中的对话热缓存；未配置持久化存储时它就是唯一的数据源。
+        # 多进程共享存储下每次都从存储读取，任意worker都能处理任意对话
+        self.cache_enabled = self.store is None or (settings.CONVERSATION_CACHE_ENABLED and not self.store.shared)
+        # 每个对话是一个长度上限为max_history的环形缓冲区，追加时自动挤出最早的消息
+        self.conversations: Dict[str, Deque[Message]] = {}
+        # 热缓存中的消息总数，随追加、截断、压缩和淘汰增量维护
+        self.cached_messages = 0
+        self._compaction_tasks: Dict[str, asyncio.Task] = {}
+        # 每个对话一把锁，没有请求持有时自动回收
+        self._conversation_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        # 正在等待或持有对话锁的请求数，淘汰器不会淘汰这些对话
+        self._active_conversations: Dict[str, int] = {}
+        # 不使用热缓存时，持有对话锁期间从存储预加载的历史（请求结束时丢弃）
+        self._snapshots: Dict[str, Deque[Message]] = {}
+        # 由AgentManager注册的跨agent淘汰器
+        self.evictor = None
+        # 回复缓存按agent开启（RESPONSE_CACHE_AGENTS）
+        self.response_cache: Optional[ResponseCache] = (
+            get_response_cache() if name in settings.RESPONSE_CACHE_AGENTS else None
+        )
         self.created_at = datetime.now()
         self.last_activity = None
         
-        logger.info(f"初始化Agent: {self.display_name} ({self.name})")
+        logger.info("初始化Agent: %s (%s)", self.display_name, self.name)
     
     @abstractmethod
     async def process_message(self, message: str, conversation_id: str = "default") -> str:
@@ -48,6 +100,189 @@ class BaseAgent(ABC):
         """
         pass
     
+    async def stream_message(self, message: str, conversation_id: str = "default") -> AsyncIterator[str]:
+        """
+        流式处理用户消息（子类可以重写以逐token输出）
+        
+        默认实现等待完整回复后一次性输出。子类重写时应在流结束或被中断后
+        通过add_to_conversation提交已生成的回复。
+        
+        Args:
+            message: 用户消息
+            conversation_id: 对话ID
+        
+        Yields:
+            Agent回复的增量文本片段
+        """
+        yield await self.process_message(message, conversation_id)
+    
+    async def process_batch(self, items: List[Tuple[str, str]],
+                            max_concurrency: int = 8) -> AsyncIterator[Tuple[int, Optional[str], Optional[Exception]]]:
+        """
+        批量处理相互独立的消息，按完成顺序产出结果
+        
+        同一对话的多条消息按提交顺序分到不同轮次依次处理，每轮持有本轮所有对话的锁。
+        与单条请求的加锁顺序一致，先取得对话锁，再由每次上游调用各自获取准入槽位。
+        单条消息失败（包括被准入控制拒绝）不会影响其他消息。
+        
+        Args:
+            items: (消息, 对话ID) 列表
+            max_concurrency: 同时进行的上游调用数量上限
+        
+        Yields:
+            (在items中的序号, 回复, 异常)，成功时异常为None，失败时回复为None
+        """
+        for batch in self._batch_rounds(items):
+            async with AsyncExitStack() as stack:
+                # 按固定顺序加锁，避免与其他批次交叉等待
+                for conversation_id in sorted({conversation_id for _, _, conversation_id in batch}):
+                    await stack.enter_async_context(self.hold_conversation(conversation_id))
+                async for result in self._process_batch_round(batch, max_concurrency):
+                    yield result
+    
+    @staticmethod
+    def _batch_rounds(items: List[Tuple[str, str]]) -> List[List[Tuple[int, str, str]]]:
+        """将批量消息分成若干轮，每轮中每个对话最多出现一次"""
+        rounds: List[List[Tuple[int, str, str]]] = []
+        seen: Dict[str, int] = {}
+        for index, (message, conversation_id) in enumerate(items):
+            position = seen.get(conversation_id, 0)
+            seen[conversation_id] = position + 1
+            if position == len(rounds):
+                rounds.append([])
+            rounds[position].append((index, message, conversation_id))
+        return rounds
+    
+    async def _process_batch_round(self, batch: List[Tuple[int, str, str]],
+                                   max_concurrency: int) -> AsyncIterator[Tuple[int, Optional[str], Optional[Exception]]]:
+        """
+        处理一轮批量消息（子类可以重写以直接调用上游）
+        
+        默认实现以有限并发逐条调用process_message，每次调用占用一个准入槽位。
+        调用时已持有本轮所有对话的锁。
+        """
+        calls = [
+            lambda message=message, conversation_id=conversation_id: self.process_message(message, conversation_id)
+            for _, message, conversation_id in batch
+        ]
+        async for position, result in self._run_admitted(calls, max_concurrency):
+            if isinstance(result, Exception):
+                yield batch[position][0], None, result
+            else:
+                yield batch[position][0], result, None
+    
+    async def _run_admitted(self, calls: List[Callable[[], Awaitable[T]]],
+                            max_concurrency: int) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        以有限并发执行一组上游调用，每次调用占用一个准入槽位，按完成顺序产出结果
+        
+        Args:
+            calls: 创建上游调用的函数列表
+            max_concurrency: 同时进行的调用数量上限
+        
+        Yields:
+            (在calls中的序号, 结果或异常)；被准入控制拒绝时为AdmissionRejected
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def run(position: int, call: Callable[[], Awaitable[T]]):
+            async with semaphore:
+                try:
+                    async with self.admitted():
+                        return position, await call()
+                except Exception as e:
+                    return position, e
+        
+        tasks = [asyncio.create_task(run(position, call)) for position, call in enumerate(calls)]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            # 调用方提前停止迭代时取消尚未完成的调用
+            for task in tasks:
+                task.cancel()
+    
+    @asynccontextmanager
+    async def admitted(self) -> AsyncIterator[float]:
+        """
+        获取一个全局准入槽位并记录排队时间
+        
+        Yields:
+            本次排队等待的秒数
+        
+        Raises:
+            AdmissionRejected: 队列已满或等待超时
+        """
+        async with admission.slot() as waited:
+            QUEUE_WAIT.labels(self.name).observe(waited)
+            yield waited
+    
+    def conversation_lock(self, conversation_id: str) -> asyncio.Lock:
+        """
+        获取对话锁，用于串行处理同一对话的并发请求
+        
+        Args:
+            conversation_id: 对话ID
+        
+        Returns:
+            该对话专用的异步锁（调用方需在使用期间持有引用）
+        """
+        lock = self._conversation_locks.get(conversation_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._conversation_locks[conversation_id] = lock
+        return lock
+    
+    @asynccontextmanager
+    async def hold_conversation(self, conversation_id: str) -> AsyncIterator[None]:
+        """
+        持有对话锁，并在事件循环之外预加载该对话的历史
+        
+        使用持久化存储时，历史在取得锁后通过store.aload在线程中读取一次，
+        请求路径上不再同步访问存储。不使用热缓存（共享存储）时，
+        预加载的历史只在持有锁期间有效。等待和持有锁期间该对话不会被淘汰。
+        
+        Args:
+            conversation_id: 对话ID
+        """
+        self._active_conversations[conversation_id] = self._active_conversations.get(conversation_id, 0) + 1
+        try:
+            async with self.conversation_lock(conversation_id):
+                await self._preload_history(conversation_id)
+                try:
+                    yield
+                finally:
+                    self._snapshots.pop(conversation_id, None)
+        finally:
+            remaining = self._active_conversations[conversation_id] - 1
+            if remaining:
+                self._active_conversations[conversation_id] = remaining
+            else:
+                del self._active_conversations[conversation_id]
+    
+    def is_conversation_active(self, conversation_id: str) -> bool:
+        """对话是否有请求正在等待或持有对话锁"""
+        return conversation_id in self._active_conversations
+    
+    async def _preload_history(self, conversation_id: str) -> None:
+        """从存储或淘汰器写出的文件异步加载对话历史到热缓存或本次请求的快照"""
+        if not self.store:
+            # 之前被淘汰并写出到磁盘的对话在这里加载回来
+            if self.evictor and conversation_id not in self.conversations:
+                loaded = await self.evictor.restore(self.name, conversation_id)
+                if loaded and conversation_id not in self.conversations:
+                    self._install_history(conversation_id, loaded)
+            return
+        if self.cache_enabled:
+            if conversation_id in self.conversations:
+                return
+            loaded = await self.store.aload(self.name, conversation_id, limit=self.max_history)
+            if conversation_id not in self.conversations:
+                self._install_history(conversation_id, loaded)
+            return
+        loaded = await self.store.aload(self.name, conversation_id, limit=self.max_history)
+        self._snapshots[conversation_id] = deque((Message.from_dict(data) for data in loaded), maxlen=self.max_history)
+    
     def add_to_conversation(self, conversation_id: str, role: str, content: str) -> None:
         """
         添加消息到对话历史
@@ -57,23 +292,36 @@ class BaseAgent(ABC):
             role: 角色（user/assistant）
             content: 消息内容
         """
-        if conversation_id not in self.conversations:
-            self.conversations[conversation_id] = []
+        message = self._create_message(role, content)
         
-        self.conversations[conversation_id].append({
-            "role": role,
-            "content": content,
-            "timestamp": format_timestamp()
-        })
+        if self.cache_enabled:
+            history = self._get_cached_history(conversation_id)
+            size_delta = estimate_message_bytes(message) if self.evictor else 0
+            
+            # 达到长度上限时追加会挤出最早的一条消息
+            if len(history) == history.maxlen:
+                if self.evictor:
+                    size_delta -= estimate_message_bytes(history[0])
+            else:
+                self.cached_messages += 1
+            history.append(message)
+            
+            if self.evictor:
+                self.evictor.touch(self.name, conversation_id, size_delta)
+        elif conversation_id in self._snapshots:
+            self._snapshots[conversation_id].append(message)
         
-        self.last_activity = datetime.now()
+        # 持久化存储采用写后批量提交，不阻塞请求路径
+        if self.store:
+            self.store.append(self.name, conversation_id, message.to_dict())
         
-        # 限制对话历史长度
-        max_history = 50
-        if len(self.conversations[conversation_id]) > max_history:
-            self.conversations[conversation_id] = self.conversations[conversation_id][-max_history:]
+        self.last_activity = datetime.now()
+    
+    def _create_message(self, role: str, content: str) -> Message:
+        """创建一条历史消息记录"""
+        return Message(role, content)
     
-    def get_conversation_history(self, conversation_id: str) -> List[Dict[str, Any]]:
+    def get_conversation_history(self, conversation_id: str) -> Sequence[Message]:
         """
         获取对话历史
         
@@ -81,11 +329,286 @@ class BaseAgent(ABC):
             conversation_id: 对话ID
         
         Returns:
-            对话历史列表
+            按时间顺序排列的消息序列（缓存中的环形缓冲区，调用方不应修改）
+        
+        不使用热缓存且未持有对话锁时会同步读取存储，异步代码应在hold_conversation内调用。
+        """
+        if self.cache_enabled:
+            return self._get_cached_history(conversation_id, create=False)
+        snapshot = self._snapshots.get(conversation_id)
+        if snapshot is not None:
+            return snapshot
+        return [Message.from_dict(data) for data in self.store.load(self.name, conversation_id, limit=self.max_history)]
+    
+    def get_token_budget(self) -> int:
+        """
+        获取发送给模型的历史token预算
+        
+        Returns:
+            Agent自身的预算，其次是按模型配置的预算，最后是全局默认预算
+        """
+        if self.token_budget is not None:
+            return self.token_budget
+        model = getattr(self, "model", settings.OPENAI_MODEL)
+        return settings.MODEL_TOKEN_BUDGETS.get(model, settings.HISTORY_TOKEN_BUDGET)
+    
+    def get_prompt_window(self, conversation_id: str, token_budget: Optional[int] = None) -> List[Message]:
+        """
+        从对话尾部选取不超过token预算的消息窗口
+        
+        Args:
+            conversation_id: 对话ID
+            token_budget: token预算，为None时使用get_token_budget()
+        
+        Returns:
+            按时间顺序排列的消息列表，至少包含最后一条消息
+        """
+        budget = self.get_token_budget() if token_budget is None else token_budget
+        history = self.get_conversation_history(conversation_id)
+        
+        used = 0
+        start = len(history)
+        while start > 0:
+            tokens = history[start - 1].tokens
+            if used + tokens > budget and start < len(history):
+                break
+            used += tokens
+            start -= 1
+        return list(islice(history, start, None))
+    
+    def get_prompt_messages(self, conversation_id: str, token_budget: Optional[int] = None) -> List[Any]:
+        """
+        获取token预算内的历史窗口，已转换为发送给模型的格式
+        
+        转换结果缓存在消息记录上，随历史的追加、截断、压缩和淘汰一起增减，
+        每条消息只在第一次进入窗口时转换一次。
+        
+        Args:
+            conversation_id: 对话ID
+            token_budget: token预算，为None时使用get_token_budget()
+        
+        Returns:
+            按时间顺序排列的模型消息列表（调用方不应修改其中的对象）
+        """
+        messages = []
+        size_delta = 0
+        for message in self.get_prompt_window(conversation_id, token_budget):
+            prompt = message.prompt
+            if prompt is None:
+                prompt = message.prompt = self.to_prompt_message(message)
+                size_delta += estimate_prompt_bytes(prompt)
+            messages.append(prompt)
+        # 缓存的消息对象同样计入热缓存的内存占用
+        if size_delta and self.evictor and self.cache_enabled:
+            self.evictor.touch(self.name, conversation_id, size_delta)
+        return messages
+    
+    def to_prompt_message(self, message: Message) -> Any:
+        """
+        将历史消息转换为发送给模型的格式（子类可以重写）
+        
+        Args:
+            message: 历史消息记录
+        
+        Returns:
+            默认返回只包含role和content的OpenAI格式字典
         """
-        return self.conversations.get(conversation_id, [])
+        return {"role": message.role, "content": message.content}
     
-    def clear_conversation(self, conversation_id: str) -> bool:
+    def _get_cached_history(self, conversation_id: str, create: bool = True) -> Sequence[Message]:
+        """
+        从热缓存获取对话历史，未命中时从存储加载尾部窗口
+        
+        被淘汰写出到磁盘的对话只在hold_conversation中异步加载。
+        
+        Args:
+            conversation_id: 对话ID
+            create: 对话不存在时是否在缓存中创建空历史
+        
+        Returns:
+            缓存中的对话历史
+        """
+        history = self.conversations.get(conversation_id)
+        if history is None:
+            loaded = self.store.load(self.name, conversation_id, limit=self.max_history) if self.store else []
+            if not loaded and not create:
+                return ()
+            history = self._install_history(conversation_id, loaded)
+        elif self.evictor:
+            self.evictor.touch(self.name, conversation_id)
+        return history
+    
+    def _install_history(self, conversation_id: str, loaded: List[Dict[str, Any]]) -> Deque[Message]:
+        """把从存储或磁盘加载的历史放入热缓存"""
+        history = deque((Message.from_dict(data) for data in loaded), maxlen=self.max_history)
+        self.conversations[conversation_id] = history
+        self.cached_messages += len(history)
+        if self.evictor:
+            self.evictor.touch(self.name, conversation_id, sum(estimate_message_bytes(msg) for msg in history))
+        return history
+    
+    def release_conversation(self, conversation_id: str) -> Optional[Deque[Message]]:
+        """
+        将对话移出热缓存（淘汰或清除时调用）
+        
+        Args:
+            conversation_id: 对话ID
+        
+        Returns:
+            被移出的对话历史，不在缓存中时返回None
+        """
+        history = self.conversations.pop(conversation_id, None)
+        if history is not None:
+            self.cached_messages -= len(history)
+        return history
+    
+    def prompt_key(self, messages: List[Dict[str, Any]], model: Optional[str] = None) -> str:
+        """
+        生成标识一次上游调用的键（agent、模型、温度和消息窗口）
+        
+        Args:
+            messages: 发送给模型的完整消息窗口（只包含role和content）
+            model: 本次调用的模型，默认为agent的模型
+        
+        Returns:
+            调用键
+        """
+        return ResponseCache.make_key(
+            self.name,
+            model or getattr(self, "model", settings.OPENAI_MODEL),
+            getattr(self, "temperature", None),
+            messages
+        )
+    
+    async def coalesce(self, messages: List[Dict[str, Any]], factory: Callable[[], Awaitable[T]],
+                       model: Optional[str] = None) -> T:
+        """
+        合并相同消息窗口的并发上游调用
+        
+        Args:
+            messages: 发送给模型的完整消息窗口
+            factory: 创建实际上游调用的函数
+            model: 本次调用的模型，默认为agent的模型
+        
+        Returns:
+            上游调用结果，并发的相同请求共享同一个结果
+        """
+        if not settings.SINGLEFLIGHT_ENABLED:
+            return await factory()
+        return await upstream_flights.do(self.prompt_key(messages, model), factory)
+    
+    async def lookup_response_cache(self, messages: List[Dict[str, Any]],
+                                    model: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        按消息窗口查找缓存的回复（磁盘层在线程中查询）
+        
+        Args:
+            messages: 发送给模型的完整消息窗口（只包含role和content）
+            model: 本次调用的模型，默认为agent的模型
+        
+        Returns:
+            (缓存键, 缓存的回复)；未开启缓存时缓存键为None，未命中时回复为None
+        """
+        if not self.response_cache:
+            return None, None
+        key = self.prompt_key(messages, model)
+        return key, await self.response_cache.get(self.name, key)
+    
+    def store_response_cache(self, key: Optional[str], response: str, ttl: Optional[float] = None) -> None:
+        """
+        缓存回复
+        
+        Args:
+            key: lookup_response_cache返回的缓存键，为None时不缓存
+            response: Agent的回复
+            ttl: 本条回复的过期时间（秒），默认使用RESPONSE_CACHE_TTL，不大于0时不缓存
+        """
+        if key and self.response_cache and (ttl is None or ttl > 0):
+            self.response_cache.set(key, response, ttl)
+    
+    async def summarize(self, messages: List[Message]) -> str:
+        """
+        将一段对话历史压缩为摘要（启用compaction_enabled的子类必须实现）
+        
+        Args:
+            messages: 要压缩的历史消息
+        
+        Returns:
+            摘要文本
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} 未实现summarize")
+    
+    def schedule_compaction(self, conversation_id: str) -> None:
+        """
+        对话超过阈值时在后台启动压缩任务，不阻塞当前请求
+        
+        Args:
+            conversation_id: 对话ID
+        """
+        if not self.compaction_enabled or conversation_id in self._compaction_tasks:
+            return
+        # 只检查已加载的历史；没有时（对话锁已释放）由压缩任务异步读取后判断，不同步访问存储
+        history = self.conversations.get(conversation_id) if self.cache_enabled else self._snapshots.get(conversation_id)
+        if history is not None and len(history) <= settings.COMPACTION_THRESHOLD:
+            return
+        
+        # 在独立的上下文中运行，压缩的模型调用不计入当前请求的追踪
+        task = asyncio.create_task(self._compact_conversation(conversation_id), context=contextvars.Context())
+        self._compaction_tasks[conversation_id] = task
+        task.add_done_callback(lambda _: self._compaction_tasks.pop(conversation_id, None))
+    
+    async def _compact_conversation(self, conversation_id: str) -> None:
+        """将除最近若干条以外的历史（包括之前的摘要）滚动压缩为一条系统消息"""
+        if self.cache_enabled:
+            history = self.conversations.get(conversation_id, ())
+        else:
+            # 压缩在请求结束后运行，不持有对话锁，直接从存储异步读取
+            loaded = await self.store.aload(self.name, conversation_id, limit=self.max_history)
+            history = [Message.from_dict(data) for data in loaded]
+        if len(history) <= settings.COMPACTION_THRESHOLD:
+            return
+        older = list(islice(history, max(len(history) - settings.COMPACTION_KEEP_RECENT, 0)))
+        if len(older) < 2:
+            return
+        
+        try:
+            summary = await self.summarize(older)
+        except Exception as e:
+            logger.warning("Agent %s 压缩对话 %s 失败: %s", self.name, conversation_id, e)
+            return
+        
+        summary_message = self._create_message("system", f"{SUMMARY_PREFIX}{summary}")
+        
+        # 存储在一个事务中确认被摘要的消息仍在对话中再替换，摘要期间新追加的消息保留在摘要之后；
+        # 这些消息被截断（追加超过保留上限）或对话被清除时放弃本次压缩
+        if self.store and not await self.store.acompact(
+            self.name, conversation_id, [msg.to_dict() for msg in older], summary_message.to_dict()
+        ):
+            logger.info("Agent %s 压缩对话 %s 期间历史已变化，放弃本次压缩", self.name, conversation_id)
+            return
+        
+        if self.cache_enabled:
+            current = self.conversations.get(conversation_id)
+            if current is None:
+                return
+            if find_compacted_end(list(islice(current, len(older))), older) is None:
+                # 存储已压缩而热缓存的头部已变化，丢弃热缓存，下次访问时从存储重新加载
+                if self.store:
+                    self.release_conversation(conversation_id)
+                    if self.evictor:
+                        self.evictor.forget(self.name, conversation_id)
+                return
+            for _ in older:
+                current.popleft()
+            current.appendleft(summary_message)
+            self.cached_messages -= len(older) - 1
+            if self.evictor:
+                size_delta = estimate_message_bytes(summary_message) - sum(estimate_message_bytes(msg) for msg in older)
+                self.evictor.touch(self.name, conversation_id, size_delta)
+        
+        logger.info("Agent %s 压缩对话 %s: %s 条消息 -> 1 条摘要", self.name, conversation_id, len(older))
+    
+    async def clear_conversation(self, conversation_id: str) -> bool:
         """
         清除对话历史
         
@@ -95,34 +618,39 @@ class BaseAgent(ABC):
         Returns:
             是否成功清除
         """
-        if conversation_id in self.conversations:
-            del self.conversations[conversation_id]
-            logger.info(f"Agent {self.name} 清除对话 {conversation_id}")
-            return True
-        return False
+        removed = self.release_conversation(conversation_id) is not None
+        if self.evictor:
+            self.evictor.forget(self.name, conversation_id)
+        if self.store:
+            removed = await self.store.adelete(self.name, conversation_id) or removed
+        
+        if removed:
+            logger.info("Agent %s 清除对话 %s", self.name, conversation_id)
+        return removed
     
-    def get_conversation_count(self) -> int:
+    async def get_conversation_count(self) -> int:
         """
-        获取对话数量
+        获取对话数量（使用存储时在事件循环之外统计）
         
         Returns:
             对话数量
         """
+        if self.store:
+            return await self.store.acount_conversations(self.name)
         return len(self.conversations)
     
-    def get_total_messages(self) -> int:
+    async def get_total_messages(self) -> int:
         """
-        获取总消息数
+        获取总消息数（使用存储时在事件循环之外统计）
         
         Returns:
             总消息数
         """
-        total = 0
-        for conversation in self.conversations.values():
-            total += len(conversation)
-        return total
+        if self.store:
+            return await self.store.acount_messages(self.name)
+        return self.cached_messages
     
-    def get_agent_info(self) -> Dict[str, Any]:
+    async def get_agent_info(self) -> Dict[str, Any]:
         """
         获取Agent信息
         
@@ -135,8 +663,8 @@ class BaseAgent(ABC):
             "description": self.description,
             "version": self.version,
             "capabilities": self.get_capabilities(),
-            "conversation_count": self.get_conversation_count(),
-            "total_messages": self.get_total_messages(),
+            "conversation_count": await self.get_conversation_count(),
+            "total_messages": await self.get_total_messages(),
             "created_at": format_timestamp(self.created_at),
             "last_activity": format_timestamp(self.last_activity) if self.last_activity else None
         }
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+对话淘汰策略
+
+在AgentManager层面跨所有agent统一管理内存中的对话热缓存：
+限制对话总数、总字节数并淘汰长时间空闲的对话。
+所有对话按最近访问顺序保存在一个OrderedDict中，访问和淘汰都是O(1)。
+空闲超时除了在访问时检查，还由后台任务定期清理，没有流量时也能释放内存。
+正在处理请求（等待或持有对话锁）的对话不会被淘汰。
+未配置持久化存储且指定了写出目录时，被淘汰的对话在专用线程中写到磁盘，
+下次请求取得对话锁后再异步加载回来。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from core.logging import logger
+from .message import Message
+
+def estimate_message_bytes(message: Message) -> int:
+    """
+    估算一条历史消息占用的内存字节数（包括缓存的模型消息对象）
+    
+    Args:
+        message: 消息记录
+    
+    Returns:
+        估算的字节数（角色字符串在消息间共享，不计入）
+    """
+    size = sys.getsizeof(message) + sys.getsizeof(message.content) + sys.getsizeof(message.created)
+    if message.prompt is not None:
+        size += estimate_prompt_bytes(message.prompt)
+    return size
+
+def estimate_prompt_bytes(prompt: Any) -> int:
+    """
+    估算缓存在消息记录上的模型消息对象占用的字节数
+    
+    对象本身、属性字典和其中的容器字段计入；内容字符串与消息记录共享，不重复计入。
+    """
+    size = sys.getsizeof(prompt)
+    fields = getattr(prompt, "__dict__", None)
+    if fields is not None:
+        size += sys.getsizeof(fields)
+        size += sum(sys.getsizeof(value) for value in fields.values() if isinstance(value, (dict, list, set)))
+        fields_set = getattr(prompt, "__fields_set__", None)
+        if fields_set is not None:
+            size += sys.getsizeof(fields_set)
+    return size
+
+class ConversationEvictor:
+    """跨agent的对话LRU/TTL淘汰器"""
+    
+    def __init__(self, max_conversations: int = 0, max_bytes: int = 0, idle_ttl: float = 0,
+                 spill_dir: Optional[str] = None):
+        """
+        初始化淘汰器
+        
+        Args:
+            max_conversations: 内存中最多保留的对话数，0表示不限制
+            max_bytes: 内存中对话历史的最大总字节数，0表示不限制
+            idle_ttl: 空闲超过该秒数的对话会被淘汰，0表示不限制
+            spill_dir: 淘汰时写出对话的目录，为None时直接丢弃（有持久化存储的agent不写出）
+        """
+        self.max_conversations = max_conversations
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.spill_dir = spill_dir
+        self.agents: Dict[str, Any] = {}
+        # 写出、加载和删除文件都在这个线程中按提交顺序执行，加载总能读到之前提交的写出
+        self._spill_executor: Optional[ThreadPoolExecutor] = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="eviction-spill") if spill_dir else None
+        )
+        
+        # (agent_name, conversation_id) -> [字节数, 最后访问时间]，按访问顺序排列
+        self._entries: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {
+            "evicted_lru": 0,
+            "evicted_bytes": 0,
+            "evicted_idle": 0,
+            "spilled": 0,
+            "restored": 0
+        }
+    
+    def register(self, agent: Any) -> None:
+        """注册agent，使其对话热缓存受淘汰策略管理"""
+        self.agents[agent.name] = agent
+        agent.evictor = self
+    
+    def touch(self, agent_name: str, conversation_id: str, size_delta: int = 0) -> None:
+        """
+        记录一次对话访问并按需淘汰
+        
+        Args:
+            agent_name: Agent名称
+            conversation_id: 对话ID
+            size_delta: 本次访问带来的字节数变化
+        """
+        key = (agent_name, conversation_id)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [0, now]
+        else:
+            self._entries.move_to_end(key)
+        entry[0] += size_delta
+        entry[1] = now
+        self.total_bytes += size_delta
+        
+        self._enforce(now, protected=key)
+    
+    def forget(self, agent_name: str, conversation_id: str) -> None:
+        """对话被清除时移除记录和写出的文件"""
+        entry = self._entries.pop((agent_name, conversation_id), None)
+        if entry is not None:
+            self.total_bytes -= entry[0]
+        if self._spill_executor:
+            self._spill_executor.submit(self._remove_spilled, self._spill_path(agent_name, conversation_id))
+    
+    async def restore(self, agent_name: str, conversation_id: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        在写出线程中加载之前被写出到磁盘的对话
+        
+        Returns:
+            对话历史；没有写出过时返回None
+        """
+        if not self._spill_executor:
+            return None
+        future = self._spill_executor.submit(self._read_spilled, self._spill_path(agent_name, conversation_id))
+        return await asyncio.wrap_future(future)
+    
+    def close(self) -> None:
+        """等待尚未完成的写出"""
+        if self._spill_executor:
+            self._spill_executor.shutdown(wait=True)
+            self._spill_executor = None
+    
+    def sweep(self) -> int:
+        """
+        淘汰所有空闲超时的对话
+        
+        Returns:
+            淘汰的对话数
+        """
+        if not self.idle_ttl:
+            return 0
+        now = time.monotonic()
+        # 按访问顺序排列，遇到第一个未超时的对话即可停止
+        victims = []
+        for key, (_, last_access) in self._candidates():
+            if now - last_access <= self.idle_ttl:
+                break
+            victims.append(key)
+        for key in victims:
+            self._evict(key)
+            self.stats["evicted_idle"] += 1
+        return len(victims)
+    
+    async def run_sweeper(self, interval: float) -> None:
+        """后台任务：每隔interval秒清理一次空闲超时的对话"""
+        while True:
+            await asyncio.sleep(interval)
+            evicted = self.sweep()
+            if evicted:
+                logger.info("清理了 %s 个空闲超时的对话", evicted)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取淘汰统计信息"""
+        return {
+            "cached_conversations": len(self._entries),
+            "cached_bytes": self.total_bytes,
+            **self.stats
+        }
+    
+    def _enforce(self, now: float, protected: Tuple[str, str]) -> None:
+        """从最久未访问的一端开始淘汰，直到满足所有限制（不淘汰刚访问的和正在处理请求的对话）"""
+        victims = []
+        remaining = len(self._entries)
+        remaining_bytes = self.total_bytes
+        for key, (size, last_access) in self._candidates():
+            if key == protected:
+                break
+            if self.idle_ttl and now - last_access > self.idle_ttl:
+                reason = "evicted_idle"
+            elif self.max_conversations and remaining > self.max_conversations:
+                reason = "evicted_lru"
+            elif self.max_bytes and remaining_bytes > self.max_bytes:
+                reason = "evicted_bytes"
+            else:
+                break
+            victims.append((key, reason))
+            remaining -= 1
+            remaining_bytes -= size
+        for key, reason in victims:
+            self._evict(key)
+            self.stats[reason] += 1
+    
+    def _candidates(self) -> Iterator[Tuple[Tuple[str, str], List[float]]]:
+        """按访问顺序遍历可以淘汰的对话，跳过正在处理请求的对话"""
+        for key, entry in self._entries.items():
+            agent = self.agents.get(key[0])
+            if agent is not None and agent.is_conversation_active(key[1]):
+                continue
+            yield key, entry
+    
+    def _evict(self, key: Tuple[str, str]) -> None:
+        """将对话移出热缓存，必要时写出到磁盘"""
+        agent_name, conversation_id = key
+        size, _ = self._entries.pop(key)
+        self.total_bytes -= size
+        
+        agent = self.agents.get(agent_name)
+        if agent is None:
+            return
+        history = agent.release_conversation(conversation_id)
+        # 有持久化存储的agent下次访问时会从存储重新加载
+        if history and agent.store is None and self._spill_executor:
+            self._spill_executor.submit(
+                self._write_spilled, self._spill_path(agent_name, conversation_id),
+                [message.to_dict() for message in history]
+            )
+    
+    def _write_spilled(self, path: str, history: List[Dict[str, Any]]) -> None:
+        """把对话写出到磁盘（在写出线程中执行）"""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(history, f, ensure_ascii=False)
+            self.stats["spilled"] += 1
+        except OSError as e:
+            logger.error("写出对话到 %s 失败: %s", path, e)
+    
+    def _read_spilled(self, path: str) -> Optional[List[Dict[str, Any]]]:
+        """读取并删除写出的对话（在写出线程中执行）"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                history = json.load(f)
+        except FileNotFoundError:
+            return None
+        os.remove(path)
+        self.stats["restored"] += 1
+        return history
+    
+    @staticmethod
+    def _remove_spilled(path: str) -> None:
+        """删除写出的对话（在写出线程中执行）"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    
+    def _spill_path(self, agent_name: str, conversation_id: str) -> str:
+        """对话写出文件的路径（对话ID经过哈希，避免路径注入）"""
+        digest = hashlib.sha1(conversation_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir, agent_name, f"{digest}.json")
@@ -1,15 +1,22 @@
+import asyncio
 import os
-from typing import Dict, List
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
 from datetime import datetime
 from langchain.agents import create_openai_tools_agent, AgentExecutor
 from langchain.tools import tool
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.schema import AIMessage, HumanMessage
+from langchain_core.tools import ToolException
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain.schema import AIMessage, BaseMessage, ChatMessage, HumanMessage, SystemMessage
 from dotenv import load_dotenv
 from ..base import BaseAgent
+from ..message import Message
+from core.cache import cache_tool_results
 from core.config import settings
-from core.logging import logger
+from core.llm import create_chat_model, instrumentation_callbacks
+from core.tracing import span
+from core.logging import log_chat_message, logger
+from core.sandbox import ToolTimeoutError, tool_sandbox
+from utils.safe_eval import safe_eval
 
 # 加载环境变量
 load_dotenv()
@@ -27,46 +34,52 @@ class LangChainAgent(BaseAgent):
         
         # 初始化聊天模型
         api_key = settings.OPENAI_API_KEY
+        self.model = settings.OPENAI_MODEL
+        self.temperature = 0.7
         if not api_key:
             logger.warning("未设置OPENAI_API_KEY，LangChainAgent可能无法正常工作")
             self.llm = None
             self.agent_executor = None
         else:
-            self.llm = ChatOpenAI(
-                model=settings.OPENAI_MODEL,
-                api_key=api_key,
-                temperature=0.7
-            )
+            # 使用共享的HTTP连接池，模型和工具调用都记录到指标和追踪
+            self.callbacks = instrumentation_callbacks(self.name)
+            self.llm = create_chat_model(temperature=self.temperature, callbacks=self.callbacks)
             
             # 创建工具和agent
             self.tools = self._create_tools()
             self.agent_executor = self._create_agent()
         
     def _create_tools(self) -> List:
-        """创建工具列表"""
+        """创建工具列表
+        
+        工具都是异步的：模型在一步中发出多个工具调用时，AgentExecutor会并发执行它们，
+        而不必经过线程池。结果按TOOL_CACHE_TTLS中配置的有效期缓存。
+        """
+        cache_ttls = settings.TOOL_CACHE_TTLS
         
         @tool
-        def get_current_time(query: str = "") -> str:
+        @cache_tool_results(ttl=cache_ttls.get("get_current_time", 0))
+        async def get_current_time(query: str = "") -> str:
             """获取当前时间"""
             now = datetime.now()
             return f"当前时间是：{now.strftime('%Y年%m月%d日 %H:%M:%S')}"
         
         @tool
-        def calculate(expression: str) -> str:
+        @cache_tool_results(ttl=cache_ttls.get("calculate", 0))
+        async def calculate(expression: str) -> str:
             """进行数学计算，输入数学表达式"""
             try:
-                # 只允许基本的数学运算
-                allowed_chars = set('0123456789+-*/().= ')
-                if not all(c in allowed_chars for c in expression):
-                    return "错误：只支持基本数学运算符"
-                
-                result = eval(expression)
-                return f"计算结果：{expression} = {result}"
+                # 在工具沙箱进程中求值，超时或超出内存上限不会影响事件循环
+                result = await tool_sandbox.run(safe_eval, expression)
+            except ToolTimeoutError:
+                raise ToolException("计算错误：计算超时")
             except Exception as e:
-                return f"计算错误：{str(e)}"
+                raise ToolException(f"计算错误：{str(e)}")
+            return f"计算结果：{expression} = {result}"
         
         @tool
-        def search_weather(city: str) -> str:
+        @cache_tool_results(ttl=cache_ttls.get("search_weather", 0))
+        async def search_weather(city: str) -> str:
             """查询天气信息，输入城市名称"""
             # 这里是模拟的天气查询，实际项目中可以接入真实的天气API
             weather_data = {
@@ -76,20 +89,34 @@ class LangChainAgent(BaseAgent):
                 "深圳": "晴天，温度22-32°C"
             }
             
+            city = city.strip()
             return weather_data.get(city, f"抱歉，暂时无法获取{city}的天气信息")
         
-        return [get_current_time, calculate, search_weather]
+        # 计算出错时抛出ToolException，错误信息作为工具输出返回给模型，且不会被缓存
+        calculate.handle_tool_error = True
+        
+        tools = [get_current_time, calculate, search_weather]
+        for agent_tool in tools:
+            agent_tool.callbacks = self.callbacks
+        return tools
     
     def _create_agent(self):
         """创建LangChain agent"""
         prompt = ChatPromptTemplate.from_messages([
             ("system", "你是一个智能助手，可以使用工具来帮助用户。请根据用户的问题选择合适的工具。"),
+            MessagesPlaceholder(variable_name="chat_history"),
             ("human", "{input}"),
             ("placeholder", "{agent_scratchpad}"),
         ])
         
         agent = create_openai_tools_agent(self.llm, self.tools, prompt)
-        return AgentExecutor(agent=agent, tools=self.tools, verbose=True)
+        # 返回中间步骤，用于判断本轮调用了哪些工具
+        return AgentExecutor(
+            agent=agent,
+            tools=self.tools,
+            verbose=settings.AGENT_EXECUTOR_VERBOSE,
+            return_intermediate_steps=True
+        )
     
 
     
@@ -102,36 +129,172 @@ class LangChainAgent(BaseAgent):
             # 添加用户消息到历史
             self.add_to_conversation(conversation_id, "user", message)
             
-            # 使用agent处理消息
-            response = await self.agent_executor.ainvoke({
-                "input": message,
-                "chat_history": self._format_chat_history(conversation_id)
-            })
-            
-            ai_response = response["output"]
+            # 相同的消息窗口直接返回缓存的回复
+            window = self._window_messages(conversation_id)
+            cache_key, ai_response = await self.lookup_response_cache(window)
+            if ai_response is None:
+                # 使用agent处理消息，并发的相同请求共享同一次执行
+                inputs = {
+                    "input": message,
+                    "chat_history": self._format_chat_history(conversation_id)
+                }
+                response = await self.coalesce(window, lambda: self.agent_executor.ainvoke(inputs))
+                
+                ai_response = response["output"]
+                self.store_response_cache(cache_key, ai_response, self._cache_ttl(self._used_tools(response)))
             
             # 添加AI回复到历史
             self.add_to_conversation(conversation_id, "assistant", ai_response)
             
-            logger.info(f"LangChainAgent处理消息: {message[:50]}... -> {ai_response[:50]}...")
+            log_chat_message("LangChainAgent处理消息: %s... -> %s...", message[:50], ai_response[:50])
             
             return ai_response
             
+        except asyncio.CancelledError:
+            # 客户端断开等原因取消请求：不记录助手回复，已记录的用户消息保留
+            logger.info("LangChainAgent取消对话 %s 的处理", conversation_id)
+            raise
         except Exception as e:
             error_msg = f"抱歉，处理您的消息时出现错误: {str(e)}"
-            logger.error(f"LangChainAgent错误: {str(e)}")
+            logger.error("LangChainAgent错误: %s", e)
             return error_msg
     
-    def _format_chat_history(self, conversation_id: str) -> List:
-        """格式化聊天历史为LangChain格式"""
-        history = []
-        conversation_history = self.get_conversation_history(conversation_id)
-        for msg in conversation_history:
-            if msg["role"] == "user":
-                history.append(HumanMessage(content=msg["content"]))
-            elif msg["role"] == "assistant":
-                history.append(AIMessage(content=msg["content"]))
-        return history
+    async def stream_message(self, message: str, conversation_id: str = "default") -> AsyncIterator[str]:
+        """流式处理用户消息，逐token输出最终回复"""
+        if not self.agent_executor:
+            yield "抱歉，LangChain Agent未配置，无法处理您的消息。请检查OPENAI_API_KEY环境变量。"
+            return
+        
+        # 添加用户消息到历史
+        self.add_to_conversation(conversation_id, "user", message)
+        
+        chunks: List[str] = []
+        final_output = None
+        used_tools: Set[str] = set()
+        try:
+            cache_key, cached = await self.lookup_response_cache(self._window_messages(conversation_id))
+            if cached is not None:
+                final_output = cached
+                yield cached
+                return
+            
+            async for event in self.agent_executor.astream_events(
+                {
+                    "input": message,
+                    "chat_history": self._format_chat_history(conversation_id)
+                },
+                version="v2"
+            ):
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if content:
+                        chunks.append(content)
+                        yield content
+                elif kind == "on_tool_start":
+                    used_tools.add(event["name"])
+                elif kind == "on_chain_end" and event["name"] == "AgentExecutor":
+                    output = event["data"].get("output")
+                    if isinstance(output, dict):
+                        final_output = output.get("output")
+                        self.store_response_cache(cache_key, final_output, self._cache_ttl(used_tools))
+        except Exception as e:
+            logger.error("LangChainAgent流式错误: %s", e)
+            if not chunks:
+                yield f"抱歉，处理您的消息时出现错误: {str(e)}"
+        finally:
+            # 优先提交执行器的最终输出，被中断时提交已生成的部分
+            ai_response = final_output or "".join(chunks)
+            if ai_response:
+                self.add_to_conversation(conversation_id, "assistant", ai_response)
+                log_chat_message("LangChainAgent流式处理消息: %s... -> %s...", message[:50], ai_response[:50])
+    
+    async def _process_batch_round(self, batch: List[Tuple[int, str, str]],
+                                   max_concurrency: int) -> AsyncIterator[Tuple[int, Optional[str], Optional[Exception]]]:
+        """
+        以有限并发调用AgentExecutor处理一轮消息，每次调用占用一个准入槽位，按完成顺序产出结果
+        
+        不使用agent_executor.abatch：它同样逐条调用ainvoke，逐条调用才能让每次调用各自占用准入槽位。
+        """
+        if not self.agent_executor:
+            for index, _, _ in batch:
+                yield index, None, RuntimeError("LangChain Agent未配置，请检查OPENAI_API_KEY环境变量")
+            return
+        
+        pending = []
+        for index, message, conversation_id in batch:
+            self.add_to_conversation(conversation_id, "user", message)
+            cache_key, cached = await self.lookup_response_cache(self._window_messages(conversation_id))
+            if cached is not None:
+                self.add_to_conversation(conversation_id, "assistant", cached)
+                yield index, cached, None
+            else:
+                inputs = {
+                    "input": message,
+                    "chat_history": self._format_chat_history(conversation_id)
+                }
+                pending.append((index, conversation_id, cache_key, inputs))
+        
+        if not pending:
+            return
+        
+        calls = [
+            lambda inputs=inputs: self.agent_executor.ainvoke(inputs)
+            for _, _, _, inputs in pending
+        ]
+        async for position, response in self._run_admitted(calls, max_concurrency):
+            index, conversation_id, cache_key, _ = pending[position]
+            if isinstance(response, Exception):
+                logger.error("LangChainAgent批量处理错误: %s", response)
+                yield index, None, response
+                continue
+            
+            ai_response = response["output"]
+            self.store_response_cache(cache_key, ai_response, self._cache_ttl(self._used_tools(response)))
+            self.add_to_conversation(conversation_id, "assistant", ai_response)
+            yield index, ai_response, None
+    
+    @staticmethod
+    def _used_tools(response: Dict[str, Any]) -> Set[str]:
+        """AgentExecutor一次执行中调用过的工具名称"""
+        return {action.tool for action, _ in response.get("intermediate_steps", [])}
+    
+    @staticmethod
+    def _cache_ttl(used_tools: Set[str]) -> float:
+        """
+        按本轮调用过的工具决定回复的缓存时间
+        
+        回复的有效期不超过所用工具结果的有效期（TOOL_CACHE_TTLS），调用了未配置有效期的
+        工具（如get_current_time）时返回0，不缓存。
+        """
+        return min([settings.RESPONSE_CACHE_TTL] + [settings.TOOL_CACHE_TTLS.get(name, 0) for name in used_tools])
+    
+    def _window_messages(self, conversation_id: str) -> List[Dict[str, str]]:
+        """获取用于回复缓存键的消息窗口"""
+        with span("history"):
+            return [
+                {"role": msg["role"], "content": msg["content"]}
+                for msg in self.get_prompt_window(conversation_id)
+            ]
+    
+    def _format_chat_history(self, conversation_id: str) -> List[BaseMessage]:
+        """
+        格式化聊天历史为LangChain格式（消息对象缓存在历史记录上，不必每轮重建）
+        
+        调用时本轮的用户消息已经写入历史，它由提示词中的{input}发送，这里不再包含。
+        """
+        with span("history"):
+            return self.get_prompt_messages(conversation_id)[:-1]
+    
+    def to_prompt_message(self, message: Message) -> BaseMessage:
+        """将历史消息转换为LangChain消息对象"""
+        if message.role == "user":
+            return HumanMessage(content=message.content)
+        if message.role == "assistant":
+            return AIMessage(content=message.content)
+        if message.role == "system":
+            return SystemMessage(content=message.content)
+        return ChatMessage(role=message.role, content=message.content)
     
     def get_capabilities(self) -> List[str]:
         """获取Agent能力列表"""
@@ -141,5 +304,6 @@ class LangChainAgent(BaseAgent):
             "时间查询",
             "数学计算",
             "天气查询",
-            "多轮对话"
+            "多轮对话",
+            "流式输出"
         ]
\ No newline at end of file
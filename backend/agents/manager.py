@@ -1,48 +1,95 @@
-from typing import Dict, List, Optional, Any
+import asyncio
+import time
+from typing import AsyncIterator, Dict, List, Optional, Any
 from core.logging import logger
 from core.config import settings
-from .simple_chat import SimpleChatAgent
-from .langchain_agent import LangChainAgent
+from core.metrics import REQUESTS, TIME_TO_FIRST_TOKEN, track_request
+from core.tracing import record_span, span
+from .eviction import ConversationEvictor
+from .registry import AgentSpec, discover_agent_specs
 
 class AgentManager:
-    """Agent管理器"""
+    """Agent管理器（延迟加载的agent注册表）"""
     
     def __init__(self):
+        self.specs: Dict[str, AgentSpec] = {}
         self.agents: Dict[str, Any] = {}
+        # 每个agent的导入和初始化耗时（毫秒）
+        self.load_report: Dict[str, Dict[str, float]] = {}
+        self.evictor = ConversationEvictor(
+            max_conversations=settings.EVICTION_MAX_CONVERSATIONS,
+            max_bytes=settings.EVICTION_MAX_BYTES,
+            idle_ttl=settings.EVICTION_IDLE_TTL,
+            spill_dir=settings.EVICTION_SPILL_DIR or None
+        )
+        self._sweeper: Optional[asyncio.Task] = None
         self._initialize_agents()
     
     def _initialize_agents(self):
-        """初始化所有agent"""
+        """注册所有agent的元数据，只预加载配置中指定的agent"""
         try:
-            # 注册简单聊天agent
-            simple_agent = SimpleChatAgent()
-            self.agents[simple_agent.name] = simple_agent
+            for spec in discover_agent_specs():
+                self.specs[spec.name] = spec
             
-            # 注册LangChain agent
-            langchain_agent = LangChainAgent()
-            self.agents[langchain_agent.name] = langchain_agent
+            logger.info("已注册 %s 个agent: %s", len(self.specs), list(self.specs.keys()))
             
-            logger.info(f"已注册 {len(self.agents)} 个agent: {list(self.agents.keys())}")
+            preload = settings.AGENT_PRELOAD
+            names = list(self.specs) if "*" in preload else [name for name in preload if name in self.specs]
+            for name in names:
+                self._load_agent(self.specs[name])
+            
+            if self.load_report:
+                summary = ", ".join(
+                    f"{name}(导入 {report['import_ms']:.0f}ms, 初始化 {report['init_ms']:.0f}ms)"
+                    for name, report in self.load_report.items()
+                )
+                logger.info("预加载agent耗时: %s", summary)
             
         except Exception as e:
-            logger.error(f"初始化agent失败: {str(e)}")
+            logger.error("初始化agent失败: %s", e)
             raise
     
+    def _load_agent(self, spec: AgentSpec) -> Any:
+        """导入并实例化agent，记录耗时"""
+        started = time.perf_counter()
+        agent_class = spec.load_class()
+        imported = time.perf_counter()
+        agent = agent_class()
+        initialized = time.perf_counter()
+        
+        self.agents[spec.name] = agent
+        self.evictor.register(agent)
+        self.load_report[spec.name] = {
+            "import_ms": round((imported - started) * 1000, 1),
+            "init_ms": round((initialized - imported) * 1000, 1)
+        }
+        logger.info(
+            "加载agent %s: 导入 %sms, 初始化 %sms",
+            spec.name, self.load_report[spec.name]["import_ms"], self.load_report[spec.name]["init_ms"]
+        )
+        return agent
+    
+    def has_agent(self, agent_name: str) -> bool:
+        """检查agent是否已注册（不触发加载）"""
+        return agent_name in self.specs
+    
     def get_agent(self, agent_name: str) -> Optional[Any]:
-        """获取指定的agent"""
-        return self.agents.get(agent_name)
+        """获取指定的agent，首次使用时才导入和实例化"""
+        agent = self.agents.get(agent_name)
+        if agent is None:
+            spec = self.specs.get(agent_name)
+            if spec is None:
+                return None
+            try:
+                agent = self._load_agent(spec)
+            except Exception as e:
+                logger.error("加载agent %s 失败: %s", agent_name, e)
+                raise
+        return agent
     
     def get_available_agents(self) -> List[Dict[str, str]]:
-        """获取所有可用的agent信息"""
-        agent_list = []
-        for agent_name, agent in self.agents.items():
-            agent_info = {
-                "name": agent.name,
-                "display_name": agent.display_name,
-                "description": agent.description
-            }
-            agent_list.append(agent_info)
-        return agent_list
+        """获取所有可用的agent信息（只读取元数据，不加载agent）"""
+        return [spec.to_info() for spec in self.specs.values()]
     
     async def process_message(self, agent_name: str, message: str, conversation_id: str = "default") -> str:
         """使用指定agent处理消息"""
@@ -50,26 +97,227 @@ class AgentManager:
         if not agent:
             raise ValueError(f"Agent '{agent_name}' 不存在")
         
-        return await agent.process_message(message, conversation_id)
+        # 同一对话的请求串行处理，再经过全局准入控制
+        with track_request(agent_name, "chat"), span("agent", agent=agent_name, conversation_id=conversation_id):
+            async with agent.hold_conversation(conversation_id):
+                async with agent.admitted() as waited:
+                    record_span("queue", waited)
+                    return await agent.process_message(message, conversation_id)
+    
+    async def stream_message(self, agent_name: str, message: str, conversation_id: str = "default") -> AsyncIterator[str]:
+        """使用指定agent流式处理消息"""
+        agent = self.get_agent(agent_name)
+        if not agent:
+            raise ValueError(f"Agent '{agent_name}' 不存在")
+        
+        with track_request(agent_name, "stream"):
+            started = time.perf_counter()
+            first = True
+            async with agent.hold_conversation(conversation_id):
+                async with agent.admitted():
+                    stream = agent.stream_message(message, conversation_id)
+                    try:
+                        async for delta in stream:
+                            if first:
+                                TIME_TO_FIRST_TOKEN.labels(agent_name).observe(time.perf_counter() - started)
+                                first = False
+                            yield delta
+                    finally:
+                        # 调用方提前停止时在持有对话锁期间结束agent的流，部分回复在锁内提交
+                        await stream.aclose()
+    
+    async def arena_stream(
+        self,
+        agent_names: List[str],
+        message: str,
+        conversation_id: str = "arena",
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """把同一条消息并发发送给多个agent，按到达顺序产出带agent名称的事件
+        
+        事件类型：delta（增量文本）、agent_done（该agent完成，附带延迟）、
+        agent_error（该agent出错或超时）。超时的agent会被取消，不影响其他agent；
+        调用方停止迭代时所有仍在运行的agent都会被取消。
+        """
+        # 先完成延迟加载，避免把导入耗时计入agent的延迟
+        for agent_name in agent_names:
+            if not self.get_agent(agent_name):
+                raise ValueError(f"Agent '{agent_name}' 不存在")
+        
+        timeout = timeout or settings.ARENA_AGENT_TIMEOUT
+        queue: asyncio.Queue = asyncio.Queue()
+        started = time.perf_counter()
+        
+        def elapsed_ms() -> float:
+            return round((time.perf_counter() - started) * 1000, 1)
+        
+        async def run_agent(agent_name: str):
+            first_token_ms = None
+            parts = []
+            
+            async def consume():
+                nonlocal first_token_ms
+                async for delta in self.stream_message(agent_name, message, conversation_id):
+                    if first_token_ms is None:
+                        first_token_ms = elapsed_ms()
+                    parts.append(delta)
+                    await queue.put({"event": "delta", "agent_name": agent_name, "delta": delta})
+            
+            try:
+                await asyncio.wait_for(consume(), timeout=timeout)
+                await queue.put({
+                    "event": "agent_done",
+                    "agent_name": agent_name,
+                    "response": "".join(parts),
+                    "first_token_ms": first_token_ms,
+                    "latency_ms": elapsed_ms()
+                })
+            except asyncio.TimeoutError:
+                logger.warning("竞技场agent %s 超时（%ss），已取消", agent_name, timeout)
+                await queue.put({
+                    "event": "agent_error",
+                    "agent_name": agent_name,
+                    "detail": f"超时（{timeout}s）",
+                    "timed_out": True,
+                    "latency_ms": elapsed_ms()
+                })
+            except Exception as e:
+                logger.error("竞技场agent %s 出错: %s", agent_name, e)
+                await queue.put({
+                    "event": "agent_error",
+                    "agent_name": agent_name,
+                    "detail": str(e),
+                    "timed_out": False,
+                    "latency_ms": elapsed_ms()
+                })
+        
+        tasks = [asyncio.create_task(run_agent(name)) for name in agent_names]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                event = await queue.get()
+                if event["event"] != "delta":
+                    remaining -= 1
+                yield event
+        finally:
+            # 客户端断开或调用方提前退出时取消仍在运行的agent
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def process_batch(
+        self,
+        items: List[Dict[str, str]],
+        max_concurrency: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """批量处理相互独立的消息，按完成顺序产出每条消息的结果
+        
+        items中每项包含agent_name、message和conversation_id。不同agent的消息并发处理，
+        每个agent的上游并发由max_concurrency限制，每次上游调用在取得对话锁之后各占用一个准入槽位。
+        单条消息失败只会在该条结果中带上error，不影响其他消息。
+        """
+        max_concurrency = max_concurrency or settings.BATCH_MAX_CONCURRENCY
+        queue: asyncio.Queue = asyncio.Queue()
+        groups: Dict[str, List[int]] = {}
+        
+        def result(index: int, response: Optional[str] = None, error: Optional[str] = None) -> Dict[str, Any]:
+            item = items[index]
+            data = {
+                "index": index,
+                "agent_name": item["agent_name"],
+                "conversation_id": item["conversation_id"]
+            }
+            if error is None:
+                data["response"] = response
+            else:
+                data["error"] = error
+            return data
+        
+        for index, item in enumerate(items):
+            groups.setdefault(item["agent_name"], []).append(index)
+        
+        async def run_group(agent_name: str, indexes: List[int]):
+            done = set()
+            try:
+                agent = self.get_agent(agent_name)
+                if not agent:
+                    raise ValueError(f"Agent '{agent_name}' 不存在")
+                
+                batch = [(items[index]["message"], items[index]["conversation_id"]) for index in indexes]
+                async for position, response, error in agent.process_batch(batch, max_concurrency):
+                    done.add(position)
+                    REQUESTS.labels(agent_name, "batch", "ok" if error is None else "error").inc()
+                    await queue.put(result(indexes[position], response, error and (str(error) or type(error).__name__)))
+            except Exception as e:
+                logger.error("agent %s 批量处理失败: %s", agent_name, e)
+                for position, index in enumerate(indexes):
+                    if position not in done:
+                        await queue.put(result(index, error=str(e) or type(e).__name__))
+        
+        tasks = [asyncio.create_task(run_group(name, indexes)) for name, indexes in groups.items()]
+        try:
+            for _ in range(len(items)):
+                yield await queue.get()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
     
-    def clear_conversation(self, agent_name: str, conversation_id: str) -> bool:
+    async def clear_conversation(self, agent_name: str, conversation_id: str) -> bool:
         """清除指定agent的对话历史"""
         agent = self.get_agent(agent_name)
         if not agent:
             return False
         
-        return agent.clear_conversation(conversation_id)
+        return await agent.clear_conversation(conversation_id)
     
-    def get_agent_stats(self) -> Dict[str, Any]:
-        """获取所有agent的统计信息"""
+    async def get_agent_stats(self) -> Dict[str, Any]:
+        """获取所有agent的统计信息（未加载的agent不会被加载，存储的统计在事件循环之外并发进行）"""
+        names = list(self.agents)
+        counts = dict(zip(names, await asyncio.gather(*(self.agents[name].get_conversation_count() for name in names))))
         stats = {}
-        for agent_name, agent in self.agents.items():
+        for agent_name, spec in self.specs.items():
+            agent = self.agents.get(agent_name)
             stats[agent_name] = {
-                "name": agent.name,
-                "display_name": agent.display_name,
-                "conversation_count": agent.get_conversation_count()
+                "name": spec.name,
+                "display_name": spec.display_name,
+                "conversation_count": counts.get(agent_name, 0),
+                # 增量维护的计数，不遍历对话
+                "cached_messages": agent.cached_messages if agent else 0,
+                "loaded": agent is not None
             }
         return stats
+    
+    def get_model_routing_stats(self) -> Dict[str, Any]:
+        """获取已加载且开启了模型路由的agent的各路由统计"""
+        return {
+            name: agent.model_router.get_stats()
+            for name, agent in self.agents.items()
+            if getattr(agent, "model_router", None) is not None
+        }
+    
+    def get_load_report(self) -> Dict[str, Dict[str, float]]:
+        """获取已加载agent的导入和初始化耗时"""
+        return dict(self.load_report)
+    
+    def start_eviction_sweeper(self) -> None:
+        """启动定期清理空闲超时对话的后台任务"""
+        if self._sweeper is None and self.evictor.idle_ttl and settings.EVICTION_SWEEP_INTERVAL > 0:
+            self._sweeper = asyncio.create_task(self.evictor.run_sweeper(settings.EVICTION_SWEEP_INTERVAL))
+    
+    async def stop_eviction_sweeper(self) -> None:
+        """停止后台清理任务，等待尚未完成的对话写出"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        await asyncio.to_thread(self.evictor.close)
+    
+    def get_eviction_stats(self) -> Dict[str, Any]:
+        """获取对话淘汰统计信息"""
+        return self.evictor.get_stats()
 
 # 全局agent管理器实例
 agent_manager = AgentManager()
\ No newline at end of file
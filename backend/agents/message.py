@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+对话历史消息记录
+
+内存中的每条历史消息使用带__slots__的紧凑记录，而不是每条一个字典：
+角色字符串经过intern在所有消息间共享，时间戳保存为epoch浮点数，
+只在需要展示或持久化时才格式化。记录支持按键读取（message["role"]、
+message.get("tokens")），原先按字典读取历史的代码无需修改。
+记录上还缓存了该消息发送给模型时的格式，每条消息只转换一次。
+"""
+
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+from utils.helpers import format_timestamp, count_message_tokens
+
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+class Message:
+    """一条对话历史消息"""
+
+    __slots__ = ("role", "content", "created", "tokens", "prompt")
+
+    # 支持按键读取的字段（与持久化的字典格式一致）
+    FIELDS = ("role", "content", "timestamp", "tokens")
+
+    def __init__(self, role: str, content: str, created: Optional[float] = None, tokens: Optional[int] = None):
+        """
+        Args:
+            role: 角色（user/assistant/system）
+            content: 消息内容
+            created: 创建时间（epoch秒），为None时使用当前时间
+            tokens: 估算的token数，为None时在创建时计算
+        """
+        self.role = sys.intern(role)
+        self.content = content
+        self.created = time.time() if created is None else created
+        # token数在写入时计算一次，之后构建提示词时直接复用
+        self.tokens = count_message_tokens(content) if tokens is None else tokens
+        # 发送给模型的消息对象，由所属agent在首次构建提示词时填充
+        self.prompt: Any = None
+
+    @property
+    def timestamp(self) -> str:
+        """格式化的创建时间"""
+        return format_timestamp(datetime.fromtimestamp(self.created))
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """按键读取字段，不存在时返回default"""
+        if key not in self.FIELDS:
+            return default
+        return getattr(self, key)
+
+    def keys(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为持久化使用的字典格式"""
+        return {
+            "role": self.role,
+            "content": self.content,
+            "timestamp": self.timestamp,
+            "tokens": self.tokens
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Message":
+        """从存储或磁盘加载的字典创建记录"""
+        created = None
+        timestamp = data.get("timestamp")
+        if timestamp:
+            try:
+                created = datetime.strptime(timestamp, _TIMESTAMP_FORMAT).timestamp()
+            except ValueError:
+                pass
+        return cls(data["role"], data["content"], created, data.get("tokens"))
+
+    def __repr__(self) -> str:
+        return f"<Message {self.role}: {self.content[:20]!r}>"
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Agent注册表
+
+Agent通过元数据（AgentSpec）声明，元数据足以响应GET /agents；
+实现类只在首次使用时才导入和实例化。除内置agent外，
+还可以通过entry point（agentarena.agents）或AGENT_PLUGINS配置发现插件agent。
+"""
+
+import importlib
+from dataclasses import dataclass
+from importlib.metadata import entry_points
+from typing import Any, Dict, List
+from core.config import settings
+from core.logging import logger
+
+@dataclass(frozen=True)
+class AgentSpec:
+    """Agent元数据"""
+    name: str
+    display_name: str
+    description: str
+    # 实现类的导入路径，格式为 "package.module:ClassName"
+    target: str
+    version: str = "1.0.0"
+    
+    def load_class(self) -> Any:
+        """导入并返回实现类"""
+        module_name, _, class_name = self.target.partition(":")
+        module = importlib.import_module(module_name)
+        return getattr(module, class_name)
+    
+    def to_info(self) -> Dict[str, str]:
+        """转换为agent列表接口使用的信息"""
+        return {
+            "name": self.name,
+            "display_name": self.display_name,
+            "description": self.description,
+            "version": self.version
+        }
+
+# 内置agent
+BUILTIN_AGENTS: List[AgentSpec] = [
+    AgentSpec(
+        name="simple_chat",
+        display_name="简单对话",
+        description="基础的ChatGPT对话功能，适合日常聊天和简单问答",
+        target="agents.simple_chat:SimpleChatAgent"
+    ),
+    AgentSpec(
+        name="langchain_agent",
+        display_name="智能助手",
+        description="具备工具调用能力的智能助手，可以获取时间、进行计算、查询天气等",
+        target="agents.langchain_agent:LangChainAgent"
+    ),
+]
+
+# 插件agent的entry point分组
+ENTRY_POINT_GROUP = "agentarena.agents"
+
+def _resolve_spec(reference: str) -> Any:
+    """按 "module:attribute" 导入插件声明的AgentSpec"""
+    module_name, _, attribute = reference.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+def discover_agent_specs() -> List[AgentSpec]:
+    """
+    发现所有可用的agent
+    
+    插件模块只应包含AgentSpec声明，实现类通过target延迟导入。
+    
+    Returns:
+        agent元数据列表（同名时后发现的覆盖先发现的）
+    """
+    specs: Dict[str, AgentSpec] = {spec.name: spec for spec in BUILTIN_AGENTS}
+    
+    candidates = []
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        candidates.append((entry_point.value, entry_point.load))
+    for reference in settings.AGENT_PLUGINS:
+        candidates.append((reference, lambda reference=reference: _resolve_spec(reference)))
+    
+    for reference, load in candidates:
+        try:
+            spec = load()
+        except Exception as e:
+            logger.error("加载agent插件 %s 失败: %s", reference, e)
+            continue
+        if not isinstance(spec, AgentSpec):
+            logger.error("agent插件 %s 不是AgentSpec实例，已忽略", reference)
+            continue
+        specs[spec.name] = spec
+    
+    return list(specs.values())
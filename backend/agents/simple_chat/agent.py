@@ -1,20 +1,32 @@
+import asyncio
 import os
 from pyexpat import model
 import re
-from typing import List
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 # from openai import ChatOpenAIs
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 from ..base import BaseAgent
+from ..message import Message
 from core.config import settings
-from core.logging import logger
+from core.llm import create_chat_model, instrumentation_callbacks
+from core.model_router import DEFAULT_ROUTE, ModelRouter
+from core.tracing import span
+from core.logging import log_chat_message, logger
 
 # 加载环境变量
 load_dotenv()
 
+# 对话压缩使用的提示词
+SUMMARY_INSTRUCTION = (
+    "请将以下对话压缩为一段简洁的摘要，保留用户提供的关键信息、偏好、"
+    "已得出的结论和尚未解决的问题，不超过300字，直接输出摘要内容。"
+)
+
 class SimpleChatAgent(BaseAgent):
     """简单聊天Agent - 基础的ChatGPT对话功能"""
     
+    compaction_enabled = settings.COMPACTION_ENABLED
+    
     def __init__(self):
         super().__init__(
             name="simple_chat",
@@ -23,18 +35,40 @@ class SimpleChatAgent(BaseAgent):
             version="1.0.0"
         )
         
-        # 初始化OpenAI客户端
+        # 初始化OpenAI客户端（使用共享的HTTP连接池）
         api_key = settings.OPENAI_API_KEY
-        api_base = settings.OPENAI_API_BASE
-        model_name = settings.OPENAI_MODEL
+        self.temperature = 0.7
         if not api_key:
             logger.warning("未设置OPENAI_API_KEY，SimpleChatAgent可能无法正常工作")
             self.client = None
         else:
-            self.client = ChatOpenAI(api_key=api_key, base_url=api_base, model=model_name)
+            self.client = create_chat_model(
+                temperature=self.temperature,
+                callbacks=instrumentation_callbacks(self.name)
+            )
         
         self.model = settings.OPENAI_MODEL
         
+        # 模型路由：简单请求发给更快的小模型，失败时回退到默认模型
+        self.clients = {DEFAULT_ROUTE: self.client}
+        self.model_router: Optional[ModelRouter] = None
+        if self.client and settings.FAST_MODEL and settings.FAST_MODEL != self.model:
+            self.model_router = ModelRouter(
+                self.name,
+                self.model,
+                settings.FAST_MODEL,
+                max_chars=settings.MODEL_ROUTING_MAX_CHARS,
+                max_context_tokens=settings.MODEL_ROUTING_MAX_CONTEXT_TOKENS,
+                failure_threshold=settings.MODEL_ROUTING_FAILURE_THRESHOLD,
+                cooldown=settings.MODEL_ROUTING_COOLDOWN
+            )
+            for route in self.model_router.routes:
+                if route != DEFAULT_ROUTE:
+                    self.clients[route] = create_chat_model(
+                        model=self.model_router.model_for(route),
+                        temperature=self.temperature,
+                        callbacks=instrumentation_callbacks(self.name)
+                    )
 
     
     async def process_message(self, message: str, conversation_id: str = "default") -> str:
@@ -47,11 +81,7 @@ class SimpleChatAgent(BaseAgent):
             self.add_to_conversation(conversation_id, "user", message)
             
             # 获取对话历史（转换为OpenAI格式）
-            history = self.get_conversation_history(conversation_id)
-            openai_messages = [
-                {"role": msg["role"], "content": msg["content"]}
-                for msg in history
-            ]
+            openai_messages = self._build_messages(conversation_id)
             
             # 调用OpenAI API
             # response = await self.client.ainvoke(
@@ -60,30 +90,183 @@ class SimpleChatAgent(BaseAgent):
             #     }
             # )
 
-            response = await self.client.ainvoke(openai_messages)
-
-            print(response)
+            route, reason, model = self._choose_route(message, conversation_id)
             
-            # ai_response = response.choices[0].message.content
-            ai_response = response.content
+            # 相同的消息窗口直接返回缓存的回复
+            cache_key, ai_response = await self.lookup_response_cache(openai_messages, model)
+            if ai_response is None:
+                # 并发的相同请求共享同一次上游调用
+                response, answered_model = await self.coalesce(
+                    openai_messages,
+                    lambda: self._invoke(route, reason, openai_messages),
+                    model
+                )
+                
+                # ai_response = response.choices[0].message.content
+                ai_response = response.content
+                # 快速模型回退时按实际回答的模型缓存
+                if cache_key and answered_model != model:
+                    cache_key = self.prompt_key(openai_messages, answered_model)
+                self.store_response_cache(cache_key, ai_response)
             
             # 添加AI回复到历史
             self.add_to_conversation(conversation_id, "assistant", ai_response)
+            self.schedule_compaction(conversation_id)
             
-            logger.info(f"SimpleChatAgent处理消息: {message[:50]}... -> {ai_response[:50]}...")
+            log_chat_message("SimpleChatAgent处理消息: %s... -> %s...", message[:50], ai_response[:50])
             
             return ai_response
             
+        except asyncio.CancelledError:
+            # 客户端断开等原因取消请求：不记录助手回复，已记录的用户消息保留
+            logger.info("SimpleChatAgent取消对话 %s 的处理", conversation_id)
+            raise
         except Exception as e:
             error_msg = f"抱歉，处理您的消息时出现错误: {str(e)}"
-            logger.error(f"SimpleChatAgent错误: {str(e)}")
+            logger.error("SimpleChatAgent错误: %s", e)
             return error_msg
     
+    async def stream_message(self, message: str, conversation_id: str = "default") -> AsyncIterator[str]:
+        """流式处理用户消息，逐token输出回复"""
+        if not self.client:
+            yield "抱歉，OpenAI API未配置，无法处理您的消息。请检查OPENAI_API_KEY环境变量。"
+            return
+        
+        # 添加用户消息到历史
+        self.add_to_conversation(conversation_id, "user", message)
+        openai_messages = self._build_messages(conversation_id)
+        route, reason, model = self._choose_route(message, conversation_id)
+        
+        chunks: List[str] = []
+        try:
+            cache_key, cached = await self.lookup_response_cache(openai_messages, model)
+            if cached is not None:
+                chunks.append(cached)
+                yield cached
+                return
+            
+            answered_model = model
+            if self.model_router:
+                def call(name: str) -> AsyncIterator[Any]:
+                    nonlocal answered_model
+                    answered_model = self.model_router.model_for(name)
+                    return self.clients[name].astream(openai_messages)
+                stream = self.model_router.stream(route, reason, call)
+            else:
+                stream = self.client.astream(openai_messages)
+            async for chunk in stream:
+                if chunk.content:
+                    chunks.append(chunk.content)
+                    yield chunk.content
+            # 只缓存完整生成的回复，快速模型回退时按实际回答的模型缓存
+            if cache_key and answered_model != model:
+                cache_key = self.prompt_key(openai_messages, answered_model)
+            self.store_response_cache(cache_key, "".join(chunks))
+        except Exception as e:
+            logger.error("SimpleChatAgent流式错误: %s", e)
+            if not chunks:
+                yield f"抱歉，处理您的消息时出现错误: {str(e)}"
+        finally:
+            # 流正常结束或被中断时，提交已生成的回复
+            if chunks:
+                ai_response = "".join(chunks)
+                self.add_to_conversation(conversation_id, "assistant", ai_response)
+                self.schedule_compaction(conversation_id)
+                log_chat_message("SimpleChatAgent流式处理消息: %s... -> %s...", message[:50], ai_response[:50])
+    
+    async def _process_batch_round(self, batch: List[Tuple[int, str, str]],
+                                   max_concurrency: int) -> AsyncIterator[Tuple[int, Optional[str], Optional[Exception]]]:
+        """
+        以有限并发调用上游处理一轮消息，按完成顺序产出结果
+        
+        批量接口关注吞吐而不是单条延迟，不经过模型路由，全部使用默认模型。
+        不使用client.abatch：它同样逐条调用ainvoke，逐条调用才能让每次调用各自占用准入槽位。
+        """
+        if not self.client:
+            for index, _, _ in batch:
+                yield index, None, RuntimeError("OpenAI API未配置，请检查OPENAI_API_KEY环境变量")
+            return
+        
+        pending = []
+        for index, message, conversation_id in batch:
+            self.add_to_conversation(conversation_id, "user", message)
+            openai_messages = self._build_messages(conversation_id)
+            cache_key, cached = await self.lookup_response_cache(openai_messages)
+            if cached is not None:
+                self.add_to_conversation(conversation_id, "assistant", cached)
+                yield index, cached, None
+            else:
+                pending.append((index, conversation_id, cache_key, openai_messages))
+        
+        if not pending:
+            return
+        
+        # 每次上游调用各占用一个准入槽位，被拒绝时只影响这一条
+        calls = [
+            lambda openai_messages=openai_messages: self.client.ainvoke(openai_messages)
+            for _, _, _, openai_messages in pending
+        ]
+        async for position, response in self._run_admitted(calls, max_concurrency):
+            index, conversation_id, cache_key, _ = pending[position]
+            if isinstance(response, Exception):
+                logger.error("SimpleChatAgent批量处理错误: %s", response)
+                yield index, None, response
+                continue
+            
+            ai_response = response.content
+            self.store_response_cache(cache_key, ai_response)
+            self.add_to_conversation(conversation_id, "assistant", ai_response)
+            self.schedule_compaction(conversation_id)
+            yield index, ai_response, None
+    
+    async def summarize(self, messages: List[Message]) -> str:
+        """使用同一个模型客户端将较早的对话压缩为摘要"""
+        role_names = {"user": "用户", "assistant": "助手", "system": "系统"}
+        transcript = "\n".join(
+            f"{role_names.get(msg.role, msg.role)}: {msg.content}"
+            for msg in messages
+        )
+        response = await self.client.ainvoke([
+            {"role": "system", "content": SUMMARY_INSTRUCTION},
+            {"role": "user", "content": transcript}
+        ])
+        return response.content
+    
+    def _choose_route(self, message: str, conversation_id: str) -> Tuple[str, str, str]:
+        """为本轮请求选择模型路由，返回 (路由, 原因, 模型)；路由在实际调用模型时才计入指标"""
+        if not self.model_router:
+            return DEFAULT_ROUTE, "", self.model
+        with span("route") as route_span:
+            context_tokens = sum(record.tokens for record in self.get_prompt_window(conversation_id))
+            route, reason = self.model_router.choose(message, context_tokens)
+            model = self.model_router.model_for(route)
+            route_span.set_attribute("route", route)
+            route_span.set_attribute("model", model)
+            return route, reason, model
+    
+    async def _invoke(self, route: str, reason: str, messages: List[Dict[str, str]]) -> Tuple[Any, str]:
+        """按路由调用模型，快速模型失败时回退到默认模型，返回 (回复, 实际回答的模型)"""
+        if not self.model_router:
+            return await self.client.ainvoke(messages), self.model
+        
+        async def call(name: str) -> Tuple[Any, str]:
+            return await self.clients[name].ainvoke(messages), self.model_router.model_for(name)
+        return await self.model_router.run(route, reason, call)
+    
+    def _build_messages(self, conversation_id: str) -> List[Dict[str, str]]:
+        """将token预算内的对话历史窗口转换为OpenAI消息格式"""
+        with span("history") as history_span:
+            # 每条消息的OpenAI格式缓存在历史记录上，不必每轮重建
+            messages = self.get_prompt_messages(conversation_id)
+            history_span.set_attribute("messages", len(messages))
+            return messages
+    
     def get_capabilities(self) -> List[str]:
         """获取Agent能力列表"""
         return [
             "基础对话",
             "问答回复",
             "文本生成",
-            "多轮对话"
+            "多轮对话",
+            "流式输出"
         ]
\ No newline at end of file
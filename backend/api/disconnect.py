@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+客户端断开检测
+
+非流式接口在读取请求体后不会再读取连接，客户端关闭页面或超时放弃后，
+agent仍会等到上游调用和工具循环全部完成，白白占用并发槽位和token。
+这里在等待agent的同时监听ASGI的http.disconnect消息，客户端断开时取消agent任务。
+流式接口由StreamingResponse自行监听断开并取消生成器。
+"""
+
+import asyncio
+from typing import Awaitable, TypeVar
+from fastapi import Request
+from core.config import settings
+from core.logging import logger
+from core.metrics import CLIENT_DISCONNECTS
+
+T = TypeVar("T")
+
+# 客户端断开时返回的状态码（沿用nginx的约定，客户端不会收到）
+CLIENT_CLOSED_REQUEST = 499
+
+class ClientDisconnected(Exception):
+    """客户端在请求处理完成前断开了连接"""
+
+async def _wait_for_disconnect(request: Request) -> None:
+    """等待客户端断开（请求体已被读取，之后收到的只会是断开消息）"""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T], endpoint: str) -> T:
+    """
+    等待awaitable完成，期间客户端断开则取消它
+
+    Args:
+        request: 当前请求
+        awaitable: agent调用
+        endpoint: 记录到指标中的接口名称
+
+    Returns:
+        awaitable的结果
+
+    Raises:
+        ClientDisconnected: 客户端已断开，agent任务已被取消
+    """
+    if not settings.CANCEL_ON_DISCONNECT:
+        return await awaitable
+
+    task = asyncio.ensure_future(awaitable)
+    watcher = asyncio.create_task(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait((task, watcher), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # 请求自身被取消（如服务关闭）时同样取消agent任务
+        for pending in (watcher, task):
+            if not pending.done():
+                pending.cancel()
+
+    if not task.done() or task.cancelled():
+        # 等待agent处理完取消（释放对话锁和准入槽位、提交部分结果）
+        await asyncio.gather(task, return_exceptions=True)
+        record_disconnect(endpoint)
+        raise ClientDisconnected()
+    return task.result()
+
+def record_disconnect(endpoint: str) -> None:
+    """记录一次因客户端断开而取消的请求"""
+    CLIENT_DISCONNECTS.labels(endpoint).inc()
+    logger.info("客户端已断开，取消 %s 请求", endpoint)
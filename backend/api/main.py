@@ -1,11 +1,25 @@
+import asyncio
+import json
 from typing import List
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
+from core.cache import close_response_cache, get_response_cache
+from core.concurrency import AdmissionRejected, admission
 from core.config import settings
-from core.logging import logger
-from models import ChatMessage, ChatResponse, AgentInfo
+from core.http import close_http_clients, get_upstream_router, prewarm_connections
+from core.logging import log_chat_message, logger
+from core.sandbox import tool_sandbox
+from core.metrics import render_metrics
+from core.tracing import span
+from core.singleflight import upstream_flights
+from models import ChatMessage, ChatResponse, ArenaRequest, BatchChatRequest, AgentInfo
 from agents import agent_manager
+from api.disconnect import CLIENT_CLOSED_REQUEST, ClientDisconnected, cancel_on_disconnect, record_disconnect
+from storage import close_conversation_store
+from utils import format_sse
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -24,9 +38,37 @@ app.add_middleware(
 
 # 数据模型已从models模块导入
 
+def admission_error(error: AdmissionRejected) -> HTTPException:
+    """将准入控制拒绝转换为带Retry-After的HTTP错误"""
+    return HTTPException(
+        status_code=error.status_code,
+        detail=error.detail,
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnected):
+    """客户端已断开，响应不会被读取"""
+    return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+@app.on_event("startup")
+async def startup():
+    """服务启动时预热上游连接，启动空闲对话的定期清理"""
+    agent_manager.start_eviction_sweeper()
+    await prewarm_connections()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """服务关闭时提交尚未写入的对话历史和回复缓存，关闭上游连接和工具进程池"""
+    await agent_manager.stop_eviction_sweeper()
+    close_conversation_store()
+    close_response_cache()
+    await close_http_clients()
+    tool_sandbox.close()
+
 @app.get("/")
 async def root():
-    return {"message": "AgentArena API服务正在运行", "available_agents": len(agent_manager.agents)}
+    return {"message": "AgentArena API服务正在运行", "available_agents": len(agent_manager.specs)}
 
 @app.get("/agents", response_model=List[AgentInfo])
 async def get_agents():
@@ -35,25 +77,31 @@ async def get_agents():
         agents = agent_manager.get_available_agents()
         return agents
     except Exception as e:
-        logger.error(f"获取agent列表错误: {str(e)}")
+        logger.error("获取agent列表错误: %s", e)
         raise HTTPException(status_code=500, detail=f"获取agent列表失败: {str(e)}")
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(chat_message: ChatMessage):
+async def chat(chat_message: ChatMessage, request: Request, http_response: Response):
     """发送消息到指定agent"""
     try:
         # 验证agent是否存在
         if not agent_manager.get_agent(chat_message.agent_name):
             raise HTTPException(status_code=400, detail=f"Agent '{chat_message.agent_name}' 不存在")
         
-        # 使用指定agent处理消息
-        response = await agent_manager.process_message(
-            agent_name=chat_message.agent_name,
-            message=chat_message.message,
-            conversation_id=chat_message.conversation_id
-        )
+        # 使用指定agent处理消息，各阶段耗时汇总到Server-Timing；客户端断开时取消处理
+        with span("chat") as request_span:
+            response = await cancel_on_disconnect(request, agent_manager.process_message(
+                agent_name=chat_message.agent_name,
+                message=chat_message.message,
+                conversation_id=chat_message.conversation_id
+            ), "chat")
+        if settings.SERVER_TIMING_ENABLED:
+            http_response.headers["Server-Timing"] = request_span.trace.server_timing()
         
-        logger.info(f"Agent {chat_message.agent_name} 对话 {chat_message.conversation_id}: 用户: {chat_message.message[:50]}... AI: {response[:50]}...")
+        log_chat_message(
+            "Agent %s 对话 %s: 用户: %s... AI: %s...",
+            chat_message.agent_name, chat_message.conversation_id, chat_message.message[:50], response[:50]
+        )
         
         return ChatResponse(
             response=response,
@@ -61,42 +109,194 @@ async def chat(chat_message: ChatMessage):
             conversation_id=chat_message.conversation_id
         )
         
-    except HTTPException:
+    except (HTTPException, ClientDisconnected):
         raise
+    except AdmissionRejected as e:
+        raise admission_error(e)
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
-        logger.error(f"聊天错误: {str(e)}")
-        logger.error(f"错误详情: {error_details}")
+        logger.error("聊天错误: %s", e)
+        logger.error("错误详情: %s", error_details)
         raise HTTPException(status_code=500, detail=f"聊天服务错误: {str(e)}")
 
+@app.post("/chat/stream")
+async def chat_stream(chat_message: ChatMessage, request: Request):
+    """以Server-Sent Events流式发送agent回复"""
+    # 验证agent是否存在
+    if not agent_manager.get_agent(chat_message.agent_name):
+        raise HTTPException(status_code=400, detail=f"Agent '{chat_message.agent_name}' 不存在")
+    
+    stream = agent_manager.stream_message(
+        agent_name=chat_message.agent_name,
+        message=chat_message.message,
+        conversation_id=chat_message.conversation_id
+    )
+    
+    # 在发送响应头之前取得首个片段，使准入控制的拒绝能以429/503返回
+    first_delta = None
+    first_error = None
+    try:
+        first_delta = await cancel_on_disconnect(request, anext(stream), "stream")
+    except ClientDisconnected:
+        await stream.aclose()
+        raise
+    except AdmissionRejected as e:
+        await stream.aclose()
+        raise admission_error(e)
+    except StopAsyncIteration:
+        pass
+    except Exception as e:
+        first_error = e
+    
+    async def event_stream():
+        try:
+            if first_error:
+                raise first_error
+            if first_delta is not None:
+                yield format_sse({"delta": first_delta})
+                async for delta in stream:
+                    yield format_sse({"delta": delta})
+            
+            yield format_sse({
+                "agent_name": chat_message.agent_name,
+                "conversation_id": chat_message.conversation_id
+            }, event="done")
+        except asyncio.CancelledError:
+            # 客户端断开：StreamingResponse取消生成器，agent提交已生成的部分回复
+            record_disconnect("stream")
+            raise
+        except Exception as e:
+            logger.error("流式聊天错误: %s", e)
+            yield format_sse({"detail": f"聊天服务错误: {str(e)}"}, event="error")
+        finally:
+            await stream.aclose()
+    
+    # 客户端在响应开始前断开时event_stream不会被迭代，由后台任务关闭agent的流，
+    # 释放对话锁和准入槽位（已关闭的流再次关闭不做任何事）
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(stream.aclose)
+    )
+
+@app.post("/chat/batch")
+async def chat_batch(batch_request: BatchChatRequest):
+    """批量处理相互独立的消息，以NDJSON按完成顺序逐行返回每条消息的结果"""
+    items = [
+        {
+            "agent_name": item.agent_name,
+            "message": item.message,
+            "conversation_id": item.conversation_id
+        }
+        for item in batch_request.items
+    ]
+    
+    async def result_stream():
+        succeeded = failed = 0
+        try:
+            async for result in agent_manager.process_batch(items, max_concurrency=batch_request.max_concurrency):
+                if "error" in result:
+                    failed += 1
+                else:
+                    succeeded += 1
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        except asyncio.CancelledError:
+            # 客户端断开时取消尚未完成的条目
+            record_disconnect("batch")
+            raise
+        logger.info("批量聊天完成: %d 条成功, %d 条失败", succeeded, failed)
+    
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+@app.post("/arena")
+async def arena(arena_request: ArenaRequest):
+    """把同一条消息并发发送给多个agent，以Server-Sent Events按到达顺序返回各agent的回复"""
+    # 去重并保持顺序
+    agent_names = list(dict.fromkeys(arena_request.agent_names))
+    missing = [name for name in agent_names if not agent_manager.has_agent(name)]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Agent {', '.join(missing)} 不存在")
+    
+    async def event_stream():
+        results = {}
+        try:
+            async for event in agent_manager.arena_stream(
+                agent_names,
+                arena_request.message,
+                conversation_id=arena_request.conversation_id,
+                timeout=arena_request.timeout
+            ):
+                kind = event.pop("event")
+                if kind == "delta":
+                    yield format_sse(event)
+                    continue
+                results[event["agent_name"]] = {
+                    "status": "ok" if kind == "agent_done" else ("timeout" if event["timed_out"] else "error"),
+                    "latency_ms": event["latency_ms"],
+                    "first_token_ms": event.get("first_token_ms")
+                }
+                yield format_sse(event, event=kind)
+            
+            yield format_sse({
+                "conversation_id": arena_request.conversation_id,
+                "results": results
+            }, event="done")
+        except asyncio.CancelledError:
+            # 客户端断开时取消仍在运行的agent
+            record_disconnect("arena")
+            raise
+        except Exception as e:
+            logger.error("竞技场错误: %s", e)
+            yield format_sse({"detail": f"竞技场服务错误: {str(e)}"}, event="error")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.delete("/chat/{agent_name}/{conversation_id}")
 async def clear_conversation(agent_name: str, conversation_id: str):
     """清除指定agent的对话历史"""
     try:
-        success = agent_manager.clear_conversation(agent_name, conversation_id)
+        success = await agent_manager.clear_conversation(agent_name, conversation_id)
         if success:
             return {"message": f"Agent {agent_name} 的对话 {conversation_id} 已清除"}
         else:
             return {"message": "对话不存在或agent不存在"}
     except Exception as e:
-        logger.error(f"清除对话错误: {str(e)}")
+        logger.error("清除对话错误: %s", e)
         raise HTTPException(status_code=500, detail=f"清除对话失败: {str(e)}")
 
 @app.get("/stats")
 async def get_stats():
     """获取所有agent的统计信息"""
     try:
-        stats = agent_manager.get_agent_stats()
+        stats = await agent_manager.get_agent_stats()
+        stats["eviction"] = agent_manager.get_eviction_stats()
+        stats["response_cache"] = get_response_cache().get_stats()
+        stats["singleflight"] = upstream_flights.get_stats()
+        stats["admission"] = admission.get_stats()
+        stats["agent_loading"] = agent_manager.get_load_report()
+        stats["tool_sandbox"] = tool_sandbox.get_stats()
+        stats["upstream"] = get_upstream_router().get_stats()
+        stats["model_routing"] = agent_manager.get_model_routing_stats()
         return stats
     except Exception as e:
-        logger.error(f"获取统计信息错误: {str(e)}")
+        logger.error("获取统计信息错误: %s", e)
         raise HTTPException(status_code=500, detail=f"获取统计信息失败: {str(e)}")
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """以Prometheus文本格式导出请求、上游调用、token和工具调用指标"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health")
 async def health_check():
     """健康检查接口"""
-    return {"status": "healthy", "service": "AgentArena API", "agents_count": len(agent_manager.agents)}
+    return {"status": "healthy", "service": "AgentArena API", "agents_count": len(agent_manager.specs)}
 
 if __name__ == "__main__":
     import uvicorn
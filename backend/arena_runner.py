@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+AgentArena 离线竞技场运行器
+
+读取JSONL格式的提示集，用多个已注册的agent逐条作答，结果逐行追加写入JSONL文件。
+输出文件同时也是检查点：中断后使用相同参数重新运行，已成功的 (id, agent) 会被跳过，
+只补跑剩余和失败的条目。重跑的条目会追加新的一行，同一 (id, agent) 以最后一行为准。运行结束后按agent汇总吞吐量、延迟百分位和失败率。
+
+输入每行一个JSON对象：
+    {"id": "q1", "message": "你好"}
+id缺省时使用行号，message也可以写作prompt。
+
+输出每行一条结果，字段固定，可以直接用pandas/pyarrow按列读取：
+    {"id", "agent_name", "message", "response", "error", "latency_ms", "completed_at"}
+
+用法（在backend目录下运行）:
+    python arena_runner.py prompts.jsonl -o results.jsonl --agents simple_chat,langchain_agent --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Set, Tuple
+
+from agents import agent_manager
+from core.logging import logger
+from utils.helpers import percentile
+
+def load_prompts(path: str) -> List[Dict[str, str]]:
+    """读取JSONL提示集"""
+    prompts = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            message = record.get("message") or record.get("prompt")
+            if not message:
+                raise ValueError(f"{path} 第{line_number}行缺少message字段")
+            prompts.append({"id": str(record.get("id", line_number)), "message": message})
+    return prompts
+
+def load_checkpoint(path: str, retry_failed: bool = True) -> Tuple[Set[Tuple[str, str]], List[Dict[str, Any]]]:
+    """
+    从已有的输出文件恢复进度
+
+    同一 (id, agent) 有多行记录时（失败后重跑）以最后一行为准。崩溃时可能留下写了一半的
+    最后一行，会被截掉以便继续追加；其他无法解析或缺少字段的行记录警告后跳过。
+
+    Returns:
+        (已完成的 (id, agent) 集合, 已完成的结果记录)
+    """
+    completed: Set[Tuple[str, str]] = set()
+    records: List[Dict[str, Any]] = []
+    if not os.path.exists(path):
+        return completed, records
+
+    latest: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    valid_size = 0
+    with open(path, "rb") as f:
+        for line_number, raw in enumerate(f, start=1):
+            if not raw.endswith(b"\n"):
+                break
+            valid_size += len(raw)
+            if not raw.strip():
+                continue
+            try:
+                record = json.loads(raw)
+                key = (str(record["id"]), str(record["agent_name"]))
+            except (ValueError, KeyError, TypeError):
+                logger.warning("跳过检查点中无法解析的记录: %s 第%s行", path, line_number)
+                continue
+            latest[key] = record
+
+    for key, record in latest.items():
+        if retry_failed and record.get("error") is not None:
+            continue
+        completed.add(key)
+        records.append(record)
+
+    if valid_size < os.path.getsize(path):
+        logger.warning("截断输出文件中不完整的记录: %s", path)
+        with open(path, "r+b") as f:
+            f.truncate(valid_size)
+    return completed, records
+
+async def run_tournament(prompts: List[Dict[str, str]], agent_names: List[str], output_path: str,
+                         concurrency: int, completed: Set[Tuple[str, str]]) -> float:
+    """
+    以有限并发运行所有未完成的 (提示, agent) 组合，结果逐行写入输出文件
+
+    每个条目作为单条批次交给agent_manager.process_batch，以便拿到真实的单条延迟和错误；
+    每个提示使用独立的对话，作答后立即清除历史，长时间运行时内存不会增长。
+
+    Returns:
+        运行耗时（秒）
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for prompt in prompts:
+        for agent_name in agent_names:
+            if (prompt["id"], agent_name) not in completed:
+                queue.put_nowait((prompt, agent_name))
+    total = queue.qsize()
+    done = 0
+
+    async def worker(output):
+        nonlocal done
+        while True:
+            try:
+                prompt, agent_name = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            conversation_id = f"arena-{prompt['id']}"
+            await agent_manager.clear_conversation(agent_name, conversation_id)
+            started = time.perf_counter()
+            result: Dict[str, Any] = {"error": "未返回结果"}
+            try:
+                async for result in agent_manager.process_batch([{
+                    "agent_name": agent_name,
+                    "message": prompt["message"],
+                    "conversation_id": conversation_id
+                }], max_concurrency=1):
+                    pass
+            except Exception as e:
+                result = {"error": str(e) or type(e).__name__}
+            latency_ms = (time.perf_counter() - started) * 1000
+            await agent_manager.clear_conversation(agent_name, conversation_id)
+
+            record = {
+                "id": prompt["id"],
+                "agent_name": agent_name,
+                "message": prompt["message"],
+                "response": result.get("response"),
+                "error": result.get("error"),
+                "latency_ms": round(latency_ms, 1),
+                "completed_at": datetime.now().isoformat()
+            }
+            # 单线程事件循环中整行写入，不会与其他worker交错
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+
+            done += 1
+            if done % 100 == 0 or done == total:
+                logger.info("进度: %s/%s", done, total)
+
+    # 先完成agent的延迟加载，避免把导入耗时计入吞吐量
+    for agent_name in agent_names:
+        agent_manager.get_agent(agent_name)
+
+    started = time.monotonic()
+    with open(output_path, "a", encoding="utf-8") as output:
+        await asyncio.gather(*(worker(output) for _ in range(max(1, concurrency))))
+        output.flush()
+        os.fsync(output.fileno())
+    return time.monotonic() - started
+
+def summarize(records: List[Dict[str, Any]], agent_names: List[str], elapsed: float) -> Dict[str, Dict[str, float]]:
+    """按agent汇总吞吐量、延迟百分位和失败率"""
+    report = {}
+    for agent_name in agent_names:
+        agent_records = [r for r in records if r["agent_name"] == agent_name]
+        latencies = [r["latency_ms"] for r in agent_records if r.get("error") is None]
+        failed = len(agent_records) - len(latencies)
+        report[agent_name] = {
+            "items": len(agent_records),
+            "failed": failed,
+            "failure_rate": failed / len(agent_records) if agent_records else 0.0,
+            "throughput": len(agent_records) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99)
+        }
+    return report
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AgentArena离线竞技场运行器")
+    parser.add_argument("prompts", help="JSONL格式的提示集")
+    parser.add_argument("-o", "--output", required=True, help="结果输出文件（JSONL，同时作为检查点）")
+    parser.add_argument("--agents", default="", help="逗号分隔的agent名称，默认使用全部已注册agent")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时进行的条目数")
+    parser.add_argument("--no-retry-failed", action="store_true", help="恢复运行时不重跑此前失败的条目")
+    parser.add_argument("--report", help="将汇总报告另存为JSON文件")
+    args = parser.parse_args()
+
+    agent_names = [name.strip() for name in args.agents.split(",") if name.strip()] or list(agent_manager.specs)
+    missing = [name for name in agent_names if not agent_manager.has_agent(name)]
+    if missing:
+        parser.error(f"agent不存在: {', '.join(missing)}")
+
+    prompts = load_prompts(args.prompts)
+    completed, previous = load_checkpoint(args.output, retry_failed=not args.no_retry_failed)
+    if completed:
+        logger.info("从检查点恢复: 已完成 %s 个条目", len(completed))
+
+    offset = os.path.getsize(args.output) if os.path.exists(args.output) else 0
+    try:
+        elapsed = asyncio.run(run_tournament(prompts, agent_names, args.output, args.concurrency, completed))
+    except KeyboardInterrupt:
+        print("已中断，使用相同参数重新运行即可从检查点继续", file=sys.stderr)
+        sys.exit(130)
+
+    # 只用本次运行写入的记录计算吞吐量和延迟
+    with open(args.output, "rb") as f:
+        f.seek(offset)
+        records = [json.loads(line) for line in f if line.strip()]
+    report = summarize(records, agent_names, elapsed)
+
+    print()
+    print(f"本次运行 {len(records)} 个条目，耗时 {elapsed:.1f}s（检查点中已有 {len(previous)} 个）")
+    print(f"{'agent':<20} {'items':>6} {'items/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>6} {'fail %':>6}")
+    for agent_name, r in report.items():
+        print(f"{agent_name:<20} {r['items']:>6} {r['throughput']:>8.2f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['failed']:>6} {r['failure_rate'] * 100:>6.1f}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"elapsed": elapsed, "agents": report}, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
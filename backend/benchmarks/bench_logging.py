@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+日志对事件循环阻塞的基准测试
+
+模拟一个写得慢的stdout（管道另一端的读取方每行都会停顿），在事件循环中并发
+记录聊天日志，同时用一个每毫秒唤醒一次的监视协程测量事件循环的延迟。
+分别使用同步的StreamHandler和后台线程写出的DeferredQueueHandler，对比两者的
+循环延迟和单次日志调用耗时。
+
+用法（在backend目录下运行）:
+    python -m benchmarks.bench_logging --lines 5000 --reader-delay-us 200
+"""
+
+import argparse
+import asyncio
+import io
+import logging
+import queue
+import subprocess
+import sys
+import time
+from logging.handlers import QueueListener
+from typing import Dict, List
+
+from core.logging import DeferredQueueHandler
+from utils.helpers import percentile
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+def start_slow_reader(delay_us: float) -> subprocess.Popen:
+    """启动一个逐行读取并在每行后停顿的进程，模拟慢速的stdout消费方"""
+    code = (
+        "import sys, time\n"
+        f"delay = {delay_us / 1e6}\n"
+        "for _ in sys.stdin.buffer:\n"
+        "    time.sleep(delay)\n"
+    )
+    return subprocess.Popen([sys.executable, "-c", code], stdin=subprocess.PIPE)
+
+async def run(logger: logging.Logger, lines: int, writers: int) -> Dict[str, float]:
+    """并发记录日志，同时测量事件循环延迟"""
+    lags: List[float] = []
+    call_times: List[float] = []
+    done = asyncio.Event()
+
+    async def monitor() -> None:
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - started - 0.001)
+
+    async def writer(index: int) -> None:
+        for i in range(lines // writers):
+            started = time.perf_counter()
+            logger.info("Agent %s 对话 %s: 用户: %s... AI: %s...", "simple_chat", f"conv-{index}",
+                        "你好，请介绍一下你自己" * 2, "我是一个AI助手，很高兴为你服务" * 2)
+            call_times.append(time.perf_counter() - started)
+            # 模拟两次日志之间的请求处理
+            await asyncio.sleep(0)
+
+    monitor_task = asyncio.create_task(monitor())
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(i) for i in range(writers)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await monitor_task
+
+    return {
+        "elapsed_s": elapsed,
+        "call_p50_us": percentile(call_times, 50) * 1e6,
+        "call_p99_us": percentile(call_times, 99) * 1e6,
+        "lag_p99_ms": percentile(lags, 99) * 1000,
+        "lag_max_ms": max(lags) * 1000 if lags else 0.0
+    }
+
+def benchmark(mode: str, lines: int, writers: int, delay_us: float) -> Dict[str, float]:
+    """使用指定的日志方式运行一轮"""
+    reader = start_slow_reader(delay_us)
+    stream = io.TextIOWrapper(reader.stdin, encoding="utf-8", line_buffering=True)
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    logger = logging.getLogger(f"bench.{mode}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    listener = None
+    if mode == "queue":
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        listener = QueueListener(log_queue, stream_handler)
+        listener.start()
+        logger.addHandler(DeferredQueueHandler(log_queue))
+    else:
+        logger.addHandler(stream_handler)
+
+    try:
+        result = asyncio.run(run(logger, lines, writers))
+    finally:
+        # 等待后台线程写完，保证两种方式写出的内容相同
+        if listener:
+            listener.stop()
+        logger.handlers.clear()
+        stream.close()
+        reader.wait()
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="日志对事件循环阻塞的基准测试")
+    parser.add_argument("--lines", type=int, default=5000, help="日志行数")
+    parser.add_argument("--writers", type=int, default=50, help="并发写日志的协程数")
+    parser.add_argument("--reader-delay-us", type=float, default=200.0, help="stdout消费方每行的停顿（微秒）")
+    args = parser.parse_args()
+
+    results = {mode: benchmark(mode, args.lines, args.writers, args.reader_delay_us) for mode in ("sync", "queue")}
+
+    print(f"{'handler':>8} {'elapsed s':>10} {'call p50 us':>12} {'call p99 us':>12} {'lag p99 ms':>11} {'lag max ms':>11}")
+    for mode, r in results.items():
+        print(f"{mode:>8} {r['elapsed_s']:>10.2f} {r['call_p50_us']:>12.1f} {r['call_p99_us']:>12.1f} "
+              f"{r['lag_p99_ms']:>11.2f} {r['lag_max_ms']:>11.2f}")
+
+if __name__ == "__main__":
+    main()
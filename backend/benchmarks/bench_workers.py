@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+多worker扩展性基准测试
+
+启动本地模拟上游和使用共享对话状态（CONVERSATION_STORE=shared）的后端，
+分别以不同worker数压测/chat，输出吞吐量随worker数的变化。
+每个虚拟用户在同一对话中连续发送多轮消息，并根据模拟上游的回复
+校验历史是否完整，以验证后续消息落到任意worker上都能拿到完整历史。
+
+用法（在backend目录下运行）:
+    python -m benchmarks.bench_workers --workers 1,2,4 --concurrency 32 --duration 15
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.process import start_process, stop_process, wait_until_ready
+from utils.helpers import percentile
+
+async def virtual_user(client: httpx.AsyncClient, base_url: str, turns: int, deadline: float,
+                       latencies: List[float], stats: Dict[str, int]) -> None:
+    """虚拟用户：在新对话中连续发送多轮消息，直到压测结束"""
+    while time.monotonic() < deadline:
+        conversation_id = f"bench-{uuid.uuid4().hex}"
+        for turn in range(turns):
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"{base_url}/chat", json={
+                    "message": f"turn {turn}",
+                    "agent_name": "simple_chat",
+                    "conversation_id": conversation_id
+                })
+                response.raise_for_status()
+            except httpx.HTTPError:
+                stats["errors"] += 1
+                break
+            latencies.append(time.perf_counter() - started)
+            stats["requests"] += 1
+            
+            # 第turn轮时上游应看到 2*turn+1 条消息
+            if not response.json()["response"].startswith(f"echo({2 * turn + 1})"):
+                stats["history_mismatches"] += 1
+
+async def run_load(base_url: str, concurrency: int, duration: float, turns: int, keepalive: bool) -> Dict[str, float]:
+    """以固定并发压测指定时长"""
+    latencies: List[float] = []
+    stats = {"requests": 0, "errors": 0, "history_mismatches": 0}
+    # 默认不复用连接，使同一对话的后续消息可能被不同worker接收
+    headers = {} if keepalive else {"Connection": "close"}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency if keepalive else 0)
+    
+    async with httpx.AsyncClient(timeout=60.0, headers=headers, limits=limits) as client:
+        started = time.monotonic()
+        deadline = started + duration
+        await asyncio.gather(*(
+            virtual_user(client, base_url, turns, deadline, latencies, stats)
+            for _ in range(concurrency)
+        ))
+        elapsed = time.monotonic() - started
+    
+    return {
+        **stats,
+        "throughput": stats["requests"] / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AgentArena多worker扩展性基准测试")
+    parser.add_argument("--workers", default="1,2,4", help="逗号分隔的worker数列表")
+    parser.add_argument("--concurrency", type=int, default=32, help="并发虚拟用户数")
+    parser.add_argument("--duration", type=float, default=15.0, help="每组压测时长（秒）")
+    parser.add_argument("--turns", type=int, default=4, help="每个对话的轮数")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="模拟上游延迟（毫秒）")
+    parser.add_argument("--port", type=int, default=8200, help="后端端口")
+    parser.add_argument("--upstream-port", type=int, default=9200, help="模拟上游端口")
+    parser.add_argument("--keepalive", action="store_true", help="复用HTTP连接（对话会粘在同一worker上）")
+    args = parser.parse_args()
+    
+    upstream = start_process(
+        ["uvicorn", "benchmarks.mock_upstream:app", "--port", str(args.upstream_port), "--log-level", "warning"],
+        env={"MOCK_LATENCY_MS": str(args.latency_ms)}
+    )
+    results = []
+    try:
+        wait_until_ready(f"http://127.0.0.1:{args.upstream_port}/v1/models")
+        
+        for workers in [int(w) for w in args.workers.split(",")]:
+            with tempfile.TemporaryDirectory() as tmp:
+                backend = start_process(
+                    ["uvicorn", "api.main:app", "--port", str(args.port),
+                     "--workers", str(workers), "--log-level", "warning"],
+                    env={
+                        "OPENAI_API_KEY": "bench",
+                        "OPENAI_API_BASE": f"http://127.0.0.1:{args.upstream_port}/v1",
+                        "OPENAI_MODEL": "mock-model",
+                        "CONVERSATION_STORE": "shared",
+                        "SHARED_STATE_URL": f"sqlite:///{os.path.join(tmp, 'shared_state.db')}",
+                        "LOG_LEVEL": "WARNING"
+                    }
+                )
+                try:
+                    base_url = f"http://127.0.0.1:{args.port}"
+                    wait_until_ready(f"{base_url}/health")
+                    result = asyncio.run(run_load(base_url, args.concurrency, args.duration, args.turns, args.keepalive))
+                    results.append((workers, result))
+                    print(f"workers={workers}: {result['throughput']:.1f} req/s")
+                finally:
+                    stop_process(backend)
+    finally:
+        stop_process(upstream)
+    
+    baseline = results[0][1]["throughput"] if results else 0
+    print()
+    print(f"{'workers':>7} {'req/s':>9} {'scale':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6} {'history':>7}")
+    for workers, r in results:
+        scale = r["throughput"] / baseline if baseline else 0
+        print(f"{workers:>7} {r['throughput']:>9.1f} {scale:>6.2f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['errors']:>6} {r['history_mismatches']:>7}")
+
+if __name__ == "__main__":
+    main()
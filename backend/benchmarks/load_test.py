@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+后端压测
+
+启动本地模拟上游（benchmarks.mock_upstream）和指向它的后端，以固定并发级别压测
+/chat、/chat/stream和/chat/batch，输出吞吐量、p50/p95/p99延迟、错误数和后端内存增长，
+用于在部署前发现api/main.py和agent中的性能回退。
+
+每个虚拟用户循环发送请求，每个请求使用新的对话，因此内存增长也反映了对话淘汰的效果。
+--baseline 传入此前 --output 保存的结果时，p95延迟或吞吐量退化超过 --max-regression
+会以非零状态码退出，可以直接用于CI。
+
+用法（在backend目录下运行）:
+    python -m benchmarks.load_test --scenarios chat,stream,batch --concurrency 1,8,32 --duration 10
+    python -m benchmarks.load_test --output bench.json
+    python -m benchmarks.load_test --baseline bench.json --max-regression 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.process import read_rss, start_process, stop_process, wait_until_ready
+from utils.helpers import percentile
+
+# agent吞掉上游错误后返回的回复前缀
+ERROR_REPLY_PREFIX = "抱歉"
+
+async def chat_request(client: httpx.AsyncClient, base_url: str, agent: str, batch_size: int) -> Dict[str, Any]:
+    """发送一次/chat请求"""
+    response = await client.post(f"{base_url}/chat", json={
+        "message": "load test",
+        "agent_name": agent,
+        "conversation_id": f"load-{uuid.uuid4().hex}"
+    })
+    response.raise_for_status()
+    return {"items": 1, "failed": int(response.json()["response"].startswith(ERROR_REPLY_PREFIX))}
+
+async def stream_request(client: httpx.AsyncClient, base_url: str, agent: str, batch_size: int) -> Dict[str, Any]:
+    """发送一次/chat/stream请求，记录首个片段的耗时"""
+    started = time.perf_counter()
+    ttft = None
+    failed = 0
+    async with client.stream("POST", f"{base_url}/chat/stream", json={
+        "message": "load test",
+        "agent_name": agent,
+        "conversation_id": f"load-{uuid.uuid4().hex}"
+    }) as response:
+        response.raise_for_status()
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                if event == "error":
+                    failed = 1
+                elif event is None and ttft is None:
+                    ttft = time.perf_counter() - started
+                    failed = int(json.loads(line[5:])["delta"].startswith(ERROR_REPLY_PREFIX))
+            elif not line:
+                event = None
+    return {"items": 1, "failed": failed, "ttft": ttft}
+
+async def batch_request(client: httpx.AsyncClient, base_url: str, agent: str, batch_size: int) -> Dict[str, Any]:
+    """发送一次/chat/batch请求"""
+    response = await client.post(f"{base_url}/chat/batch", json={"items": [
+        {"message": f"load test {i}", "agent_name": agent, "conversation_id": f"load-{uuid.uuid4().hex}"}
+        for i in range(batch_size)
+    ]})
+    response.raise_for_status()
+    results = [json.loads(line) for line in response.text.splitlines() if line]
+    return {"items": len(results), "failed": sum(1 for r in results if "error" in r)}
+
+SCENARIOS = {
+    "chat": chat_request,
+    "stream": stream_request,
+    "batch": batch_request
+}
+
+async def run_level(base_url: str, scenario: str, concurrency: int, duration: float,
+                    agent: str, batch_size: int) -> Dict[str, Any]:
+    """以固定并发压测一个场景"""
+    request = SCENARIOS[scenario]
+    latencies: List[float] = []
+    ttfts: List[float] = []
+    stats = {"requests": 0, "items": 0, "failed": 0, "errors": 0}
+
+    async def virtual_user(client: httpx.AsyncClient, deadline: float) -> None:
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                result = await request(client, base_url, agent, batch_size)
+            except (httpx.HTTPError, KeyError, ValueError):
+                stats["errors"] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            stats["requests"] += 1
+            stats["items"] += result["items"]
+            stats["failed"] += result["failed"]
+            if result.get("ttft") is not None:
+                ttfts.append(result["ttft"])
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120.0, limits=limits) as client:
+        started = time.monotonic()
+        deadline = started + duration
+        await asyncio.gather(*(virtual_user(client, deadline) for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    return {
+        **stats,
+        "throughput": stats["items"] / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "ttft_p50_ms": percentile(ttfts, 50) * 1000 if ttfts else None
+    }
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], max_regression: float) -> List[str]:
+    """与基线比较，返回超过阈值的退化描述"""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        base = previous.get((r["scenario"], r["concurrency"]))
+        if not base:
+            continue
+        label = f"{r['scenario']}@{r['concurrency']}"
+        if base["p95_ms"] and r["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{label}: p95 {base['p95_ms']:.1f}ms -> {r['p95_ms']:.1f}ms")
+        if base["throughput"] and r["throughput"] < base["throughput"] * (1 - max_regression):
+            regressions.append(f"{label}: 吞吐量 {base['throughput']:.1f}/s -> {r['throughput']:.1f}/s")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AgentArena后端压测")
+    parser.add_argument("--scenarios", default="chat,stream,batch", help="逗号分隔的场景: chat, stream, batch")
+    parser.add_argument("--concurrency", default="1,8,32", help="逗号分隔的并发级别")
+    parser.add_argument("--duration", type=float, default=10.0, help="每个级别的压测时长（秒）")
+    parser.add_argument("--agent", default="simple_chat", help="压测的agent")
+    parser.add_argument("--batch-size", type=int, default=16, help="batch场景每个请求的条目数")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="模拟上游首字节延迟（毫秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="模拟上游输出速率，0表示不限速")
+    parser.add_argument("--reply-tokens", type=int, default=0, help="模拟回复追加的token数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟上游随机错误比例")
+    parser.add_argument("--port", type=int, default=8300, help="后端端口")
+    parser.add_argument("--upstream-port", type=int, default=9300, help="模拟上游端口")
+    parser.add_argument("--output", help="将结果保存为JSON，可作为之后的基线")
+    parser.add_argument("--baseline", help="基线结果JSON文件")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="允许的退化比例")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    upstream = start_process(
+        ["uvicorn", "benchmarks.mock_upstream:app", "--port", str(args.upstream_port), "--log-level", "warning"],
+        env={
+            "MOCK_LATENCY_MS": str(args.latency_ms),
+            "MOCK_TOKENS_PER_SECOND": str(args.tokens_per_second),
+            "MOCK_REPLY_TOKENS": str(args.reply_tokens),
+            "MOCK_ERROR_RATE": str(args.error_rate)
+        }
+    )
+    backend = None
+    results: List[Dict[str, Any]] = []
+    try:
+        wait_until_ready(f"http://127.0.0.1:{args.upstream_port}/v1/models")
+        backend = start_process(
+            ["uvicorn", "api.main:app", "--port", str(args.port), "--log-level", "warning"],
+            env={
+                "OPENAI_API_KEY": "bench",
+                "OPENAI_API_BASE": f"http://127.0.0.1:{args.upstream_port}/v1",
+                "OPENAI_MODEL": "mock-model",
+                "AGENT_PRELOAD": args.agent,
+                "LOG_LEVEL": "WARNING"
+            }
+        )
+        base_url = f"http://127.0.0.1:{args.port}"
+        wait_until_ready(f"{base_url}/health")
+
+        # 预热：建立连接并完成首次请求的初始化
+        asyncio.run(run_level(base_url, "chat", 1, 1.0, args.agent, args.batch_size))
+        rss_start = read_rss(backend.pid)
+
+        for scenario in scenarios:
+            for concurrency in levels:
+                rss_before = read_rss(backend.pid)
+                result = asyncio.run(run_level(base_url, scenario, concurrency, args.duration, args.agent, args.batch_size))
+                result.update({
+                    "scenario": scenario,
+                    "concurrency": concurrency,
+                    "rss_mb": read_rss(backend.pid) / 2 ** 20,
+                    "rss_growth_mb": (read_rss(backend.pid) - rss_before) / 2 ** 20
+                })
+                results.append(result)
+                print(f"{scenario} x{concurrency}: {result['throughput']:.1f}/s, p95 {result['p95_ms']:.1f}ms")
+        rss_end = read_rss(backend.pid)
+    finally:
+        if backend:
+            stop_process(backend)
+        stop_process(upstream)
+
+    print()
+    print(f"{'scenario':>8} {'conc':>5} {'items/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'ttft ms':>8} {'failed':>6} {'errors':>6} {'rss MB':>7} {'+MB':>6}")
+    for r in results:
+        ttft = f"{r['ttft_p50_ms']:.1f}" if r["ttft_p50_ms"] is not None else "-"
+        print(f"{r['scenario']:>8} {r['concurrency']:>5} {r['throughput']:>9.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {ttft:>8} {r['failed']:>6} {r['errors']:>6} {r['rss_mb']:>7.1f} {r['rss_growth_mb']:>6.1f}")
+    print(f"\n后端内存: {rss_start / 2 ** 20:.1f}MB -> {rss_end / 2 ** 20:.1f}MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], args.max_regression)
+        if regressions:
+            print("\n性能退化:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n未发现超过阈值的性能退化")
+
+if __name__ == "__main__":
+    main()
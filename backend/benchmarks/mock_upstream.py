@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+本地模拟的OpenAI兼容上游服务
+
+用于基准测试和压测，不产生真实的API费用。回复以"echo(<消息数>): <最后一条消息>"开头，
+基准测试可以据此校验对话历史是否完整。
+
+环境变量:
+    MOCK_LATENCY_MS: 每次请求的首字节延迟（毫秒），默认50
+    MOCK_TOKENS_PER_SECOND: 流式输出速率（token/秒），0表示不限速，默认0
+    MOCK_REPLY_TOKENS: 回复中echo之后追加的填充token数，默认0
+    MOCK_ERROR_RATE: 随机返回错误的比例（0-1），默认0
+    MOCK_ERROR_STATUS: 注入错误的HTTP状态码，默认500（429可用于测试限流处理）
+
+启动:
+    uvicorn benchmarks.mock_upstream:app --port 9000
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="AgentArena Mock Upstream")
+
+LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "50"))
+TOKENS_PER_SECOND = float(os.getenv("MOCK_TOKENS_PER_SECOND", "0"))
+REPLY_TOKENS = int(os.getenv("MOCK_REPLY_TOKENS", "0"))
+ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+ERROR_STATUS = int(os.getenv("MOCK_ERROR_STATUS", "500"))
+
+def build_reply(messages: List[Dict[str, Any]]) -> List[str]:
+    """生成回复并按token切分（每个空格分隔的词算一个token）"""
+    content = f"echo({len(messages)}): {messages[-1]['content'] if messages else ''}"
+    tokens = [word + " " for word in content.split(" ")]
+    tokens[-1] = tokens[-1].rstrip()
+    tokens.extend(f" t{i}" for i in range(REPLY_TOKENS))
+    return tokens
+
+def usage(messages: List[Dict[str, Any]], tokens: List[str]) -> Dict[str, int]:
+    """粗略的token用量"""
+    prompt_tokens = sum(len((m.get("content") or "").split()) for m in messages)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(tokens),
+        "total_tokens": prompt_tokens + len(tokens)
+    }
+
+def chunk(completion_id: str, model: str, delta: Dict[str, Any], finish_reason=None) -> str:
+    """一个SSE格式的chat.completion.chunk"""
+    data = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/v1/models")
+async def list_models():
+    """模型列表"""
+    return {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "agentarena"}]}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    """Chat Completions接口（支持stream）"""
+    body = await request.json()
+    messages = body.get("messages", [])
+    model = body.get("model", "mock-model")
+
+    await asyncio.sleep(LATENCY_MS / 1000)
+
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        return JSONResponse(
+            status_code=ERROR_STATUS,
+            content={"error": {"message": "injected error", "type": "mock_error", "code": ERROR_STATUS}}
+        )
+
+    tokens = build_reply(messages)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+    if body.get("stream"):
+        async def stream() -> AsyncIterator[str]:
+            yield chunk(completion_id, model, {"role": "assistant", "content": ""})
+            for token in tokens:
+                if TOKENS_PER_SECOND:
+                    await asyncio.sleep(1 / TOKENS_PER_SECOND)
+                yield chunk(completion_id, model, {"content": token})
+            yield chunk(completion_id, model, {}, finish_reason="stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                data = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": model, "choices": [], "usage": usage(messages, tokens)}
+                yield f"data: {json.dumps(data)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    # 非流式请求按速率一次性等待全部token的生成时间
+    if TOKENS_PER_SECOND:
+        await asyncio.sleep(len(tokens) / TOKENS_PER_SECOND)
+
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(tokens)},
+            "finish_reason": "stop"
+        }],
+        "usage": usage(messages, tokens)
+    }
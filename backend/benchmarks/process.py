@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+基准测试的进程管理工具
+
+以子进程启动模拟上游和后端服务，等待其就绪并在结束后停止。
+"""
+
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+def start_process(args: List[str], env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    """启动子进程"""
+    return subprocess.Popen(
+        [sys.executable, "-m", *args],
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+def wait_until_ready(url: str, timeout: float = 30.0) -> None:
+    """等待服务可用"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"服务启动超时: {url}")
+
+def stop_process(process: subprocess.Popen) -> None:
+    """停止子进程"""
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def read_rss(pid: int) -> int:
+    """读取进程的常驻内存（字节），仅支持Linux"""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
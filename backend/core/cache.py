@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+缓存模块
+
+提供带过期时间的内存LRU缓存、用于agent回复的两级响应缓存
+（内存LRU + 可选的SQLite磁盘层），以及工具结果缓存装饰器。
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Awaitable, Callable, Hashable, List, Optional, Tuple, TypeVar
+from .config import settings
+from .logging import logger
+from .metrics import TOOL_CACHE_LOOKUPS
+
+T = TypeVar("T")
+
+_MISSING = object()
+
+# 磁盘层每写入这么多条回复清理一次过期条目
+DISK_PURGE_EVERY = 256
+
+class TTLCache:
+    """带过期时间的LRU缓存"""
+    
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        """
+        初始化缓存
+        
+        Args:
+            max_entries: 最大条目数，超过时淘汰最久未使用的条目
+            ttl: 默认过期时间（秒）
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """获取未过期的缓存值"""
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """写入缓存值"""
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+    
+    def pop(self, key: Hashable) -> None:
+        """删除缓存值"""
+        self._data.pop(key, None)
+    
+    def clear(self) -> None:
+        """清空缓存"""
+        self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+def _normalize_argument(value: Any) -> Any:
+    """规范化工具参数：字符串去掉首尾空白、合并连续空白并忽略大小写"""
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return value
+
+def cache_tool_results(ttl: float, max_entries: int = 256) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """
+    异步工具的结果缓存装饰器
+    
+    按规范化后的参数缓存成功返回的结果，抛出异常的调用不缓存。
+    ttl<=0时不缓存（如获取当前时间的工具）。
+    
+    Args:
+        ttl: 结果有效期（秒）
+        max_entries: 最大缓存条目数
+    """
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        if ttl <= 0:
+            return func
+        cache = TTLCache(max_entries=max_entries, ttl=ttl)
+        signature = inspect.signature(func)
+        hits = TOOL_CACHE_LOOKUPS.labels(func.__name__, "hit")
+        misses = TOOL_CACHE_LOOKUPS.labels(func.__name__, "miss")
+        
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = tuple((name, _normalize_argument(value)) for name, value in bound.arguments.items())
+            result = cache.get(key, _MISSING)
+            if result is not _MISSING:
+                hits.inc()
+                return result
+            misses.inc()
+            result = await func(*args, **kwargs)
+            cache.set(key, result)
+            return result
+        
+        return wrapper
+    return decorator
+
+class ResponseCache:
+    """
+    agent回复缓存：按agent、模型、温度和完整消息窗口的哈希作为键
+    
+    磁盘层的读写都在一个专用线程中执行，不阻塞事件循环。查到的过期条目立即删除，
+    每写入DISK_PURGE_EVERY条回复再批量清理一次过期条目，文件大小不会无限增长。
+    """
+    
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, disk_path: Optional[str] = None):
+        """
+        初始化回复缓存
+        
+        Args:
+            max_entries: 内存层最大条目数
+            ttl: 缓存过期时间（秒）
+            disk_path: 磁盘层SQLite文件路径，为None时只使用内存层
+        """
+        self.ttl = ttl
+        self.memory = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.stats: Dict[str, Dict[str, int]] = {}
+        
+        self._conn = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._disk_writes = 0
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._conn = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS response_cache
+                    (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL);
+                CREATE INDEX IF NOT EXISTS idx_response_cache_expires ON response_cache (expires_at);
+            """)
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+            logger.info("回复缓存磁盘层已启用: %s", disk_path)
+    
+    @staticmethod
+    def make_key(agent_name: str, model: str, temperature: Optional[float], messages: List[Dict[str, Any]]) -> str:
+        """
+        生成缓存键
+        
+        Args:
+            agent_name: Agent名称
+            model: 模型名称
+            temperature: 采样温度
+            messages: 发送给模型的完整消息窗口
+        
+        Returns:
+            缓存键
+        """
+        window = json.dumps(messages, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        digest = hashlib.sha256(window.encode("utf-8")).hexdigest()
+        return f"{agent_name}:{model}:{temperature}:{digest}"
+    
+    async def get(self, agent_name: str, key: str) -> Optional[str]:
+        """查找缓存的回复，先查内存层，未命中时在线程中查磁盘层"""
+        stats = self._agent_stats(agent_name)
+        value = self.memory.get(key)
+        if value is not None:
+            stats["memory_hits"] += 1
+            return value
+        
+        if self._executor is not None:
+            row = await asyncio.wrap_future(self._executor.submit(self._disk_get, key))
+            if row is not None:
+                value, expires_at = row
+                stats["disk_hits"] += 1
+                self.memory.set(key, value, ttl=expires_at - time.time())
+                return value
+        
+        stats["misses"] += 1
+        return None
+    
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        """
+        缓存回复（磁盘层在后台线程中写入）
+        
+        Args:
+            key: 缓存键
+            value: 回复
+            ttl: 本条回复的过期时间（秒），默认使用构造时的配置
+        """
+        ttl = self.ttl if ttl is None else ttl
+        self.memory.set(key, value, ttl=ttl)
+        if self._executor is not None:
+            self._executor.submit(self._disk_set, key, value, time.time() + ttl)
+    
+    def _disk_get(self, key: str) -> Optional[Tuple[str, float]]:
+        """在磁盘层线程中读取未过期的回复，过期的条目顺带删除"""
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] <= time.time():
+            self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            return None
+        return row
+    
+    def _disk_set(self, key: str, value: str, expires_at: float) -> None:
+        """在磁盘层线程中写入回复，并定期清理过期条目"""
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+            self._disk_writes += 1
+            if self._disk_writes % DISK_PURGE_EVERY == 0:
+                self.purge_expired()
+        except sqlite3.Error as e:
+            logger.error("回复缓存写入磁盘失败: %s", e)
+    
+    def purge_expired(self) -> int:
+        """删除磁盘层中所有过期的条目（在磁盘层线程中调用）"""
+        cursor = self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+        return cursor.rowcount
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        return {
+            "entries": len(self.memory),
+            "agents": {name: dict(stats) for name, stats in self.stats.items()}
+        }
+    
+    def close(self) -> None:
+        """等待磁盘层写入完成并关闭"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+    
+    def _agent_stats(self, agent_name: str) -> Dict[str, int]:
+        stats = self.stats.get(agent_name)
+        if stats is None:
+            stats = self.stats[agent_name] = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        return stats
+
+_response_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> ResponseCache:
+    """获取全局回复缓存实例"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache(
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl=settings.RESPONSE_CACHE_TTL,
+            disk_path=settings.RESPONSE_CACHE_DISK_PATH or None
+        )
+    return _response_cache
+
+def close_response_cache() -> None:
+    """等待回复缓存的磁盘写入完成并关闭"""
+    global _response_cache
+    if _response_cache is not None:
+        _response_cache.close()
+        _response_cache = None
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+并发控制模块
+
+提供全局上游并发准入控制：有界的并发槽位加有界的等待队列，
+饱和时快速拒绝请求（429/503并附带Retry-After），而不是让请求无限排队。
+"""
+
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+from .config import settings
+
+class AdmissionRejected(Exception):
+    """准入控制拒绝请求"""
+    
+    def __init__(self, status_code: int, retry_after: int, detail: str):
+        """
+        Args:
+            status_code: 建议返回的HTTP状态码（429队列已满，503等待超时）
+            retry_after: 建议客户端重试前等待的秒数
+            detail: 错误描述
+        """
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+
+class AdmissionController:
+    """有界并发与有界排队的准入控制器"""
+    
+    def __init__(self, max_concurrent: int, max_queue: int, max_wait: float):
+        """
+        初始化准入控制器
+        
+        Args:
+            max_concurrent: 同时进行的上游请求上限，0表示不限制
+            max_queue: 等待槽位的请求上限，超过时立即返回429
+            max_wait: 单个请求最长排队时间（秒），超过时返回503
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(max_concurrent) if max_concurrent > 0 else None
+        self._active = 0
+        self._waiting = 0
+        self.stats = {"admitted": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+        self.total_wait_seconds = 0.0
+    
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[float]:
+        """
+        获取一个并发槽位
+        
+        Yields:
+            本次排队等待的秒数
+        
+        Raises:
+            AdmissionRejected: 队列已满或等待超时
+        """
+        if self._semaphore is None:
+            yield 0.0
+            return
+        
+        retry_after = max(1, math.ceil(self.max_wait))
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            self.stats["rejected_queue_full"] += 1
+            raise AdmissionRejected(429, retry_after, "服务繁忙，请稍后重试")
+        
+        started = time.perf_counter()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self.stats["rejected_timeout"] += 1
+            raise AdmissionRejected(503, retry_after, "服务排队超时，请稍后重试") from None
+        finally:
+            self._waiting -= 1
+        
+        waited = time.perf_counter() - started
+        self.stats["admitted"] += 1
+        self.total_wait_seconds += waited
+        self._active += 1
+        try:
+            yield waited
+        finally:
+            self._active -= 1
+            self._semaphore.release()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取准入统计"""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self._active,
+            "waiting": self._waiting,
+            "total_wait_seconds": round(self.total_wait_seconds, 3),
+            **self.stats
+        }
+
+# 全局上游准入控制器
+admission = AdmissionController(
+    max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    max_wait=settings.ADMISSION_MAX_WAIT
+)
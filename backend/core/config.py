@@ -6,12 +6,21 @@
 """
 
 import os
-from typing import List
+from typing import Dict, List
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv()
 
+def _parse_int_mapping(value: str) -> Dict[str, int]:
+    """解析 "key=1,other=2" 格式的环境变量"""
+    mapping = {}
+    for item in value.split(","):
+        key, sep, number = item.partition("=")
+        if sep and key.strip():
+            mapping[key.strip()] = int(number)
+    return mapping
+
 class Settings:
     """应用设置类"""
     
@@ -24,6 +33,7 @@ class Settings:
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     DEBUG: bool = True
+    WORKERS: int = int(os.getenv("WORKERS", "1"))
     
     # CORS配置
     ALLOWED_ORIGINS: List[str] = [
@@ -37,12 +47,131 @@ class Settings:
     OPENAI_API_BASE: str = os.getenv("OPENAI_API_BASE", "")
     OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "deepseek-chat")
     
+    # 模型路由：简单请求（短、无代码、无推理或工具意图）发给FAST_MODEL，留空则不路由
+    FAST_MODEL: str = os.getenv("FAST_MODEL", "")
+    # 发给快速模型的消息最大字符数和历史窗口最大token数
+    MODEL_ROUTING_MAX_CHARS: int = int(os.getenv("MODEL_ROUTING_MAX_CHARS", "200"))
+    MODEL_ROUTING_MAX_CONTEXT_TOKENS: int = int(os.getenv("MODEL_ROUTING_MAX_CONTEXT_TOKENS", "1500"))
+    # 快速模型连续失败达到该次数后暂停路由MODEL_ROUTING_COOLDOWN秒
+    MODEL_ROUTING_FAILURE_THRESHOLD: int = int(os.getenv("MODEL_ROUTING_FAILURE_THRESHOLD", "3"))
+    MODEL_ROUTING_COOLDOWN: float = float(os.getenv("MODEL_ROUTING_COOLDOWN", "30"))
+    
+    # 上游HTTP连接池配置（所有agent共享）
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_READ_TIMEOUT: float = float(os.getenv("HTTP_READ_TIMEOUT", "120"))
+    HTTP_POOL_TIMEOUT: float = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))
+    HTTP2: bool = os.getenv("HTTP2", "false").lower() == "true"
+    # 启动时预建的上游连接数，0表示不预热
+    HTTP_PREWARM_CONNECTIONS: int = int(os.getenv("HTTP_PREWARM_CONNECTIONS", "0"))
+    
+    # 上游路由：逗号分隔的多个OpenAI兼容端点（留空则只使用OPENAI_API_BASE），按延迟和错误率选择
+    UPSTREAM_ENDPOINTS: List[str] = [
+        url.strip().rstrip("/") for url in os.getenv("UPSTREAM_ENDPOINTS", "").split(",") if url.strip()
+    ]
+    # 每次上游请求（含重试和对冲）取得响应的截止时间（秒）
+    UPSTREAM_DEADLINE: float = float(os.getenv("UPSTREAM_DEADLINE", "120"))
+    # 连接失败、超时和429/5xx的最大重试次数，以及带抖动的指数退避基数（秒）
+    UPSTREAM_MAX_RETRIES: int = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+    UPSTREAM_RETRY_BACKOFF: float = float(os.getenv("UPSTREAM_RETRY_BACKOFF", "0.25"))
+    # 等待超过该秒数仍无响应时向另一个端点发出对冲请求，0表示不对冲
+    UPSTREAM_HEDGE_AFTER: float = float(os.getenv("UPSTREAM_HEDGE_AFTER", "0"))
+    # 端点连续失败达到该次数后暂停使用UPSTREAM_COOLDOWN秒
+    UPSTREAM_FAILURE_THRESHOLD: int = int(os.getenv("UPSTREAM_FAILURE_THRESHOLD", "3"))
+    UPSTREAM_COOLDOWN: float = float(os.getenv("UPSTREAM_COOLDOWN", "10"))
+    
     # 日志配置
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    # 在后台线程中写日志，避免stdout阻塞事件循环
+    LOG_ASYNC: bool = os.getenv("LOG_ASYNC", "true").lower() == "true"
+    # 每条聊天消息的INFO日志的采样比例（0-1），高负载时可调低
+    CHAT_LOG_SAMPLE_RATE: float = float(os.getenv("CHAT_LOG_SAMPLE_RATE", "1.0"))
+    # LangChain AgentExecutor是否把执行过程打印到stdout（调试用）
+    AGENT_EXECUTOR_VERBOSE: bool = os.getenv("AGENT_EXECUTOR_VERBOSE", "false").lower() == "true"
+    
+    # 追踪配置：span导出到本地JSONL文件和/或OTLP/HTTP收集器（如 http://localhost:4318），留空则不导出
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "")
+    TRACE_OTLP_ENDPOINT: str = os.getenv("TRACE_OTLP_ENDPOINT", "")
+    # 在/chat响应中返回各阶段耗时的Server-Timing头
+    SERVER_TIMING_ENABLED: bool = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
     
     # Agent配置
     DEFAULT_AGENT: str = "simple_chat"
-    MAX_CONVERSATION_HISTORY: int = 50
+    # 额外的agent插件，逗号分隔的 "module:attribute"，指向AgentSpec声明
+    AGENT_PLUGINS: List[str] = [
+        item.strip() for item in os.getenv("AGENT_PLUGINS", "").split(",") if item.strip()
+    ]
+    # 启动时预加载的agent，逗号分隔的名称，"*" 表示全部；默认首次使用时才加载
+    AGENT_PRELOAD: List[str] = [
+        item.strip() for item in os.getenv("AGENT_PRELOAD", "").split(",") if item.strip()
+    ]
+    MAX_CONVERSATION_HISTORY: int = int(os.getenv("MAX_CONVERSATION_HISTORY", "50"))
+    # 每次请求发送给模型的历史token预算
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "4000"))
+    # 按模型覆盖token预算，格式: "model-a=8000,model-b=16000"
+    MODEL_TOKEN_BUDGETS: Dict[str, int] = _parse_int_mapping(os.getenv("MODEL_TOKEN_BUDGETS", ""))
+    
+    # 对话压缩：消息数超过阈值后在后台将较早的消息滚动压缩为摘要
+    COMPACTION_ENABLED: bool = os.getenv("COMPACTION_ENABLED", "false").lower() == "true"
+    COMPACTION_THRESHOLD: int = int(os.getenv("COMPACTION_THRESHOLD", "20"))
+    COMPACTION_KEEP_RECENT: int = int(os.getenv("COMPACTION_KEEP_RECENT", "6"))
+    
+    # 回复缓存：按agent开启，逗号分隔的agent名称列表
+    RESPONSE_CACHE_AGENTS: List[str] = [
+        name.strip() for name in os.getenv("RESPONSE_CACHE_AGENTS", "").split(",") if name.strip()
+    ]
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+    # 磁盘缓存层的SQLite文件路径，留空则只使用内存
+    RESPONSE_CACHE_DISK_PATH: str = os.getenv("RESPONSE_CACHE_DISK_PATH", "")
+    
+    # 合并相同消息窗口的并发上游请求
+    SINGLEFLIGHT_ENABLED: bool = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+    
+    # 上游准入控制：并发上限（0表示不限制）、排队上限和最长排队时间（秒）
+    ADMISSION_MAX_CONCURRENT: int = int(os.getenv("ADMISSION_MAX_CONCURRENT", "64"))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "256"))
+    ADMISSION_MAX_WAIT: float = float(os.getenv("ADMISSION_MAX_WAIT", "10"))
+    # 客户端断开连接时取消仍在进行的agent调用
+    CANCEL_ON_DISCONNECT: bool = os.getenv("CANCEL_ON_DISCONNECT", "true").lower() == "true"
+    
+    # 工具沙箱：工作进程数、单次调用超时（秒）和每个工作进程的内存上限（MB）
+    TOOL_SANDBOX_WORKERS: int = int(os.getenv("TOOL_SANDBOX_WORKERS", "2"))
+    TOOL_TIMEOUT: float = float(os.getenv("TOOL_TIMEOUT", "2"))
+    TOOL_MEMORY_LIMIT_MB: int = int(os.getenv("TOOL_MEMORY_LIMIT_MB", "256"))
+    
+    # 工具结果缓存的有效期（秒），如 "search_weather=600,calculate=3600"，未列出的工具不缓存
+    TOOL_CACHE_TTLS: Dict[str, int] = _parse_int_mapping(
+        os.getenv("TOOL_CACHE_TTLS", "search_weather=600,calculate=3600")
+    )
+    
+    # 竞技场模式：单次请求最多并发的agent数量和每个agent的超时时间（秒）
+    ARENA_MAX_AGENTS: int = int(os.getenv("ARENA_MAX_AGENTS", "8"))
+    ARENA_AGENT_TIMEOUT: float = float(os.getenv("ARENA_AGENT_TIMEOUT", "60"))
+    
+    # 批量接口：单次请求的最大条目数和每个agent默认的上游并发数
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+    
+    # 对话淘汰：限制内存中的对话数、总字节数和空闲时间（0表示不限制）
+    EVICTION_MAX_CONVERSATIONS: int = int(os.getenv("EVICTION_MAX_CONVERSATIONS", "10000"))
+    EVICTION_MAX_BYTES: int = int(os.getenv("EVICTION_MAX_BYTES", str(256 * 1024 * 1024)))
+    EVICTION_IDLE_TTL: float = float(os.getenv("EVICTION_IDLE_TTL", "86400"))
+    # 后台清理空闲超时对话的间隔（秒），0表示只在访问时检查
+    EVICTION_SWEEP_INTERVAL: float = float(os.getenv("EVICTION_SWEEP_INTERVAL", "60"))
+    # 纯内存模式下被淘汰的对话写出到该目录（会把对话内容写到磁盘），留空则直接丢弃
+    EVICTION_SPILL_DIR: str = os.getenv("EVICTION_SPILL_DIR", "")
+    
+    # 对话存储配置
+    CONVERSATION_STORE: str = os.getenv("CONVERSATION_STORE", "memory")  # memory、sqlite 或 shared
+    CONVERSATION_DB_PATH: str = os.getenv("CONVERSATION_DB_PATH", "data/conversations.db")
+    CONVERSATION_FLUSH_INTERVAL: float = float(os.getenv("CONVERSATION_FLUSH_INTERVAL", "0.5"))
+    CONVERSATION_FLUSH_BATCH_SIZE: int = int(os.getenv("CONVERSATION_FLUSH_BATCH_SIZE", "200"))
+    CONVERSATION_CACHE_ENABLED: bool = os.getenv("CONVERSATION_CACHE_ENABLED", "true").lower() == "true"
+    # 多worker共享状态：redis://host:6379/0 或 sqlite:///path/to/file.db
+    SHARED_STATE_URL: str = os.getenv("SHARED_STATE_URL", "sqlite:///data/shared_state.db")
     
     def __init__(self):
         """初始化设置，验证必要的环境变量"""
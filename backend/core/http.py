@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+HTTP客户端模块
+
+所有agent共享同一组带连接池的httpx客户端，连接池大小、HTTP/2和超时
+都通过配置调整；服务启动时可以预先建立到上游的连接。
+异步客户端经过上游路由层（core.upstream），在多个端点之间选择、重试和对冲。
+"""
+
+import asyncio
+from typing import List, Optional
+import httpx
+from .config import settings
+from .logging import logger
+from .upstream import DIRECT_EXTENSION, UpstreamRouter
+
+_async_client: Optional[httpx.AsyncClient] = None
+_sync_client: Optional[httpx.Client] = None
+_router: Optional[UpstreamRouter] = None
+
+def _http2_enabled() -> bool:
+    """HTTP/2需要安装h2包，未安装时回退到HTTP/1.1"""
+    if not settings.HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("已开启HTTP2但未安装h2包（pip install 'httpx[http2]'），回退到HTTP/1.1")
+        return False
+    return True
+
+def get_timeout() -> httpx.Timeout:
+    """获取上游请求超时配置"""
+    return httpx.Timeout(
+        settings.HTTP_READ_TIMEOUT,
+        connect=settings.HTTP_CONNECT_TIMEOUT,
+        pool=settings.HTTP_POOL_TIMEOUT
+    )
+
+def get_limits() -> httpx.Limits:
+    """获取连接池配置"""
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+    )
+
+def get_upstream_router() -> UpstreamRouter:
+    """获取全局的上游路由传输层（持有异步客户端的连接池）"""
+    global _router
+    if _router is None:
+        _router = UpstreamRouter(
+            primary_url=get_api_base(),
+            endpoints=get_upstream_endpoints(),
+            transport=httpx.AsyncHTTPTransport(http2=_http2_enabled(), limits=get_limits()),
+            deadline=settings.UPSTREAM_DEADLINE,
+            max_retries=settings.UPSTREAM_MAX_RETRIES,
+            retry_backoff=settings.UPSTREAM_RETRY_BACKOFF,
+            hedge_after=settings.UPSTREAM_HEDGE_AFTER,
+            failure_threshold=settings.UPSTREAM_FAILURE_THRESHOLD,
+            cooldown=settings.UPSTREAM_COOLDOWN
+        )
+    return _router
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """获取全局共享的异步HTTP客户端"""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            transport=get_upstream_router(),
+            timeout=get_timeout()
+        )
+    return _async_client
+
+def get_http_client() -> httpx.Client:
+    """获取全局共享的同步HTTP客户端（用于同步调用路径）"""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = httpx.Client(
+            http2=_http2_enabled(),
+            limits=get_limits(),
+            timeout=get_timeout()
+        )
+    return _sync_client
+
+def get_api_base() -> str:
+    """获取模型客户端使用的上游API地址（路由层会把请求分发到各端点）"""
+    if settings.OPENAI_API_BASE:
+        return settings.OPENAI_API_BASE.rstrip("/")
+    if settings.UPSTREAM_ENDPOINTS:
+        return settings.UPSTREAM_ENDPOINTS[0]
+    return "https://api.openai.com/v1"
+
+def get_upstream_endpoints() -> List[str]:
+    """获取所有上游端点地址"""
+    return settings.UPSTREAM_ENDPOINTS or [get_api_base()]
+
+async def prewarm_connections(count: Optional[int] = None) -> int:
+    """
+    预先建立到上游的连接，让首个请求不再承担DNS、TLS和建连开销
+    
+    Args:
+        count: 每个上游端点的预建连接数，为None时使用HTTP_PREWARM_CONNECTIONS
+    
+    Returns:
+        成功建立的连接数
+    """
+    count = settings.HTTP_PREWARM_CONNECTIONS if count is None else count
+    if count <= 0:
+        return 0
+    
+    client = get_async_http_client()
+    headers = {"Authorization": f"Bearer {settings.OPENAI_API_KEY}"}
+    
+    async def warm(url: str) -> bool:
+        try:
+            # 任何HTTP响应都说明连接已建立并进入连接池；直接发往指定端点，不经过路由
+            response = await client.get(url, headers=headers, extensions={DIRECT_EXTENSION: True})
+            await response.aclose()
+            return True
+        except httpx.HTTPError as e:
+            logger.warning("预热上游连接失败: %s", e)
+            return False
+    
+    warmed = 0
+    for endpoint in get_upstream_endpoints():
+        url = f"{endpoint}/models"
+        results = await asyncio.gather(*(warm(url) for _ in range(count)))
+        warmed += sum(results)
+        logger.info("已预热 %s/%s 个上游连接: %s", sum(results), count, url)
+    return warmed
+
+async def close_http_clients() -> None:
+    """关闭共享的HTTP客户端"""
+    global _async_client, _sync_client, _router
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+        _router = None
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
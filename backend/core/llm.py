@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+聊天模型工厂
+
+统一创建ChatOpenAI实例，注入共享的HTTP客户端和超时配置，
+并提供把模型调用和工具调用记录到指标和追踪span的回调。
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_openai import ChatOpenAI
+from .config import settings
+from .http import get_api_base, get_async_http_client, get_http_client, get_timeout
+from .metrics import TOKENS, TOOL_CALLS, TOOL_LATENCY, UPSTREAM_ERRORS, UPSTREAM_LATENCY
+from .tracing import Span, start_span
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """记录上游模型调用和工具调用的耗时、错误和token用量"""
+    
+    # 在事件循环中直接执行，不派发到线程池
+    run_inline = True
+    
+    def __init__(self, agent_name: str):
+        self.agent_name = agent_name
+        self._runs: Dict[UUID, Tuple[float, str]] = {}
+    
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or settings.OPENAI_MODEL
+        self._runs[run_id] = (time.perf_counter(), model)
+    
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        started, model = run
+        UPSTREAM_LATENCY.labels(self.agent_name, model).observe(time.perf_counter() - started)
+        
+        usage = self._token_usage(response)
+        if usage:
+            TOKENS.labels(self.agent_name, model, "prompt").inc(usage[0])
+            TOKENS.labels(self.agent_name, model, "completion").inc(usage[1])
+    
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        started, model = run
+        UPSTREAM_LATENCY.labels(self.agent_name, model).observe(time.perf_counter() - started)
+        UPSTREAM_ERRORS.labels(self.agent_name, model).inc()
+    
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._runs[run_id] = (time.perf_counter(), serialized.get("name") or "unknown")
+    
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish_tool(run_id, "ok")
+    
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish_tool(run_id, "error")
+    
+    def _finish_tool(self, run_id: UUID, status: str) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        started, tool_name = run
+        TOOL_CALLS.labels(self.agent_name, tool_name, status).inc()
+        TOOL_LATENCY.labels(self.agent_name, tool_name).observe(time.perf_counter() - started)
+    
+    @staticmethod
+    def _token_usage(response: LLMResult) -> Optional[Tuple[int, int]]:
+        """提取 (输入token, 输出token)，上游未返回用量时为None"""
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        token_usage = (response.llm_output or {}).get("token_usage")
+        if token_usage:
+            return token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0)
+        return None
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """为每轮模型调用和每次工具调用记录追踪span"""
+    
+    run_inline = True
+    
+    def __init__(self):
+        self._spans: Dict[UUID, Span] = {}
+    
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        params = kwargs.get("invocation_params") or {}
+        self._spans[run_id] = start_span("llm", model=params.get("model") or params.get("model_name") or "")
+    
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            usage = MetricsCallbackHandler._token_usage(response)
+            if usage:
+                span.set_attribute("prompt_tokens", usage[0])
+                span.set_attribute("completion_tokens", usage[1])
+            span.finish()
+    
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.finish(error)
+    
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._spans[run_id] = start_span("tool", tool=serialized.get("name") or "unknown")
+    
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.finish()
+    
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.finish(error)
+
+def instrumentation_callbacks(agent_name: str) -> List[BaseCallbackHandler]:
+    """agent的模型和工具使用的指标与追踪回调"""
+    return [MetricsCallbackHandler(agent_name), TracingCallbackHandler()]
+
+def create_chat_model(**kwargs: Any) -> ChatOpenAI:
+    """
+    创建使用共享连接池的聊天模型
+    
+    重试由上游路由层统一处理（带截止时间、抖动和端点切换），ChatOpenAI自身不再重试。
+    
+    Args:
+        **kwargs: 传给ChatOpenAI的参数，可覆盖默认的模型、地址和密钥
+    
+    Returns:
+        ChatOpenAI实例
+    """
+    params = {
+        "model": settings.OPENAI_MODEL,
+        "api_key": settings.OPENAI_API_KEY,
+        "base_url": get_api_base(),
+        "timeout": get_timeout(),
+        "max_retries": 0,
+        "http_client": get_http_client(),
+        "http_async_client": get_async_http_client(),
+    }
+    params.update(kwargs)
+    return ChatOpenAI(**params)
@@ -2,14 +2,32 @@
 """
 日志配置模块
 
-统一配置应用的日志系统。
+统一配置应用的日志系统。日志记录在调用处只入队，格式化和写stdout都在后台线程完成，
+stdout阻塞时不会卡住事件循环。
 """
 
+import atexit
 import logging
+import queue
+import random
 import sys
-from typing import Optional
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
 from .config import settings
 
+class DeferredQueueHandler(QueueHandler):
+    """
+    把日志记录原样放入队列，消息格式化推迟到后台线程
+    
+    标准的QueueHandler会在调用线程中先格式化消息；这里跳过这一步，
+    因此日志参数应为字符串、数字等不可变对象。
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+_listener: Optional[QueueListener] = None
+
 def setup_logging(log_level: Optional[str] = None) -> logging.Logger:
     """
     设置应用日志配置
@@ -20,18 +38,29 @@ def setup_logging(log_level: Optional[str] = None) -> logging.Logger:
     Returns:
         配置好的logger实例
     """
+    global _listener
     level = log_level or settings.LOG_LEVEL
     
     # 配置日志格式
     log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if settings.LOG_ASYNC:
+        # 由后台线程写出日志
+        stream_handler.setFormatter(logging.Formatter(log_format))
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        handler: logging.Handler = DeferredQueueHandler(log_queue)
+    else:
+        handler = stream_handler
+    
     # 配置根日志器
     logging.basicConfig(
         level=getattr(logging, level.upper()),
         format=log_format,
-        handlers=[
-            logging.StreamHandler(sys.stdout)
-        ]
+        handlers=[handler]
     )
     
     # 创建应用专用的logger
@@ -43,5 +72,11 @@ def setup_logging(log_level: Optional[str] = None) -> logging.Logger:
     
     return logger
 
+def log_chat_message(msg: str, *args: Any) -> None:
+    """按CHAT_LOG_SAMPLE_RATE采样记录每条消息的INFO日志（参数延迟格式化）"""
+    rate = settings.CHAT_LOG_SAMPLE_RATE
+    if rate >= 1 or (rate > 0 and random.random() < rate):
+        logger.info(msg, *args)
+
 # 创建全局logger实例
-logger = setup_logging()
\ No newline at end of file
+logger = setup_logging()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+指标模块
+
+轻量的Counter、Gauge和Histogram实现，以Prometheus文本格式导出。
+热路径上的一次记录只是一次字典查找加几次加法（约1微秒），不加锁：
+指标只在事件循环线程中更新，偶发的跨线程竞争最多丢失一次计数。
+"""
+
+import asyncio
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+from .concurrency import AdmissionRejected
+
+# 默认的延迟分桶（秒），覆盖从毫秒级缓存命中到分钟级的agent执行
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def _escape(value: str) -> str:
+    """转义标签值中的反斜杠、双引号和换行"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """格式化标签为 {a="x",b="y"}"""
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    """格式化数值，整数不带小数点"""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class _Metric:
+    """带标签的指标基类，每组标签值对应一个子指标"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values: str):
+        """获取指定标签值的子指标（首次使用时创建）"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _render_samples(self, values: Tuple[str, ...], child) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        """渲染为Prometheus文本格式的行"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_samples(values, child))
+        return lines
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def _render_samples(self, values: Tuple[str, ...], child: _CounterChild) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def _render_samples(self, values: Tuple[str, ...], child: _GaugeChild) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # 最后一格对应+Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+class Histogram(_Metric):
+    """分桶直方图"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def _render_samples(self, values: Tuple[str, ...], child: _HistogramChild) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _format_value(bound)
+            bucket_labels = _format_labels(self.labelnames, values, 'le="' + le + '"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+REGISTRY: List[_Metric] = []
+
+def render_metrics() -> str:
+    """以Prometheus文本格式导出所有指标"""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# 请求级指标
+REQUESTS = Counter("agentarena_requests_total", "处理的请求数", ("agent", "endpoint", "status"))
+REQUEST_LATENCY = Histogram("agentarena_request_duration_seconds", "请求处理耗时（含排队）", ("agent", "endpoint"))
+IN_FLIGHT = Gauge("agentarena_requests_in_flight", "正在处理的请求数", ("agent",))
+QUEUE_WAIT = Histogram(
+    "agentarena_queue_wait_seconds", "准入控制的排队时间", ("agent",),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+TIME_TO_FIRST_TOKEN = Histogram("agentarena_time_to_first_token_seconds", "流式请求的首个片段耗时", ("agent",))
+CLIENT_DISCONNECTS = Counter("agentarena_client_disconnects_total", "客户端断开后被取消的请求数", ("endpoint",))
+
+# 上游模型调用指标
+UPSTREAM_LATENCY = Histogram("agentarena_upstream_duration_seconds", "上游模型调用耗时", ("agent", "model"))
+UPSTREAM_ERRORS = Counter("agentarena_upstream_errors_total", "上游模型调用失败数", ("agent", "model"))
+TOKENS = Counter("agentarena_tokens_total", "上游模型消耗的token数", ("agent", "model", "type"))
+UPSTREAM_ATTEMPTS = Counter("agentarena_upstream_attempts_total", "发往各上游端点的HTTP请求数", ("endpoint", "outcome"))
+UPSTREAM_RETRIES = Counter("agentarena_upstream_retries_total", "上游请求的重试次数")
+UPSTREAM_HEDGES = Counter("agentarena_upstream_hedges_total", "对冲请求数，result表示对冲请求是否先返回", ("result",))
+MODEL_ROUTE_REQUESTS = Counter(
+    "agentarena_model_route_requests_total", "实际调用模型的请求的路由分类结果，reason表示分类原因", ("agent", "route", "reason")
+)
+MODEL_ROUTE_LATENCY = Histogram("agentarena_model_route_duration_seconds", "各模型路由的调用耗时", ("agent", "route"))
+MODEL_ROUTE_FALLBACKS = Counter("agentarena_model_route_fallbacks_total", "快速模型失败后回退到默认模型的次数", ("agent",))
+
+# 工具调用指标
+TOOL_CALLS = Counter("agentarena_tool_calls_total", "工具调用次数", ("agent", "tool", "status"))
+TOOL_LATENCY = Histogram("agentarena_tool_duration_seconds", "工具调用耗时", ("agent", "tool"))
+TOOL_CACHE_LOOKUPS = Counter("agentarena_tool_cache_lookups_total", "工具结果缓存查询次数", ("tool", "result"))
+
+@contextmanager
+def track_request(agent_name: str, endpoint: str) -> Iterator[None]:
+    """记录一次请求的耗时、并发数和结果状态"""
+    in_flight = IN_FLIGHT.labels(agent_name)
+    in_flight.inc()
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except AdmissionRejected:
+        status = "rejected"
+        raise
+    except (asyncio.CancelledError, GeneratorExit):
+        status = "cancelled"
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        in_flight.dec()
+        REQUESTS.labels(agent_name, endpoint, status).inc()
+        REQUEST_LATENCY.labels(agent_name, endpoint).observe(time.perf_counter() - started)
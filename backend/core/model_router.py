@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+模型路由模块
+
+用本地的廉价规则给每个请求分类，不额外调用模型：简短、不含代码、没有推理/长文生成
+或工具意图、上下文不长的消息发给更快更小的模型（FAST_MODEL），其余发给默认模型。
+
+- 快速模型调用失败（流式请求在输出第一个片段之前失败）时回退到默认模型重试
+- 快速模型连续失败达到阈值后暂停路由一段时间，期间所有请求都发给默认模型
+- 分类结果只在实际调用模型时计入指标，命中回复缓存或合并到其他请求的调用不计入
+- 每条路由的调用数、耗时（指数加权移动平均）、失败和回退次数记录在指标和统计信息中
+"""
+
+import re
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+from .logging import logger
+from .metrics import MODEL_ROUTE_FALLBACKS, MODEL_ROUTE_LATENCY, MODEL_ROUTE_REQUESTS
+
+T = TypeVar("T")
+
+DEFAULT_ROUTE = "default"
+FAST_ROUTE = "fast"
+# 耗时的指数加权系数
+EWMA_ALPHA = 0.2
+# 消息超过该行数时视为长文本
+MAX_FAST_LINES = 4
+
+# 代码特征：代码块、行内代码、常见关键字和语句结尾的符号
+_CODE_PATTERN = re.compile(
+    r"```|`[^`\n]+`|=>|::|[{};]\s*$"
+    r"|\b(?:def|class|import|return|function|const|select|#include|print)\b",
+    re.IGNORECASE | re.MULTILINE
+)
+# 需要推理、生成长文或调用工具（时间、计算、天气）的意图
+_COMPLEX_PATTERN = re.compile(
+    r"为什么|分析|解释|原理|比较|对比|推导|证明|步骤|详细|总结|翻译|写一|编写|代码|程序|算法"
+    r"|方案|设计|优化|调试|报错|计划|计算|天气|几点|时间|日期|多少钱"
+    r"|\b(?:why|explain|analy[sz]e|compare|prove|step|summar|translat|write|code|debug"
+    r"|implement|calculat|design|plan|weather)"
+    r"|\d\s*[-+*/^%]\s*\d",
+    re.IGNORECASE
+)
+
+def classify(message: str, context_tokens: int, max_chars: int, max_context_tokens: int) -> Tuple[str, str]:
+    """
+    按本地规则给请求分类
+
+    Args:
+        message: 用户消息
+        context_tokens: 本次发送给模型的历史窗口的token数
+        max_chars: 发给快速模型的消息最大字符数
+        max_context_tokens: 发给快速模型的历史窗口最大token数
+
+    Returns:
+        (路由, 原因)，原因为 simple/long/code/complex/context 之一
+    """
+    if len(message) > max_chars or message.count("\n") >= MAX_FAST_LINES:
+        return DEFAULT_ROUTE, "long"
+    if _CODE_PATTERN.search(message):
+        return DEFAULT_ROUTE, "code"
+    if _COMPLEX_PATTERN.search(message):
+        return DEFAULT_ROUTE, "complex"
+    if context_tokens > max_context_tokens:
+        return DEFAULT_ROUTE, "context"
+    return FAST_ROUTE, "simple"
+
+class ModelRoute:
+    """一条路由及其统计"""
+
+    __slots__ = ("name", "model", "latency", "requests", "errors", "fallbacks", "failures", "paused_until")
+
+    def __init__(self, name: str, model: str):
+        self.name = name
+        self.model = model
+        # 调用耗时（秒）的移动平均，None表示尚无样本
+        self.latency: Optional[float] = None
+        self.requests = 0
+        self.errors = 0
+        self.fallbacks = 0
+        # 连续失败次数，达到阈值后暂停使用到paused_until
+        self.failures = 0
+        self.paused_until = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "requests": self.requests,
+            "errors": self.errors,
+            "fallbacks": self.fallbacks,
+            "paused": time.monotonic() < self.paused_until
+        }
+
+class ModelRouter:
+    """在快速模型和默认模型之间路由一个agent的请求"""
+
+    def __init__(
+        self,
+        agent_name: str,
+        default_model: str,
+        fast_model: str,
+        max_chars: int = 200,
+        max_context_tokens: int = 1500,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0
+    ):
+        """
+        Args:
+            agent_name: 记录到指标中的agent名称
+            default_model: 默认（大）模型
+            fast_model: 快速（小）模型
+            max_chars: 发给快速模型的消息最大字符数
+            max_context_tokens: 发给快速模型的历史窗口最大token数
+            failure_threshold: 快速模型连续失败多少次后暂停路由，0表示不暂停
+            cooldown: 暂停路由的时间（秒）
+        """
+        self.agent_name = agent_name
+        self.routes = {
+            DEFAULT_ROUTE: ModelRoute(DEFAULT_ROUTE, default_model),
+            FAST_ROUTE: ModelRoute(FAST_ROUTE, fast_model),
+        }
+        self.max_chars = max_chars
+        self.max_context_tokens = max_context_tokens
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+    def model_for(self, route: str) -> str:
+        """路由对应的模型名称"""
+        return self.routes[route].model
+
+    def choose(self, message: str, context_tokens: int = 0) -> Tuple[str, str]:
+        """
+        为一次请求选择路由（不计入指标，由run/stream在实际调用模型时计入）
+
+        Args:
+            message: 用户消息
+            context_tokens: 本次发送给模型的历史窗口的token数
+
+        Returns:
+            (路由名称, 原因)
+        """
+        route, reason = classify(message, context_tokens, self.max_chars, self.max_context_tokens)
+        if route == FAST_ROUTE and time.monotonic() < self.routes[FAST_ROUTE].paused_until:
+            route, reason = DEFAULT_ROUTE, "paused"
+        return route, reason
+
+    async def run(self, route: str, reason: str, call: Callable[[str], Awaitable[T]]) -> T:
+        """
+        按路由执行一次模型调用，快速模型失败时回退到默认模型
+
+        Args:
+            route: choose返回的路由
+            reason: choose返回的原因
+            call: 接收路由名称、执行实际调用的函数
+
+        Returns:
+            调用结果
+        """
+        MODEL_ROUTE_REQUESTS.labels(self.agent_name, route, reason).inc()
+        started = time.perf_counter()
+        try:
+            result = await call(route)
+        except Exception as e:
+            self._record(route, started, False)
+            if route == DEFAULT_ROUTE:
+                raise
+            route = self._fallback(e)
+            started = time.perf_counter()
+            try:
+                result = await call(route)
+            except Exception:
+                self._record(route, started, False)
+                raise
+        self._record(route, started, True)
+        return result
+
+    async def stream(self, route: str, reason: str, call: Callable[[str], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        按路由执行一次流式调用，快速模型在输出第一个片段之前失败时回退到默认模型
+
+        已经输出片段后失败不再回退，错误原样抛出；调用方中途停止消费时不记录结果。
+        """
+        MODEL_ROUTE_REQUESTS.labels(self.agent_name, route, reason).inc()
+        while True:
+            started = time.perf_counter()
+            emitted = False
+            try:
+                async for item in call(route):
+                    emitted = True
+                    yield item
+            except Exception as e:
+                self._record(route, started, False)
+                if emitted or route == DEFAULT_ROUTE:
+                    raise
+                route = self._fallback(e)
+                continue
+            self._record(route, started, True)
+            return
+
+    def _fallback(self, error: Exception) -> str:
+        """记录一次快速模型的失败回退，返回回退的路由"""
+        self.routes[FAST_ROUTE].fallbacks += 1
+        MODEL_ROUTE_FALLBACKS.labels(self.agent_name).inc()
+        logger.warning("快速模型调用失败，回退到默认模型: %s: %s", type(error).__name__, error)
+        return DEFAULT_ROUTE
+
+    def _record(self, route_name: str, started: float, ok: bool) -> None:
+        """记录一次调用的耗时和结果"""
+        elapsed = time.perf_counter() - started
+        route = self.routes[route_name]
+        route.requests += 1
+        MODEL_ROUTE_LATENCY.labels(self.agent_name, route_name).observe(elapsed)
+        if ok:
+            route.latency = elapsed if route.latency is None else route.latency + EWMA_ALPHA * (elapsed - route.latency)
+            route.failures = 0
+            return
+        route.errors += 1
+        route.failures += 1
+        if route_name == FAST_ROUTE and self.failure_threshold and route.failures >= self.failure_threshold:
+            route.paused_until = time.monotonic() + self.cooldown
+            route.failures = 0
+            logger.warning("快速模型 %s 连续失败 %s 次，暂停路由 %ss", route.model, self.failure_threshold, self.cooldown)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各路由的统计信息"""
+        return {name: route.get_stats() for name, route in self.routes.items()}
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+工具执行沙箱
+
+CPU密集的工具在独立的进程池中执行，每次调用有超时，工作进程有内存上限。
+超时的调用所在的进程池会被强制终止并重建，失控的工具不会占住事件循环
+或拖慢其他用户的请求。
+
+工作进程由forkserver（不支持时用spawn）启动，不继承父进程的线程和连接。
+forkserver预加载只依赖标准库的sandbox_worker；子进程仍会按multiprocessing的规则
+重新导入入口脚本，因此入口脚本（main.py）在模块级不导入应用。
+"""
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional
+from . import sandbox_worker
+from .config import settings
+from .logging import logger
+
+class ToolTimeoutError(Exception):
+    """工具执行超时"""
+
+class ToolSandboxError(Exception):
+    """工具执行进程异常退出（如超出内存上限）"""
+
+def _worker_context() -> multiprocessing.context.BaseContext:
+    """工作进程的启动方式：优先forkserver，并预加载工作进程的入口模块"""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([sandbox_worker.__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+class ToolSandbox:
+    """在进程池中执行工具函数"""
+
+    def __init__(self, max_workers: int = 2, timeout: float = 2.0, memory_limit_mb: int = 256):
+        """
+        Args:
+            max_workers: 工作进程数
+            timeout: 单次调用的默认超时（秒）
+            memory_limit_mb: 每个工作进程启动后可再分配的内存上限（MB），0表示不限制
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # 当前进程池启动的工作进程，超时时逐个终止
+        self._workers: List[multiprocessing.process.BaseProcess] = []
+        self.stats = {"calls": 0, "timeouts": 0, "failures": 0, "restarts": 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """首次使用时启动进程池"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=_worker_context(),
+                initializer=sandbox_worker.limit_resources,
+                initargs=(self.memory_limit,)
+            )
+            self._workers = []
+        return self._executor
+
+    def _submit(self, executor: ProcessPoolExecutor, func: Callable[..., Any], *args: Any) -> "asyncio.Future[Any]":
+        """
+        提交一次调用，记录提交时启动的工作进程
+        
+        进程池在提交时按需启动工作进程，提交前后multiprocessing.active_children()的差集
+        就是这次启动的进程。
+        """
+        started = set(multiprocessing.active_children())
+        future = asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        self._workers.extend(process for process in multiprocessing.active_children() if process not in started)
+        return future
+
+    def _restart(self, executor: ProcessPoolExecutor) -> None:
+        """强制终止进程池的所有工作进程，下次调用时重建进程池"""
+        if executor is not self._executor:
+            # 同一进程池的其他调用已经重建过
+            return
+        self._executor = None
+        # ProcessPoolExecutor不支持取消运行中的任务，只能直接终止进程
+        for process in self._workers:
+            process.kill()
+        self._workers = []
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.stats["restarts"] += 1
+
+    async def run(self, func: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """
+        在工作进程中执行函数
+
+        Args:
+            func: 可在子进程中导入的模块级函数
+            *args: 函数参数（需可pickle）
+            timeout: 超时时间（秒），默认使用构造时的配置
+
+        Returns:
+            函数返回值；函数抛出的异常会原样抛出
+
+        Raises:
+            ToolTimeoutError: 执行超时
+            ToolSandboxError: 工作进程异常退出
+        """
+        self.stats["calls"] += 1
+        executor = self._get_executor()
+        future = self._submit(executor, func, *args)
+        try:
+            return await asyncio.wait_for(future, timeout=timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            logger.warning("工具 %s 执行超时，重建工具进程池", getattr(func, '__name__', func))
+            self._restart(executor)
+            raise ToolTimeoutError(f"执行超时（{timeout or self.timeout}s）")
+        except BrokenProcessPool as e:
+            self.stats["failures"] += 1
+            logger.warning("工具 %s 的工作进程异常退出: %s", getattr(func, '__name__', func), e)
+            self._restart(executor)
+            raise ToolSandboxError("工具进程异常退出") from e
+        except MemoryError as e:
+            self.stats["failures"] += 1
+            raise ToolSandboxError("超出内存上限") from e
+
+    def get_stats(self) -> dict:
+        """获取沙箱统计信息"""
+        return {**self.stats, "workers": self.max_workers, "running": self._executor is not None}
+
+    def close(self) -> None:
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._workers = []
+
+# 全局工具沙箱
+tool_sandbox = ToolSandbox(
+    max_workers=settings.TOOL_SANDBOX_WORKERS,
+    timeout=settings.TOOL_TIMEOUT,
+    memory_limit_mb=settings.TOOL_MEMORY_LIMIT_MB
+)
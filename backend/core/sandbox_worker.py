@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+工具沙箱工作进程的入口模块
+
+forkserver启动时预加载本模块，工作进程的初始化函数也在这里，
+因此这里只能依赖标准库，不能导入应用的其他模块。
+"""
+
+import os
+
+def limit_resources(memory_limit: int) -> None:
+    """工作进程初始化：限制地址空间在启动后的基础上最多再增长memory_limit字节"""
+    if memory_limit <= 0:
+        return
+    try:
+        import resource
+        with open("/proc/self/statm", "r") as f:
+            current = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+        resource.setrlimit(resource.RLIMIT_AS, (current + memory_limit, current + memory_limit))
+    except (ImportError, ValueError, OSError):
+        # 非Linux平台不支持时只依靠超时
+        pass
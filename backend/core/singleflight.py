@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+请求合并模块
+
+相同键的并发调用共享同一个进行中的上游请求（single-flight），
+突发的重复请求只会产生一次上游调用。
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+class _Flight:
+    """一个进行中的共享调用"""
+    
+    __slots__ = ("task", "waiters")
+    
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """合并相同键的并发异步调用"""
+    
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+    
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        执行调用；若已有相同键的调用在进行中，则等待并共享其结果
+        
+        某个等待方被取消不会影响其他等待方，只有所有等待方都取消时才取消上游调用。
+        
+        Args:
+            key: 合并键
+            factory: 创建实际调用的函数，只有首个调用方会执行
+        
+        Returns:
+            共享调用的结果（异常同样会传递给所有等待方）
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+        
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取合并统计"""
+        return {"in_flight": len(self._flights), **self.stats}
+    
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+# 全局上游调用合并实例
+upstream_flights = SingleFlight()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+请求追踪模块
+
+以contextvars传递当前span，记录每个请求各阶段（历史组装、排队、每轮模型调用、
+每次工具调用）的耗时。结束的span由后台线程批量导出到本地JSONL文件和/或
+OTLP/HTTP（JSON编码）兼容的收集器，请求处理路径上只做一次入队。
+同一请求的span还会汇总为Server-Timing响应头。
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+import httpx
+from .config import settings
+from .logging import logger
+
+class Trace:
+    """一个请求内结束的所有span，用于生成Server-Timing"""
+
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List["Span"] = []
+
+    def server_timing(self) -> str:
+        """按阶段名称汇总耗时，格式为 name;dur=毫秒;desc="次数" """
+        stages: Dict[str, List[float]] = {}
+        for span in self.spans:
+            stage = stages.setdefault(span.name, [0.0, 0])
+            stage[0] += span.duration_ms
+            stage[1] += 1
+        return ", ".join(
+            f'{name};dur={total:.1f}' + (f';desc="{count}x"' if count > 1 else "")
+            for name, (total, count) in stages.items()
+        )
+
+class Span:
+    """一个计时的阶段"""
+
+    __slots__ = ("name", "trace", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, start_ns: Optional[int] = None,
+                 **attributes: Any):
+        self.name = name
+        self.trace = parent.trace if parent else Trace(os.urandom(16).hex())
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """结束span，记录到所属请求并交给导出器"""
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = str(error) or type(error).__name__
+        self.trace.spans.append(self)
+        if exporter is not None:
+            exporter.submit(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    """转换为OTLP的KeyValue"""
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("agentarena_current_span", default=None)
+
+def current_span() -> Optional[Span]:
+    """获取当前上下文中的span"""
+    return _current_span.get()
+
+def start_span(name: str, **attributes: Any) -> Span:
+    """创建当前span的子span（不切换当前span），用于由回调分别开始和结束的阶段"""
+    return Span(name, _current_span.get(), **attributes)
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """在with块内记录一个子span，并将其设为当前span"""
+    current = Span(name, _current_span.get(), **attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        _current_span.reset(token)
+        current.finish(e)
+        raise
+    _current_span.reset(token)
+    current.finish()
+
+def record_span(name: str, duration: float, **attributes: Any) -> None:
+    """记录一个刚刚结束、耗时已知的阶段（如排队等待）"""
+    end_ns = time.time_ns()
+    Span(name, _current_span.get(), start_ns=end_ns - int(duration * 1e9), **attributes).finish()
+
+class SpanExporter:
+    """后台线程批量导出span"""
+
+    def __init__(self, path: str = "", otlp_endpoint: str = "", max_queue: int = 10000,
+                 batch_size: int = 256, interval: float = 1.0):
+        self.path = path
+        self.otlp_endpoint = otlp_endpoint.rstrip("/")
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, span: Span) -> None:
+        """提交结束的span，队列已满时丢弃而不阻塞请求"""
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        """导出剩余的span并停止后台线程"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        client = httpx.Client(timeout=5.0) if self.otlp_endpoint else None
+        running = True
+        while running:
+            batch: List[Span] = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            if batch:
+                self._export(batch, client)
+        if client:
+            client.close()
+
+    def _export(self, batch: List[Span], client: Optional[httpx.Client]) -> None:
+        if self.path:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(s.to_dict(), ensure_ascii=False, default=str) + "\n" for s in batch)
+            except OSError as e:
+                logger.warning("写入追踪文件失败: %s", e)
+        if client:
+            payload = {"resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", settings.APP_NAME)]},
+                "scopeSpans": [{"scope": {"name": "agentarena"}, "spans": [s.to_otlp() for s in batch]}]
+            }]}
+            try:
+                client.post(f"{self.otlp_endpoint}/v1/traces", json=payload).raise_for_status()
+            except httpx.HTTPError as e:
+                logger.warning("导出追踪数据失败: %s", e)
+
+def _create_exporter() -> Optional[SpanExporter]:
+    """按配置创建导出器，未配置导出目标时只在进程内汇总Server-Timing"""
+    if not (settings.TRACE_FILE or settings.TRACE_OTLP_ENDPOINT):
+        return None
+    if settings.TRACE_FILE:
+        os.makedirs(os.path.dirname(os.path.abspath(settings.TRACE_FILE)), exist_ok=True)
+    return SpanExporter(settings.TRACE_FILE, settings.TRACE_OTLP_ENDPOINT)
+
+exporter = _create_exporter()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+上游路由模块
+
+作为共享异步HTTP客户端的传输层，把发往OPENAI_API_BASE的请求分发到
+UPSTREAM_ENDPOINTS中的多个OpenAI兼容端点，对所有agent（包括LangChain的工具循环）透明：
+
+- 按各端点的响应延迟和错误率（指数加权移动平均）及当前并发打分，选择得分最低的端点；
+  并发数计入得分，突发请求不会全部涌向同一端点；连续失败的端点暂停使用一段时间
+- 每个请求有截止时间，覆盖所有重试和对冲
+- 连接失败、超时和429/5xx按带抖动的指数退避重试，优先换一个端点
+- 超过阈值仍无响应时向另一个端点发出对冲请求，先返回的结果胜出，另一个被取消
+
+重试和对冲只发生在取得响应头之前，流式响应开始输出后不再重试。
+"""
+
+import asyncio
+import random
+import time
+from typing import Dict, Any, List, Optional, Set
+import httpx
+from .logging import logger
+from .metrics import UPSTREAM_ATTEMPTS, UPSTREAM_HEDGES, UPSTREAM_RETRIES
+
+# 可以重试的HTTP状态码
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+# 延迟和错误率的指数加权系数
+EWMA_ALPHA = 0.2
+# 错误率折算的延迟（秒）：错误率100%的端点得分相当于多出这么多延迟
+ERROR_PENALTY = 5.0
+# 尚无成功样本的端点假定的延迟（秒）
+UNKNOWN_LATENCY = 0.001
+# 设置后请求直接发往原地址，不经过路由（如连接预热）
+DIRECT_EXTENSION = "agentarena_upstream_direct"
+
+class UpstreamEndpoint:
+    """一个上游端点及其健康状态"""
+
+    __slots__ = ("base_url", "latency", "error_rate", "in_flight", "failures", "open_until", "requests")
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        # 取得响应头的耗时（秒）的移动平均，None表示尚无样本
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        # 连续失败次数，达到阈值后暂停使用到open_until
+        self.failures = 0
+        self.open_until = 0.0
+        self.requests = 0
+
+    def available(self, now: float) -> bool:
+        """端点当前是否可用（不在暂停期内）"""
+        return now >= self.open_until
+
+    def score(self) -> float:
+        """得分越低越优先：延迟乘以排队的请求数，再加上错误率折算的延迟"""
+        # 尚无成功样本的端点按极小的延迟计算：会被优先尝试，并发数仍然生效
+        latency = self.latency or UNKNOWN_LATENCY
+        return latency * (1 + self.in_flight) + ERROR_PENALTY * self.error_rate
+
+    def record(self, latency: float, ok: bool, failure_threshold: int, cooldown: float) -> None:
+        """记录一次请求的结果"""
+        self.requests += 1
+        self.error_rate += EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            self.latency = latency if self.latency is None else self.latency + EWMA_ALPHA * (latency - self.latency)
+            self.failures = 0
+            return
+        self.failures += 1
+        if failure_threshold and self.failures >= failure_threshold:
+            self.open_until = time.monotonic() + cooldown
+            logger.warning("上游端点 %s 连续失败 %s 次，暂停使用 %ss", self.base_url, self.failures, cooldown)
+
+    def record_cancelled(self, elapsed: float) -> None:
+        """请求被取消（对冲落败或调用方放弃）：耗时是实际延迟的下限，只用于调高延迟估计"""
+        if self.latency is None or elapsed > self.latency:
+            self.latency = elapsed if self.latency is None else self.latency + EWMA_ALPHA * (elapsed - self.latency)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "available": self.available(time.monotonic())
+        }
+
+class UpstreamRouter(httpx.AsyncBaseTransport):
+    """在多个上游端点之间路由、重试和对冲请求的httpx传输层"""
+
+    def __init__(
+        self,
+        primary_url: str,
+        endpoints: List[str],
+        transport: httpx.AsyncBaseTransport,
+        deadline: float = 120.0,
+        max_retries: int = 2,
+        retry_backoff: float = 0.25,
+        hedge_after: float = 0.0,
+        failure_threshold: int = 3,
+        cooldown: float = 10.0
+    ):
+        """
+        Args:
+            primary_url: 模型客户端配置的上游地址，以它开头的请求才会被路由
+            endpoints: 可用的端点地址列表
+            transport: 实际发送请求的传输层（持有连接池）
+            deadline: 每个请求取得响应的截止时间（秒）
+            max_retries: 最大重试次数
+            retry_backoff: 指数退避基数（秒），实际等待时间在0到退避上限之间随机
+            hedge_after: 发出对冲请求前等待的时间（秒），0表示不对冲
+            failure_threshold: 连续失败多少次后暂停使用端点，0表示不暂停
+            cooldown: 暂停使用的时间（秒）
+        """
+        self.primary_url = primary_url.rstrip("/")
+        self.endpoints = [UpstreamEndpoint(url) for url in (endpoints or [primary_url])]
+        self.transport = transport
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.hedge_after = hedge_after
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        if request.extensions.get(DIRECT_EXTENSION) or not url.startswith(self.primary_url):
+            return await self.transport.handle_async_request(request)
+        try:
+            content = request.content
+        except httpx.RequestNotRead:
+            # 流式请求体无法重放，不做路由
+            return await self.transport.handle_async_request(request)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        suffix = url[len(self.primary_url):]
+        tried: Set[UpstreamEndpoint] = set()
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # 带抖动的指数退避，等待后超过截止时间则不再重试
+                delay = random.uniform(0, self.retry_backoff * 2 ** (attempt - 1))
+                if loop.time() + delay >= deadline:
+                    break
+                UPSTREAM_RETRIES.labels().inc()
+                await asyncio.sleep(delay)
+
+            last_attempt = attempt == self.max_retries
+            try:
+                response = await self._attempt(request, content, suffix, deadline, tried)
+            except httpx.TransportError as e:
+                if last_attempt or loop.time() >= deadline:
+                    raise
+                logger.warning("上游请求失败，准备重试: %s: %s", type(e).__name__, e)
+                continue
+
+            if response.status_code not in RETRYABLE_STATUS or last_attempt or loop.time() >= deadline:
+                return response
+            await response.aclose()
+            logger.warning("上游返回 %s，准备重试", response.status_code)
+
+        raise httpx.TimeoutException(f"上游请求超过截止时间（{self.deadline}s）", request=request)
+
+    def _choose(self, exclude: Set[UpstreamEndpoint]) -> UpstreamEndpoint:
+        """选择得分最低的可用端点，优先选择本次请求尚未尝试过的端点（得分相同时随机）"""
+        now = time.monotonic()
+        available = [e for e in self.endpoints if e.available(now)] or self.endpoints
+        candidates = [e for e in available if e not in exclude] or available
+        if len(candidates) == 1:
+            return candidates[0]
+        return min(random.sample(candidates, len(candidates)), key=UpstreamEndpoint.score)
+
+    async def _attempt(self, request: httpx.Request, content: bytes, suffix: str,
+                       deadline: float, tried: Set[UpstreamEndpoint]) -> httpx.Response:
+        """
+        发送一次请求，返回最先取得的可用响应
+
+        开启对冲时，超过对冲阈值仍无响应、或其中一路已经失败而另一路仍在进行时，
+        立即向尚未尝试过的端点追加一路请求。所有路都失败时返回最后一个可重试的响应
+        或抛出最后一个错误，由调用方决定是否退避重试。
+        """
+        loop = asyncio.get_running_loop()
+        tasks: Dict[asyncio.Task, UpstreamEndpoint] = {}
+
+        def launch() -> Optional[asyncio.Task]:
+            endpoint = self._choose(tried)
+            if tasks and endpoint in tried:
+                # 没有尚未尝试的端点可供对冲
+                return None
+            tried.add(endpoint)
+            task = asyncio.ensure_future(self._send(endpoint, request, content, suffix))
+            tasks[task] = endpoint
+            return task
+
+        first = launch()
+        legs = 1
+        hedge_at = loop.time() + self.hedge_after if self.hedge_after > 0 else None
+        failed_response: Optional[httpx.Response] = None
+        error: Optional[BaseException] = None
+        try:
+            while tasks:
+                now = loop.time()
+                if now >= deadline:
+                    raise httpx.TimeoutException(f"上游请求超过截止时间（{self.deadline}s）", request=request)
+                timeout = deadline - now
+                if hedge_at is not None:
+                    timeout = min(timeout, max(hedge_at - now, 0))
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if hedge_at is not None and loop.time() >= hedge_at:
+                        # 迟迟没有响应，向另一个端点发出对冲请求
+                        hedge_at = None
+                        legs += launch() is not None
+                    continue
+
+                for task in done:
+                    tasks.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    response = task.result()
+                    if response.status_code not in RETRYABLE_STATUS:
+                        if legs > 1:
+                            UPSTREAM_HEDGES.labels("lost" if task is first else "won").inc()
+                        return response
+                    if failed_response is not None:
+                        await failed_response.aclose()
+                    failed_response = response
+
+                if tasks and self.hedge_after > 0:
+                    # 有一路已经失败，不再等待对冲阈值
+                    legs += launch() is not None
+
+            if failed_response is not None:
+                response, failed_response = failed_response, None
+                return response
+            raise error
+        finally:
+            if failed_response is not None:
+                await failed_response.aclose()
+            for task in tasks:
+                task.cancel()
+                task.add_done_callback(_close_response)
+
+    async def _send(self, endpoint: UpstreamEndpoint, request: httpx.Request,
+                    content: bytes, suffix: str) -> httpx.Response:
+        """把请求改写到指定端点并发送，记录端点的延迟和结果"""
+        headers = request.headers.copy()
+        headers.pop("host", None)
+        routed = httpx.Request(
+            request.method,
+            endpoint.base_url + suffix,
+            headers=headers,
+            content=content,
+            extensions=request.extensions
+        )
+        endpoint.in_flight += 1
+        started = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(routed)
+        except asyncio.CancelledError:
+            endpoint.record_cancelled(time.perf_counter() - started)
+            UPSTREAM_ATTEMPTS.labels(endpoint.base_url, "cancelled").inc()
+            raise
+        except Exception:
+            endpoint.record(time.perf_counter() - started, False, self.failure_threshold, self.cooldown)
+            UPSTREAM_ATTEMPTS.labels(endpoint.base_url, "error").inc()
+            raise
+        finally:
+            endpoint.in_flight -= 1
+
+        ok = response.status_code not in RETRYABLE_STATUS
+        endpoint.record(time.perf_counter() - started, ok, self.failure_threshold, self.cooldown)
+        UPSTREAM_ATTEMPTS.labels(endpoint.base_url, "ok" if ok else str(response.status_code)).inc()
+        return response
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各端点的健康状态"""
+        return {endpoint.base_url: endpoint.get_stats() for endpoint in self.endpoints}
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+def _close_response(task: asyncio.Task) -> None:
+    """被取消前已经取得的响应需要关闭，释放连接"""
+    if task.cancelled() or task.exception() is not None:
+        return
+    asyncio.ensure_future(task.result().aclose())
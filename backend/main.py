@@ -3,16 +3,33 @@
 AgentArena 后端服务启动文件
 
 这是整个后端应用的入口点，负责启动FastAPI服务器。
+
+工具沙箱和uvicorn的工作进程会按multiprocessing的规则重新导入本文件，
+因此模块级只做轻量的导入，应用在首次访问main.app时才加载。
 """
 
-import uvicorn
-from api.main import app
+def __getattr__(name):
+    """按需导入应用，兼容 `uvicorn main:app`"""
+    if name == "app":
+        from api.main import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
+    import uvicorn
+    from core.config import settings
+    from core.logging import logger
+    
+    workers = settings.WORKERS
+    if workers > 1 and settings.CONVERSATION_STORE != "shared":
+        logger.warning("多worker模式下建议设置CONVERSATION_STORE=shared，否则对话历史无法在worker间共享")
+    
     uvicorn.run(
         "api.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        # 热重载与多worker互斥
+        reload=workers == 1,
+        workers=workers,
         log_level="info"
-    )
\ No newline at end of file
+    )
@@ -1,5 +1,5 @@
 # 数据模型模块初始化文件
-from .chat import ChatMessage, ChatResponse
+from .chat import ChatMessage, ChatResponse, ArenaRequest, BatchChatRequest
 from .agent import AgentInfo
 
-__all__ = ["ChatMessage", "ChatResponse", "AgentInfo"]
\ No newline at end of file
+__all__ = ["ChatMessage", "ChatResponse", "ArenaRequest", "BatchChatRequest", "AgentInfo"]
\ No newline at end of file
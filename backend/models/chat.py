@@ -6,7 +6,7 @@
 """
 
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from core.config import settings
 
 class ChatMessage(BaseModel):
@@ -26,4 +26,38 @@ class ChatResponse(BaseModel):
     response: str = Field(..., description="Agent的回复内容")
     agent_name: str = Field(..., description="处理消息的Agent名称")
     conversation_id: str = Field(..., description="对话ID")
-    timestamp: Optional[str] = Field(None, description="响应时间戳")
\ No newline at end of file
+    timestamp: Optional[str] = Field(None, description="响应时间戳")
+
+class ArenaRequest(BaseModel):
+    """竞技场请求模型：同一条消息并发发送给多个agent"""
+    message: str = Field(..., description="用户发送的消息内容", min_length=1)
+    agent_names: List[str] = Field(
+        ...,
+        description="参与比较的Agent名称列表",
+        min_length=1,
+        max_length=settings.ARENA_MAX_AGENTS
+    )
+    conversation_id: str = Field(
+        default="arena",
+        description="对话ID，每个agent各自维护该对话的历史"
+    )
+    timeout: Optional[float] = Field(
+        default=None,
+        description="每个agent的超时时间（秒），默认使用ARENA_AGENT_TIMEOUT",
+        gt=0
+    )
+
+class BatchChatRequest(BaseModel):
+    """批量聊天请求模型：多条相互独立的消息"""
+    items: List[ChatMessage] = Field(
+        ...,
+        description="要处理的消息列表",
+        min_length=1,
+        max_length=settings.BATCH_MAX_ITEMS
+    )
+    max_concurrency: Optional[int] = Field(
+        default=None,
+        description="每个agent同时进行的上游调用数，默认使用BATCH_MAX_CONCURRENCY",
+        gt=0,
+        le=settings.BATCH_MAX_CONCURRENCY
+    )
@@ -3,6 +3,7 @@
 启动脚本 - 使用 uv 运行 FastAPI 应用
 """
 
+import os
 import subprocess
 import sys
 
@@ -13,10 +14,16 @@ def main():
         cmd = [
             "uv", "run", "uvicorn", "main:app",
             "--host", "0.0.0.0",
-            "--port", "8000",
-            "--reload"
+            "--port", "8000"
         ]
         
+        # 多worker模式（需配合CONVERSATION_STORE=shared共享对话历史）
+        workers = int(os.getenv("WORKERS", "1"))
+        if workers > 1:
+            cmd += ["--workers", str(workers)]
+        else:
+            cmd.append("--reload")
+        
         print("🚀 启动 AgentArena Backend API...")
         print(f"📝 命令: {' '.join(cmd)}")
         print("🌐 服务地址: http://localhost:8000")
@@ -0,0 +1,49 @@
+# 对话存储模块初始化文件
+from typing import Optional
+from core.config import settings
+from .base import ConversationStore
+from .sqlite import SQLiteConversationStore
+from .shared import SharedListBackend, SQLiteListBackend, SharedConversationStore, create_shared_backend
+
+_store: Optional[ConversationStore] = None
+
+def get_conversation_store() -> Optional[ConversationStore]:
+    """
+    获取全局对话存储实例
+    
+    Returns:
+        根据配置创建的存储实例；纯内存模式下返回None
+    """
+    global _store
+    if _store is None:
+        if settings.CONVERSATION_STORE == "sqlite":
+            _store = SQLiteConversationStore(
+                settings.CONVERSATION_DB_PATH,
+                flush_interval=settings.CONVERSATION_FLUSH_INTERVAL,
+                batch_size=settings.CONVERSATION_FLUSH_BATCH_SIZE,
+                max_length=settings.MAX_CONVERSATION_HISTORY
+            )
+        elif settings.CONVERSATION_STORE == "shared":
+            _store = SharedConversationStore(
+                create_shared_backend(settings.SHARED_STATE_URL),
+                max_length=settings.MAX_CONVERSATION_HISTORY
+            )
+    return _store
+
+def close_conversation_store() -> None:
+    """提交剩余写入并关闭全局对话存储"""
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
+
+__all__ = [
+    "ConversationStore",
+    "SQLiteConversationStore",
+    "SharedListBackend",
+    "SQLiteListBackend",
+    "SharedConversationStore",
+    "create_shared_backend",
+    "get_conversation_store",
+    "close_conversation_store"
+]
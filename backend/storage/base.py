@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+对话存储接口
+
+定义对话历史持久化后端必须实现的接口。
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Mapping, Optional, Sequence
+
+def find_compacted_end(current: Sequence[Mapping[str, Any]], replaced: Sequence[Mapping[str, Any]]) -> Optional[int]:
+    """
+    在对话中定位被摘要覆盖的连续消息，按role、content和timestamp逐条比较
+    
+    Args:
+        current: 存储中按时间顺序排列的全部消息
+        replaced: 生成摘要时使用的消息
+    
+    Returns:
+        这段消息之后的位置；摘要期间它们被截断或清除时返回None
+    """
+    count = len(replaced)
+    if not count:
+        return None
+    expected = [(msg["role"], msg["content"], msg["timestamp"]) for msg in replaced]
+    for start in range(len(current) - count + 1):
+        if all(
+            (current[start + offset]["role"], current[start + offset]["content"], current[start + offset]["timestamp"])
+            == expected[offset]
+            for offset in range(count)
+        ):
+            return start + count
+    return None
+
+class ConversationStore(ABC):
+    """对话存储抽象类"""
+    
+    # 为True表示数据在多个进程间共享，此时agent不能使用进程内缓存
+    shared: bool = False
+    
+    @abstractmethod
+    def append(self, agent_name: str, conversation_id: str, message: Dict[str, Any]) -> None:
+        """
+        追加一条消息（实现应尽量不阻塞调用方）
+        
+        Args:
+            agent_name: Agent名称
+            conversation_id: 对话ID
+            message: 消息字典，包含role、content、timestamp
+        """
+        pass
+    
+    @abstractmethod
+    def load(self, agent_name: str, conversation_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        读取对话历史的尾部窗口
+        
+        Args:
+            agent_name: Agent名称
+            conversation_id: 对话ID
+            limit: 最多返回的消息数，为None时返回全部
+        
+        Returns:
+            按时间顺序排列的消息列表
+        """
+        pass
+    
+    async def aload(self, agent_name: str, conversation_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        在事件循环之外读取对话历史的尾部窗口（默认在线程池中调用load）
+        
+        Args:
+            agent_name: Agent名称
+            conversation_id: 对话ID
+            limit: 最多返回的消息数，为None时返回全部
+        
+        Returns:
+            按时间顺序排列的消息列表
+        """
+        return await asyncio.to_thread(self.load, agent_name, conversation_id, limit)
+    
+    @abstractmethod
+    def delete(self, agent_name: str, conversation_id: str) -> bool:
+        """
+        删除对话
+        
+        Args:
+            agent_name: Agent名称
+            conversation_id: 对话ID
+        
+        Returns:
+            对话是否存在
+        """
+        pass
+    
+    async def adelete(self, agent_name: str, conversation_id: str) -> bool:
+        """在事件循环之外删除对话（默认在线程池中调用delete）"""
+        return await asyncio.to_thread(self.delete, agent_name, conversation_id)
+    
+    @abstractmethod
+    def count_conversations(self, agent_name: str) -> int:
+        """获取指定agent的对话数量"""
+        pass
+    
+    @abstractmethod
+    def count_messages(self, agent_name: str) -> int:
+        """获取指定agent的消息总数"""
+        pass
+    
+    async def acount_conversations(self, agent_name: str) -> int:
+        """在事件循环之外获取对话数量（默认在线程池中调用count_conversations）"""
+        return await asyncio.to_thread(self.count_conversations, agent_name)
+    
+    async def acount_messages(self, agent_name: str) -> int:
+        """在事件循环之外获取消息总数（默认在线程池中调用count_messages）"""
+        return await asyncio.to_thread(self.count_messages, agent_name)
+    
+    @abstractmethod
+    def compact(self, agent_name: str, conversation_id: str, replaced: List[Dict[str, Any]],
+                message: Dict[str, Any]) -> bool:
+        """
+        压缩对话：将被摘要覆盖的消息（及更早的消息）替换为一条摘要消息
+        
+        实现应在一个事务中先用find_compacted_end确认replaced仍在对话中，再删除和插入，
+        摘要期间追加的消息保留在摘要之后。
+        
+        Args:
+            agent_name: Agent名称
+            conversation_id: 对话ID
+            replaced: 生成摘要时使用的消息
+            message: 替换旧消息的摘要消息
+        
+        Returns:
+            是否完成压缩；replaced已被截断或对话已被清除时返回False
+        """
+        pass
+    
+    async def acompact(self, agent_name: str, conversation_id: str, replaced: List[Dict[str, Any]],
+                       message: Dict[str, Any]) -> bool:
+        """在事件循环之外压缩对话（默认在线程池中调用compact）"""
+        return await asyncio.to_thread(self.compact, agent_name, conversation_id, replaced, message)
+    
+    def flush(self) -> None:
+        """将缓冲的写入提交到后端（默认无操作）"""
+        pass
+    
+    def close(self) -> None:
+        """提交剩余写入并释放资源（默认无操作）"""
+        pass
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+多进程共享的对话存储
+
+对话历史以列表形式保存在所有worker都能访问的后端中，每次追加立即写入、
+每次请求都读取最新数据，因此任意worker都能处理任意对话的后续消息。
+后端只需实现一组Redis风格的列表操作、管道和乐观事务（见SharedListBackend），
+redis-py的客户端可以直接使用，本地部署时使用基于SQLite文件的实现。
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Iterator, List, Optional, Protocol, Tuple
+from core.logging import logger
+from .base import ConversationStore, find_compacted_end
+
+class SharedListBackend(Protocol):
+    """共享列表后端协议（与redis-py同名方法的子集）"""
+    
+    def rpush(self, key: str, *values: str) -> int: ...
+    
+    def lpush(self, key: str, *values: str) -> int: ...
+    
+    def lrange(self, key: str, start: int, end: int) -> List[str]: ...
+    
+    def ltrim(self, key: str, start: int, end: int) -> Any: ...
+    
+    def llen(self, key: str) -> int: ...
+    
+    def delete(self, *keys: str) -> int: ...
+    
+    def scan_iter(self, match: Optional[str] = None) -> Iterator[str]: ...
+    
+    def pipeline(self, transaction: bool = True) -> Any: ...
+    
+    def transaction(self, func: Callable[[Any], Any], *watches: str, value_from_callable: bool = False) -> Any: ...
+
+class SQLiteListBackend:
+    """基于SQLite文件的本地共享列表后端，可被同一台机器上的多个进程同时使用"""
+    
+    def __init__(self, path: str):
+        """
+        初始化本地列表后端
+        
+        Args:
+            path: 数据库文件路径
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS list_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_list_items_key ON list_items (key, id);
+        """)
+        self._lock = threading.Lock()
+    
+    def pipeline(self, transaction: bool = True) -> "SQLiteListPipeline":
+        """创建在一个事务中执行的写操作管道（SQLite下始终是事务）"""
+        return SQLiteListPipeline(self)
+    
+    def transaction(self, func: Callable[["SQLiteListTransaction"], Any], *watches: str,
+                    value_from_callable: bool = False) -> Any:
+        """
+        与redis-py的transaction用法一致：func中的读取立即返回结果，multi()之后的写操作
+        与这些读取在同一个写事务中完成（SQLite下整个func持有写锁，不需要重试）
+        """
+        result = self._transaction(lambda: func(SQLiteListTransaction(self)))
+        return result if value_from_callable else []
+    
+    def _transaction(self, func: Callable[[], Any]) -> Any:
+        """在一个写事务中执行func"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+    
+    def rpush(self, key: str, *values: str) -> int:
+        return self._transaction(lambda: self._rpush(key, *values))
+    
+    def lpush(self, key: str, *values: str) -> int:
+        return self._transaction(lambda: self._lpush(key, *values))
+    
+    def _rpush(self, key: str, *values: str) -> int:
+        self._conn.executemany(
+            "INSERT INTO list_items (key, value) VALUES (?, ?)",
+            [(key, value) for value in values]
+        )
+        return self._count(key)
+    
+    def _lpush(self, key: str, *values: str) -> int:
+        (first_id,) = self._conn.execute(
+            "SELECT COALESCE(MIN(id), 0) FROM list_items WHERE key = ?", (key,)
+        ).fetchone()
+        # 与Redis一致：依次插入到表头，最后一个值排在最前
+        self._conn.executemany(
+            "INSERT INTO list_items (id, key, value) VALUES (?, ?, ?)",
+            [(first_id - offset, key, value) for offset, value in enumerate(values, start=1)]
+        )
+        return self._count(key)
+    
+    def _count(self, key: str) -> int:
+        (length,) = self._conn.execute(
+            "SELECT COUNT(*) FROM list_items WHERE key = ?", (key,)
+        ).fetchone()
+        return length
+    
+    def lrange(self, key: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            return self._lrange(key, start, end)
+    
+    def _lrange(self, key: str, start: int, end: int) -> List[str]:
+        if start < 0 and end == -1:
+            # 尾部窗口只读取需要的行
+            rows = self._conn.execute(
+                "SELECT value FROM list_items WHERE key = ? ORDER BY id DESC LIMIT ?", (key, -start)
+            ).fetchall()
+            return [row[0] for row in reversed(rows)]
+        
+        rows = self._conn.execute(
+            "SELECT value FROM list_items WHERE key = ? ORDER BY id", (key,)
+        ).fetchall()
+        values = [row[0] for row in rows]
+        # 与Redis一致：end为闭区间，负数表示从尾部计数
+        end = len(values) if end == -1 else end + 1
+        return values[start:end]
+    
+    def ltrim(self, key: str, start: int, end: int) -> bool:
+        return self._transaction(lambda: self._ltrim(key, start, end))
+    
+    def _ltrim(self, key: str, start: int, end: int) -> bool:
+        if end != -1:
+            raise ValueError("SQLiteListBackend.ltrim只支持保留到列表末尾（end=-1）")
+        if start < 0:
+            # 保留尾部 -start 个元素
+            sql = ("DELETE FROM list_items WHERE key = ? AND id NOT IN "
+                   "(SELECT id FROM list_items WHERE key = ? ORDER BY id DESC LIMIT ?)")
+            params = (key, key, -start)
+        else:
+            # 丢弃头部 start 个元素
+            sql = ("DELETE FROM list_items WHERE key = ? AND id IN "
+                   "(SELECT id FROM list_items WHERE key = ? ORDER BY id LIMIT ?)")
+            params = (key, key, start)
+        self._conn.execute(sql, params)
+        return True
+    
+    def llen(self, key: str) -> int:
+        with self._lock:
+            return self._count(key)
+    
+    def delete(self, *keys: str) -> int:
+        return self._transaction(lambda: self._delete(*keys))
+    
+    def _delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            cursor = self._conn.execute("DELETE FROM list_items WHERE key = ?", (key,))
+            deleted += 1 if cursor.rowcount > 0 else 0
+        return deleted
+    
+    def scan_iter(self, match: Optional[str] = None) -> Iterator[str]:
+        sql = "SELECT DISTINCT key FROM list_items"
+        params: tuple = ()
+        if match:
+            # 只支持前缀通配，如 "conv:agent:*"
+            sql += " WHERE key GLOB ?"
+            params = (match,)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return iter([row[0] for row in rows])
+    
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class SQLiteListPipeline:
+    """在一个事务中依次执行的一组写操作（与redis-py的pipeline用法一致）"""
+    
+    def __init__(self, backend: SQLiteListBackend):
+        self.backend = backend
+        self._operations: List[Tuple[Callable[..., Any], Tuple[Any, ...]]] = []
+    
+    def rpush(self, key: str, *values: str) -> "SQLiteListPipeline":
+        self._operations.append((self.backend._rpush, (key, *values)))
+        return self
+    
+    def lpush(self, key: str, *values: str) -> "SQLiteListPipeline":
+        self._operations.append((self.backend._lpush, (key, *values)))
+        return self
+    
+    def ltrim(self, key: str, start: int, end: int) -> "SQLiteListPipeline":
+        self._operations.append((self.backend._ltrim, (key, start, end)))
+        return self
+    
+    def delete(self, *keys: str) -> "SQLiteListPipeline":
+        self._operations.append((self.backend._delete, keys))
+        return self
+    
+    def llen(self, key: str) -> "SQLiteListPipeline":
+        self._operations.append((self.backend._count, (key,)))
+        return self
+    
+    def execute(self) -> List[Any]:
+        """提交所有操作，返回各操作的结果"""
+        operations, self._operations = self._operations, []
+        return self.backend._transaction(lambda: [func(*args) for func, args in operations])
+
+class SQLiteListTransaction:
+    """SQLiteListBackend.transaction传给func的对象，所有操作在已开启的写事务中立即执行"""
+    
+    def __init__(self, backend: SQLiteListBackend):
+        self.backend = backend
+    
+    def multi(self) -> None:
+        """与redis-py一致的写操作开始标记（SQLite下无操作）"""
+    
+    def lrange(self, key: str, start: int, end: int) -> List[str]:
+        return self.backend._lrange(key, start, end)
+    
+    def llen(self, key: str) -> int:
+        return self.backend._count(key)
+    
+    def rpush(self, key: str, *values: str) -> int:
+        return self.backend._rpush(key, *values)
+    
+    def lpush(self, key: str, *values: str) -> int:
+        return self.backend._lpush(key, *values)
+    
+    def ltrim(self, key: str, start: int, end: int) -> bool:
+        return self.backend._ltrim(key, start, end)
+    
+    def delete(self, *keys: str) -> int:
+        return self.backend._delete(*keys)
+
+class SharedConversationStore(ConversationStore):
+    """
+    基于共享列表后端的对话存储（写穿、无进程内缓存）
+    
+    所有后端操作在一个专用线程中按提交顺序执行：追加和压缩不等待写入完成，
+    不会因为其他worker持有写锁而阻塞事件循环；之后提交的读取排在这些写入之后，
+    总能读到本进程已写入的消息。请求路径上通过aload在该线程中读取。
+    
+    注意：对话锁只在进程内有效，不同worker同时处理同一对话的请求时不会相互等待，
+    历史可能交错。需要严格串行时应在负载均衡层按对话ID固定路由到同一worker。
+    """
+    
+    shared = True
+    
+    def __init__(self, backend: SharedListBackend, max_length: int = 50, key_prefix: str = "conv"):
+        """
+        初始化共享存储
+        
+        Args:
+            backend: 实现SharedListBackend协议的列表后端
+            max_length: 每个对话在后端保留的最大消息数
+            key_prefix: 键名前缀
+        """
+        self.backend = backend
+        self.max_length = max_length
+        self.key_prefix = key_prefix
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-store")
+    
+    def _key(self, agent_name: str, conversation_id: str) -> str:
+        return f"{self.key_prefix}:{agent_name}:{conversation_id}"
+    
+    def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """在存储线程中执行并等待结果（用于请求路径以外的调用）"""
+        return self._executor.submit(func, *args).result()
+    
+    def _write(self, description: str, func: Callable[..., Any], *args: Any) -> None:
+        """提交写操作到存储线程，不等待完成"""
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(lambda f: f.exception() and logger.error("共享存储%s失败: %s", description, f.exception()))
+    
+    def append(self, agent_name: str, conversation_id: str, message: Dict[str, Any]) -> None:
+        """提交到存储线程写入后端，不阻塞调用方"""
+        key = self._key(agent_name, conversation_id)
+        self._write("追加消息", self._append, key, json.dumps(message, ensure_ascii=False))
+    
+    def _append(self, key: str, value: str) -> None:
+        length = self.backend.rpush(key, value)
+        if length > self.max_length:
+            self.backend.ltrim(key, -self.max_length, -1)
+    
+    def load(self, agent_name: str, conversation_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """读取对话尾部窗口（等待存储线程中排在前面的写入完成）"""
+        return self._run(self._load, self._key(agent_name, conversation_id), limit)
+    
+    async def aload(self, agent_name: str, conversation_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """在存储线程中读取对话尾部窗口，不阻塞事件循环"""
+        future = self._executor.submit(self._load, self._key(agent_name, conversation_id), limit)
+        return await asyncio.wrap_future(future)
+    
+    def _load(self, key: str, limit: Optional[int]) -> List[Dict[str, Any]]:
+        start = -limit if limit else 0
+        return [json.loads(value) for value in self.backend.lrange(key, start, -1)]
+    
+    def delete(self, agent_name: str, conversation_id: str) -> bool:
+        """删除对话（等待存储线程完成）"""
+        return self._run(self.backend.delete, self._key(agent_name, conversation_id)) > 0
+    
+    async def adelete(self, agent_name: str, conversation_id: str) -> bool:
+        """在存储线程中删除对话，不阻塞事件循环"""
+        future = self._executor.submit(self.backend.delete, self._key(agent_name, conversation_id))
+        return await asyncio.wrap_future(future) > 0
+    
+    def compact(self, agent_name: str, conversation_id: str, replaced: List[Dict[str, Any]],
+                message: Dict[str, Any]) -> bool:
+        """将被摘要覆盖的消息替换为摘要消息（等待存储线程完成）"""
+        return self._run(self._compact, self._key(agent_name, conversation_id), replaced,
+                         json.dumps(message, ensure_ascii=False))
+    
+    async def acompact(self, agent_name: str, conversation_id: str, replaced: List[Dict[str, Any]],
+                       message: Dict[str, Any]) -> bool:
+        """在存储线程中压缩对话，不阻塞事件循环"""
+        future = self._executor.submit(self._compact, self._key(agent_name, conversation_id), replaced,
+                                       json.dumps(message, ensure_ascii=False))
+        return await asyncio.wrap_future(future)
+    
+    def _compact(self, key: str, replaced: List[Dict[str, Any]], value: str) -> bool:
+        def compact(pipe: Any) -> bool:
+            # 读取、确认被摘要的消息仍在列表中、截断和插入摘要在同一个事务中完成，
+            # 其他worker在此期间的追加或截断会使事务重试（Redis的WATCH）
+            current = [json.loads(item) for item in pipe.lrange(key, 0, -1)]
+            end = find_compacted_end(current, replaced)
+            pipe.multi()
+            if end is None:
+                return False
+            pipe.ltrim(key, end, -1)
+            pipe.lpush(key, value)
+            return True
+        return self.backend.transaction(compact, key, value_from_callable=True)
+    
+    def count_conversations(self, agent_name: str) -> int:
+        """获取指定agent的对话数量（等待存储线程完成，异步代码中使用acount_conversations）"""
+        return self._run(self._count_conversations, agent_name)
+    
+    def count_messages(self, agent_name: str) -> int:
+        """获取指定agent的消息总数（等待存储线程完成，异步代码中使用acount_messages）"""
+        return self._run(self._count_messages, agent_name)
+    
+    async def acount_conversations(self, agent_name: str) -> int:
+        """在存储线程中统计对话数量，不阻塞事件循环"""
+        return await asyncio.wrap_future(self._executor.submit(self._count_conversations, agent_name))
+    
+    async def acount_messages(self, agent_name: str) -> int:
+        """在存储线程中统计消息总数，不阻塞事件循环"""
+        return await asyncio.wrap_future(self._executor.submit(self._count_messages, agent_name))
+    
+    def _count_conversations(self, agent_name: str) -> int:
+        return sum(1 for _ in self.backend.scan_iter(match=f"{self.key_prefix}:{agent_name}:*"))
+    
+    def _count_messages(self, agent_name: str) -> int:
+        # 所有对话的长度通过一个管道查询，只需一次往返
+        pipe = self.backend.pipeline(transaction=False)
+        for key in self.backend.scan_iter(match=f"{self.key_prefix}:{agent_name}:*"):
+            pipe.llen(key)
+        return sum(pipe.execute())
+    
+    def flush(self) -> None:
+        """等待已提交的写入完成"""
+        self._run(lambda: None)
+    
+    def close(self) -> None:
+        """等待剩余写入完成并关闭后端连接"""
+        self._executor.shutdown(wait=True)
+        close = getattr(self.backend, "close", None)
+        if close:
+            close()
+
+def create_shared_backend(url: str) -> SharedListBackend:
+    """
+    根据URL创建共享列表后端
+    
+    Args:
+        url: redis://... 使用Redis（需安装redis包），sqlite:///path 使用本地SQLite文件
+    
+    Returns:
+        共享列表后端实例
+    """
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("使用Redis共享状态需要安装redis包: pip install redis") from e
+        logger.info("共享对话状态使用Redis: %s", url)
+        return redis.Redis.from_url(url, decode_responses=True)
+    
+    if url.startswith("sqlite:///"):
+        path = url[len("sqlite:///"):]
+        logger.info("共享对话状态使用本地SQLite: %s", path)
+        return SQLiteListBackend(path)
+    
+    raise ValueError(f"不支持的共享状态URL: {url}")
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+SQLite对话存储
+
+使用WAL模式的SQLite保存对话历史。写入先进入内存缓冲区，
+由后台线程按固定间隔或批量大小合并为一个事务提交，
+因此请求路径上的追加操作不产生磁盘IO。提交时顺带删除每个对话超出
+保留条数的旧消息，数据库大小有上限；对话数和消息数在内存中增量维护，
+统计接口不扫描数据库。
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+from core.logging import logger
+from .base import ConversationStore, find_compacted_end
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    agent_name TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    tokens INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation
+    ON messages (agent_name, conversation_id, id);
+"""
+
+class SQLiteConversationStore(ConversationStore):
+    """基于SQLite（WAL模式）的对话存储，支持写后批量提交"""
+    
+    def __init__(self, path: str, flush_interval: float = 0.5, batch_size: int = 200, max_length: int = 50):
+        """
+        初始化SQLite存储
+        
+        Args:
+            path: 数据库文件路径
+            flush_interval: 后台提交间隔（秒）
+            batch_size: 缓冲区达到该条数时立即触发提交
+            max_length: 每个对话保留的最大消息数，更早的消息在提交时删除
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_length = max_length
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        
+        # 所有数据库访问都在_db_lock下进行；_pending_lock只保护缓冲区
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._db_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending: List[Tuple[str, str, str, str, str, Optional[int]]] = []
+        
+        # 每个对话（按保留上限计）的消息数，以及按agent汇总的对话数和消息数，受_pending_lock保护
+        self._lengths: Dict[Tuple[str, str], int] = {}
+        self._conversation_counts: Counter = Counter()
+        self._message_counts: Counter = Counter()
+        self._load_counts()
+        
+        self._closed = False
+        self._wakeup = threading.Event()
+        self._writer = threading.Thread(target=self._writer_loop, name="conversation-store-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+        
+        logger.info("SQLite对话存储已启用: %s", path)
+    
+    def append(self, agent_name: str, conversation_id: str, message: Dict[str, Any]) -> None:
+        """追加消息到写缓冲区，由后台线程批量提交"""
+        row = (
+            agent_name, conversation_id, message["role"], message["content"],
+            message["timestamp"], message.get("tokens")
+        )
+        with self._pending_lock:
+            self._pending.append(row)
+            pending_count = len(self._pending)
+            length = self._lengths.get((agent_name, conversation_id), 0)
+            self._set_length(agent_name, conversation_id, min(length + 1, self.max_length))
+        
+        if pending_count >= self.batch_size:
+            self._wakeup.set()
+    
+    def load(self, agent_name: str, conversation_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """读取对话尾部窗口（包含尚未提交的缓冲消息）"""
+        with self._db_lock:
+            with self._pending_lock:
+                pending = [row for row in self._pending if row[0] == agent_name and row[1] == conversation_id]
+            
+            sql = (
+                "SELECT role, content, timestamp, tokens FROM messages "
+                "WHERE agent_name = ? AND conversation_id = ? ORDER BY id DESC"
+            )
+            params: Tuple = (agent_name, conversation_id)
+            if limit is not None:
+                sql += " LIMIT ?"
+                params += (limit,)
+            rows = self._conn.execute(sql, params).fetchall()
+        
+        rows.reverse()
+        rows.extend(row[2:] for row in pending)
+        if limit is not None:
+            rows = rows[-limit:]
+        
+        messages = []
+        for role, content, timestamp, tokens in rows:
+            message = {"role": role, "content": content, "timestamp": timestamp}
+            if tokens is not None:
+                message["tokens"] = tokens
+            messages.append(message)
+        return messages
+    
+    def delete(self, agent_name: str, conversation_id: str) -> bool:
+        """删除对话（同时丢弃缓冲区中该对话的消息）"""
+        with self._db_lock:
+            with self._pending_lock:
+                before = len(self._pending)
+                self._pending = [
+                    row for row in self._pending
+                    if not (row[0] == agent_name and row[1] == conversation_id)
+                ]
+                dropped = before - len(self._pending)
+                self._set_length(agent_name, conversation_id, 0)
+            
+            cursor = self._conn.execute(
+                "DELETE FROM messages WHERE agent_name = ? AND conversation_id = ?",
+                (agent_name, conversation_id)
+            )
+        return cursor.rowcount > 0 or dropped > 0
+    
+    def count_conversations(self, agent_name: str) -> int:
+        """获取指定agent的对话数量（内存计数，不访问数据库）"""
+        with self._pending_lock:
+            return self._conversation_counts[agent_name]
+    
+    def count_messages(self, agent_name: str) -> int:
+        """获取指定agent的消息总数（内存计数，不访问数据库）"""
+        with self._pending_lock:
+            return self._message_counts[agent_name]
+    
+    async def acount_conversations(self, agent_name: str) -> int:
+        """内存计数，直接读取"""
+        return self.count_conversations(agent_name)
+    
+    async def acount_messages(self, agent_name: str) -> int:
+        """内存计数，直接读取"""
+        return self.count_messages(agent_name)
+    
+    def _set_length(self, agent_name: str, conversation_id: str, length: int) -> None:
+        """更新对话的消息数及汇总计数（调用方需持有_pending_lock）"""
+        key = (agent_name, conversation_id)
+        previous = self._lengths.pop(key, 0)
+        if length:
+            self._lengths[key] = length
+        self._conversation_counts[agent_name] += (length > 0) - (previous > 0)
+        self._message_counts[agent_name] += length - previous
+    
+    def _load_counts(self) -> None:
+        """启动时删除超出保留条数的旧消息并统计现有对话"""
+        conversations = self._conn.execute(
+            "SELECT agent_name, conversation_id, COUNT(*) FROM messages GROUP BY agent_name, conversation_id"
+        ).fetchall()
+        over_limit = [(agent, cid) for agent, cid, count in conversations if count > self.max_length]
+        if over_limit:
+            self._conn.execute("BEGIN")
+            self._trim(over_limit)
+            self._conn.execute("COMMIT")
+        for agent_name, conversation_id, count in conversations:
+            self._set_length(agent_name, conversation_id, min(count, self.max_length))
+    
+    def _trim(self, conversations: List[Tuple[str, str]]) -> None:
+        """删除这些对话中超出保留条数的旧消息（在调用方的事务中执行）"""
+        self._conn.executemany(
+            "DELETE FROM messages WHERE agent_name = ? AND conversation_id = ? AND id <= "
+            "(SELECT id FROM messages WHERE agent_name = ? AND conversation_id = ? "
+            "ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            [(agent, cid, agent, cid, self.max_length) for agent, cid in conversations]
+        )
+    
+    def compact(self, agent_name: str, conversation_id: str, replaced: List[Dict[str, Any]],
+                message: Dict[str, Any]) -> bool:
+        """将被摘要覆盖的消息替换为摘要消息（会访问数据库，应通过acompact在线程中调用）"""
+        with self._db_lock:
+            # 先提交缓冲区，保证按完整的消息序列计算边界
+            self._flush_locked()
+            
+            self._conn.execute("BEGIN")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, role, content, timestamp FROM messages "
+                    "WHERE agent_name = ? AND conversation_id = ? ORDER BY id",
+                    (agent_name, conversation_id)
+                ).fetchall()
+                end = find_compacted_end(
+                    [{"role": role, "content": content, "timestamp": timestamp} for _, role, content, timestamp in rows],
+                    replaced
+                )
+                if end is None:
+                    self._conn.execute("ROLLBACK")
+                    return False
+                
+                # 摘要复用被替换的最后一条消息的id，从而排在保留的消息之前
+                boundary_id = rows[end - 1][0]
+                self._conn.execute(
+                    "DELETE FROM messages WHERE agent_name = ? AND conversation_id = ? AND id <= ?",
+                    (agent_name, conversation_id, boundary_id)
+                )
+                self._conn.execute(
+                    "INSERT INTO messages (id, agent_name, conversation_id, role, content, timestamp, tokens) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (boundary_id, agent_name, conversation_id, message["role"], message["content"],
+                     message["timestamp"], message.get("tokens"))
+                )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+            with self._pending_lock:
+                # 压缩期间缓冲区可能有新的追加，按删除的条数增量更新
+                length = self._lengths.get((agent_name, conversation_id), 0)
+                self._set_length(agent_name, conversation_id, max(length - end + 1, 1))
+        return True
+    
+    def flush(self) -> None:
+        """在一个事务中提交缓冲区内的所有消息"""
+        with self._db_lock:
+            self._flush_locked()
+    
+    def _flush_locked(self) -> None:
+        """提交缓冲区（调用方需持有_db_lock）"""
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        
+        try:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO messages (agent_name, conversation_id, role, content, timestamp, tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                batch
+            )
+            # 只保留每个对话最新的max_length条消息
+            self._trim(list({(row[0], row[1]) for row in batch}))
+            self._conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            self._conn.execute("ROLLBACK")
+            # 放回缓冲区等待下次重试
+            with self._pending_lock:
+                self._pending = batch + self._pending
+            logger.error("对话存储提交失败: %s", e)
+    
+    def close(self) -> None:
+        """停止后台线程并提交剩余消息"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join()
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+    
+    def _migrate(self) -> None:
+        """为旧版本数据库补充新增的列"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(messages)")}
+        if "tokens" not in columns:
+            self._conn.execute("ALTER TABLE messages ADD COLUMN tokens INTEGER")
+    
+    def _writer_loop(self) -> None:
+        """后台写线程：按间隔或批量阈值提交缓冲区"""
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._closed:
+                break
+            self.flush()
@@ -1,4 +1,14 @@
 # 工具模块初始化文件
-from .helpers import format_timestamp, validate_agent_name
+from .helpers import format_timestamp, validate_agent_name, format_sse, percentile, estimate_tokens, count_message_tokens
+from .safe_eval import safe_eval, UnsafeExpressionError
 
-__all__ = ["format_timestamp", "validate_agent_name"]
\ No newline at end of file
+__all__ = [
+    "format_timestamp",
+    "validate_agent_name",
+    "format_sse",
+    "percentile",
+    "estimate_tokens",
+    "count_message_tokens",
+    "safe_eval",
+    "UnsafeExpressionError"
+]
\ No newline at end of file
@@ -5,9 +5,10 @@
 提供各种通用的辅助函数。
 """
 
+import json
 import re
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional, Sequence
 
 def format_timestamp(dt: Optional[datetime] = None) -> str:
     """
@@ -23,6 +24,42 @@ def format_timestamp(dt: Optional[datetime] = None) -> str:
         dt = datetime.now()
     return dt.strftime("%Y-%m-%d %H:%M:%S")
 
+# 中日韩字符及全角符号，通常每个字符约占一个token
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+
+# 每条消息在聊天格式中的固定开销（角色标记、分隔符）
+MESSAGE_TOKEN_OVERHEAD = 4
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的token数
+    
+    使用字符统计近似：中日韩字符按每字1个token，其余文本按每4个字符1个token。
+    不依赖具体模型的分词器，开销只有一次正则扫描。
+    
+    Args:
+        text: 要估算的文本
+    
+    Returns:
+        估算的token数
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + (len(text) - cjk_count + 3) // 4
+
+def count_message_tokens(content: str) -> int:
+    """
+    估算单条聊天消息占用的token数（含消息格式开销）
+    
+    Args:
+        content: 消息内容
+    
+    Returns:
+        估算的token数
+    """
+    return estimate_tokens(content) + MESSAGE_TOKEN_OVERHEAD
+
 def validate_agent_name(agent_name: str) -> bool:
     """
     验证Agent名称是否有效
@@ -65,4 +102,40 @@ def sanitize_conversation_id(conversation_id: str) -> str:
     """
     # 移除特殊字符，只保留字母、数字、下划线和连字符
     sanitized = re.sub(r'[^a-zA-Z0-9_-]', '', conversation_id)
-    return sanitized or "default"
\ No newline at end of file
+    return sanitized or "default"
+
+def format_sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """
+    格式化Server-Sent Events消息
+    
+    Args:
+        data: 要发送的数据，会被序列化为JSON
+        event: 事件类型，为None时使用默认的message事件
+    
+    Returns:
+        符合SSE协议的消息文本
+    """
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """
+    计算百分位数（线性插值）
+    
+    Args:
+        values: 数值序列
+        pct: 百分位，取值0-100
+    
+    Returns:
+        百分位数，序列为空时返回0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
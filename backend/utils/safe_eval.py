@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+安全的算术表达式求值
+
+把表达式解析为AST并只接受数字和四则、整除、取模、乘方运算，编译为闭包后求值，
+不经过eval。乘方和乘法在计算前按位数估算结果大小，拒绝 9**9**9 这类会
+占满CPU和内存的表达式。
+"""
+
+import ast
+import math
+import operator
+from functools import lru_cache
+from typing import Callable, Union
+
+Number = Union[int, float]
+
+# 表达式最大长度和AST最大深度
+MAX_EXPRESSION_LENGTH = 200
+MAX_DEPTH = 32
+# 整数结果的最大位数（约3000位十进制数）
+MAX_INT_BITS = 10000
+# 浮点乘方的最大指数绝对值
+MAX_FLOAT_EXPONENT = 1000
+
+class UnsafeExpressionError(ValueError):
+    """表达式包含不支持的语法或会导致过大的计算量"""
+
+def _check_int_bits(bits: float) -> None:
+    if bits > MAX_INT_BITS:
+        raise UnsafeExpressionError("计算结果过大")
+
+def _safe_pow(base: Number, exponent: Number) -> Number:
+    """先估算结果大小再计算乘方"""
+    if isinstance(base, int) and isinstance(exponent, int):
+        if exponent < 0:
+            return float(base) ** exponent
+        if abs(base) > 1:
+            _check_int_bits(base.bit_length() * exponent)
+        return base ** exponent
+    if abs(exponent) > MAX_FLOAT_EXPONENT:
+        raise UnsafeExpressionError("指数过大")
+    try:
+        return math.pow(base, exponent)
+    except (OverflowError, ValueError) as e:
+        raise UnsafeExpressionError(f"无法计算乘方: {e}")
+
+def _safe_mul(left: Number, right: Number) -> Number:
+    """整数相乘前估算结果位数"""
+    if isinstance(left, int) and isinstance(right, int):
+        _check_int_bits(left.bit_length() + right.bit_length())
+    return left * right
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _safe_mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _safe_pow,
+}
+
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+def _compile_node(node: ast.AST, depth: int = 0) -> Callable[[], Number]:
+    """把AST节点编译为无参闭包"""
+    if depth > MAX_DEPTH:
+        raise UnsafeExpressionError("表达式嵌套过深")
+
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body, depth + 1)
+
+    if isinstance(node, ast.Constant):
+        value = node.value
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise UnsafeExpressionError(f"不支持的常量: {value!r}")
+        return lambda: value
+
+    if isinstance(node, ast.BinOp):
+        op = _BINARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise UnsafeExpressionError(f"不支持的运算符: {type(node.op).__name__}")
+        left = _compile_node(node.left, depth + 1)
+        right = _compile_node(node.right, depth + 1)
+        return lambda: op(left(), right())
+
+    if isinstance(node, ast.UnaryOp):
+        op = _UNARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise UnsafeExpressionError(f"不支持的运算符: {type(node.op).__name__}")
+        operand = _compile_node(node.operand, depth + 1)
+        return lambda: op(operand())
+
+    raise UnsafeExpressionError(f"不支持的语法: {type(node).__name__}")
+
+@lru_cache(maxsize=256)
+def compile_expression(expression: str) -> Callable[[], Number]:
+    """
+    解析并编译算术表达式
+
+    Args:
+        expression: 算术表达式，如 "(1 + 2) * 3 ** 2"
+
+    Returns:
+        求值函数
+
+    Raises:
+        UnsafeExpressionError: 表达式过长、语法不支持或嵌套过深
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise UnsafeExpressionError(f"表达式过长（最多{MAX_EXPRESSION_LENGTH}个字符）")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError:
+        raise UnsafeExpressionError("表达式语法错误")
+    return _compile_node(tree)
+
+def safe_eval(expression: str) -> Number:
+    """
+    安全地计算算术表达式
+
+    Raises:
+        UnsafeExpressionError: 表达式不安全或结果过大
+        ZeroDivisionError: 除数为零
+    """
+    return compile_expression(expression)()
@@ -117,6 +117,68 @@ export class ChatService {
     }
   }
 
+  /**
+   * 流式发送聊天消息（Server-Sent Events）
+   * @param {string} message - 用户消息
+   * @param {string} agentName - agent名称
+   * @param {string} conversationId - 对话ID
+   * @param {Function} onDelta - 收到增量文本时的回调
+   * @returns {Promise<string>} 完整的回复内容
+   */
+  async streamMessage(message, agentName = 'simple_chat', conversationId = 'default', onDelta = () => {}) {
+    const response = await fetch('/api/chat/stream', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        message: message.trim(),
+        agent_name: agentName,
+        conversation_id: conversationId
+      })
+    })
+
+    if (!response.ok || !response.body) {
+      const data = await response.json().catch(() => ({}))
+      throw new Error(data.detail || `服务器错误 (${response.status})`)
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder('utf-8')
+    let buffer = ''
+    let content = ''
+
+    while (true) {
+      const { value, done } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+
+      // SSE事件以空行分隔
+      let boundary
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const rawEvent = buffer.slice(0, boundary)
+        buffer = buffer.slice(boundary + 2)
+
+        let event = 'message'
+        let data = ''
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim()
+          else if (line.startsWith('data:')) data += line.slice(5).trim()
+        }
+        if (!data) continue
+
+        const payload = JSON.parse(data)
+        if (event === 'error') {
+          throw new Error(payload.detail || '聊天服务错误')
+        }
+        if (event === 'message' && payload.delta) {
+          content += payload.delta
+          onDelta(payload.delta, content)
+        }
+      }
+    }
+
+    return content
+  }
+
   /**
    * 清除对话历史
    * @param {string} agentName - agent名称